@@ -1,6 +1,8 @@
+import os
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
-CACHE_DIR = PROJECT_ROOT / "cache"
+CACHE_DIR_ENV = "SSRQ_CACHE_DIR"
+CACHE_DIR = Path(os.environ.get(CACHE_DIR_ENV, PROJECT_ROOT / "cache"))
 TEI_OUTPUT_DIR = CACHE_DIR / "tei"
 ZG_DATA_ROOT = PROJECT_ROOT / "data" / "ZG"
@@ -0,0 +1,452 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import md5, sha256
+from pathlib import Path
+from threading import Lock
+from typing import Any, Literal
+
+from diskcache import Cache, FanoutCache  # type: ignore
+from loguru import logger
+
+from ssrq_retro_lab.config import CACHE_DIR
+from ssrq_retro_lab.pipeline.metrics import measure_size
+
+__all__ = [
+    "CacheService",
+    "CacheSettings",
+    "CacheStatistics",
+    "NamespaceCache",
+    "configure_cache_service",
+    "create_cache_key",
+    "export_bundle",
+    "file_version",
+    "get_cache",
+    "get_cache_service",
+    "import_bundle",
+]
+
+BUNDLE_FORMAT = "ssrq-cache-bundle/v1"
+
+EvictionPolicy = Literal[
+    "least-recently-stored", "least-recently-used", "least-frequently-used", "none"
+]
+
+
+@dataclass(frozen=True, slots=True)
+class CacheSettings:
+    """The settings of a cache namespace.
+
+    Attributes:
+        size_limit: The maximum size of the namespace on disk in bytes. Once it is
+            exceeded, entries are evicted according to the eviction policy.
+        eviction_policy: The diskcache eviction policy, e.g. LRU or LFU.
+        shards: The number of shards. More than one shard allows concurrent writers
+            (threads or processes) without waiting for each other's write lock.
+            Note: A sharded namespace uses another layout on disk, so existing
+            unsharded caches aren't read anymore after switching.
+        timeout: The timeout of the SQLite connections in seconds.
+    """
+
+    size_limit: int = 2**30
+    eviction_policy: EvictionPolicy = "least-recently-used"
+    shards: int = 1
+    timeout: float = 60.0
+
+
+@dataclass(slots=True)
+class CacheStatistics:
+    """Statistics of a cache namespace in the current process.
+
+    Attributes:
+        hits: The number of lookups, which found an entry.
+        misses: The number of lookups, which found no entry.
+        bytes_read: The size of all entries read.
+        bytes_written: The size of all entries written.
+        volume: The size of the namespace on disk in bytes.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    volume: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class NamespaceCache:
+    """A handle of a single cache namespace (e.g. the cache of a component).
+
+    Supports the mapping operations of diskcache used by the components and
+    counts lookups and transferred bytes. A lookup is either a membership test
+    (`key in cache`) or `get`.
+
+    Attributes:
+        namespace: The name of the namespace.
+        settings: The settings of the namespace.
+    """
+
+    def __init__(self, directory: Path, namespace: str, settings: CacheSettings):
+        self.namespace = namespace
+        self.settings = settings
+        self._statistics = CacheStatistics()
+        self._lock = Lock()
+
+        options = {
+            "size_limit": settings.size_limit,
+            "eviction_policy": settings.eviction_policy,
+            "timeout": settings.timeout,
+        }
+        self._cache: Cache | FanoutCache = (
+            FanoutCache(directory, shards=settings.shards, **options)
+            if settings.shards > 1
+            else Cache(directory, **options)
+        )
+
+    @property
+    def statistics(self) -> CacheStatistics:
+        with self._lock:
+            return CacheStatistics(
+                hits=self._statistics.hits,
+                misses=self._statistics.misses,
+                bytes_read=self._statistics.bytes_read,
+                bytes_written=self._statistics.bytes_written,
+                volume=self._cache.volume(),
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._cache.get(key, default=None)
+        self._count_lookup(value is not None)
+
+        if value is None:
+            return default
+
+        self._count_bytes("bytes_read", value)
+
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        found = key in self._cache
+        self._count_lookup(found)
+        return found
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._cache[key]
+        self._count_bytes("bytes_read", value)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._cache[key] = value
+        self._count_bytes("bytes_written", value)
+
+    def __delitem__(self, key: str) -> None:
+        del self._cache[key]
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def iterkeys(self):
+        return self._cache.iterkeys()
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def close(self) -> None:
+        self._cache.close()
+
+    def _count_lookup(self, found: bool) -> None:
+        with self._lock:
+            if found:
+                self._statistics.hits += 1
+            else:
+                self._statistics.misses += 1
+
+    def _count_bytes(self, kind: Literal["bytes_read", "bytes_written"], value) -> None:
+        size = measure_size(value)
+
+        with self._lock:
+            setattr(self._statistics, kind, getattr(self._statistics, kind) + size)
+
+
+class CacheService:
+    """Keeps the cache namespaces of all components open for the lifetime of a
+    process – instead of opening and closing a diskcache on every invocation.
+
+    Attributes:
+        directory: The root directory, every namespace is a subdirectory.
+        default_settings: The settings of all namespaces without own settings.
+        settings: The settings per namespace.
+    """
+
+    def __init__(
+        self,
+        directory: Path = CACHE_DIR,
+        default_settings: CacheSettings = CacheSettings(),
+        settings: dict[str, CacheSettings] | None = None,
+    ):
+        self.directory = directory
+        self.default_settings = default_settings
+        self.settings = settings or {}
+        self._handles: dict[str, NamespaceCache] = {}
+        self._lock = Lock()
+
+    def get(self, namespace: str) -> NamespaceCache:
+        """Returns the (open) handle of a namespace.
+
+        Args:
+            namespace: The name of the namespace, e.g. the name of a component.
+
+        Returns:
+            The handle of the namespace.
+        """
+        with self._lock:
+            if namespace not in self._handles:
+                self._handles[namespace] = NamespaceCache(
+                    self.directory / namespace,
+                    namespace,
+                    self.settings.get(namespace, self.default_settings),
+                )
+
+            return self._handles[namespace]
+
+    def statistics(self) -> dict[str, CacheStatistics]:
+        """Returns the statistics of all namespaces opened by this process."""
+        with self._lock:
+            handles = tuple(self._handles.values())
+
+        return {handle.namespace: handle.statistics for handle in handles}
+
+    def log_statistics(self) -> None:
+        for namespace, statistics in self.statistics().items():
+            logger.info(
+                f"Cache {namespace}: {statistics.hits} hits, {statistics.misses} misses "
+                f"({statistics.hit_rate:.1%}), {statistics.bytes_read} bytes read, "
+                f"{statistics.bytes_written} bytes written, {statistics.volume} bytes on disk"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            for handle in self._handles.values():
+                handle.close()
+
+            self._handles.clear()
+
+
+_SERVICE: tuple[int, CacheService] | None = None
+_SERVICE_LOCK = Lock()
+
+
+def get_cache_service() -> CacheService:
+    """Returns the cache service of the current process.
+
+    The service is created on first use and once per process, because the SQLite
+    connections of diskcache must not be shared with forked processes."""
+    global _SERVICE
+
+    with _SERVICE_LOCK:
+        if _SERVICE is None or _SERVICE[0] != os.getpid():
+            _SERVICE = (os.getpid(), CacheService())
+
+        return _SERVICE[1]
+
+
+def configure_cache_service(
+    directory: Path = CACHE_DIR,
+    default_settings: CacheSettings = CacheSettings(),
+    settings: dict[str, CacheSettings] | None = None,
+) -> CacheService:
+    """Replaces the cache service of the current process, e.g. to change the size
+    limits or the location of the caches. Open handles of the old service are closed.
+
+    Args:
+        directory: The root directory of the caches.
+        default_settings: The settings of all namespaces without own settings.
+        settings: The settings per namespace.
+
+    Returns:
+        The new cache service.
+    """
+    global _SERVICE
+
+    with _SERVICE_LOCK:
+        if _SERVICE is not None and _SERVICE[0] == os.getpid():
+            _SERVICE[1].close()
+
+        _SERVICE = (
+            os.getpid(),
+            CacheService(directory, default_settings, settings or {}),
+        )
+
+        return _SERVICE[1]
+
+
+def get_cache(namespace: str) -> NamespaceCache:
+    """Returns the handle of a cache namespace of the current process.
+
+    Args:
+        namespace: The name of the namespace, e.g. the name of a component.
+
+    Returns:
+        The handle of the namespace.
+    """
+    return get_cache_service().get(namespace)
+
+
+def create_cache_key(
+    content: str, model_name: str, template_version: str = "", schema: str = ""
+) -> str:
+    """Creates a versioned cache key.
+
+    Besides the content (e.g. a text line), the key contains everything which
+    determines the answer of the LLM: the model, the version of the prompt
+    template and the expected schema. Changing one of them doesn't serve stale
+    answers, but results in a cache miss.
+
+    Args:
+        content: The content, which is processed by the LLM.
+        model_name: The name of the model.
+        template_version: The version of the template (see `file_version`).
+        schema: The JSON schema (or another description) of the expected answer.
+
+    Returns:
+        The key in the form `model/template version/schema hash/content hash`.
+    """
+    schema_hash = sha256(schema.encode("utf-8")).hexdigest()[:12] if schema else ""
+    content_hash = md5(content.encode("utf-8")).hexdigest()
+
+    return f"{model_name}/{template_version}/{schema_hash}/{content_hash}"
+
+
+def file_version(path: Path) -> str:
+    """Returns the version of a file (e.g. a template) based on its content.
+
+    Args:
+        path: The path of the file.
+
+    Returns:
+        The name of the file and a short hash of its content, e.g.
+        `textline_classification_v1.jinja2@0123456789ab`.
+    """
+    stat = path.stat()
+    return _file_version(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=None)
+def _file_version(path: Path, mtime_ns: int, size: int) -> str:
+    return f"{path.name}@{sha256(path.read_bytes()).hexdigest()[:12]}"
+
+
+def export_bundle(
+    namespace: str, path: Path, service: CacheService | None = None
+) -> int:
+    """Exports all entries of a cache namespace to a single compressed file, e.g.
+    to ship a pre-warmed cache to other machines.
+
+    The bundle is a gzipped JSON lines file. Only text and binary values are
+    exported, which covers all values stored by the components.
+
+    Args:
+        namespace: The name of the namespace.
+        path: The path of the bundle.
+        service: The cache service. Defaults to the service of the process.
+
+    Returns:
+        The number of exported entries.
+    """
+    handle = (service or get_cache_service()).get(namespace)
+    count = 0
+
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        file.write(json.dumps({"format": BUNDLE_FORMAT, "namespace": namespace}))
+        file.write("\n")
+
+        for key in handle.iterkeys():
+            match value := handle.get(key):
+                case str():
+                    entry = {"key": key, "text": value}
+                case bytes():
+                    entry = {"key": key, "bytes": base64.b64encode(value).decode()}
+                case _:
+                    logger.warning(f"Skipping entry {key} of type {type(value)}")
+                    continue
+
+            file.write(json.dumps(entry, ensure_ascii=False))
+            file.write("\n")
+            count += 1
+
+    logger.info(f"Exported {count} entries of cache {namespace} to {path}")
+
+    return count
+
+
+def import_bundle(
+    path: Path, service: CacheService | None = None, overwrite: bool = False
+) -> int:
+    """Imports a bundle created by `export_bundle` into the namespace it was
+    exported from.
+
+    Args:
+        path: The path of the bundle.
+        service: The cache service. Defaults to the service of the process.
+        overwrite: Whether existing entries are replaced.
+
+    Returns:
+        The number of imported entries.
+    """
+    count = 0
+
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header = json.loads(file.readline())
+
+        if header.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{path} is not a cache bundle")
+
+        handle = (service or get_cache_service()).get(header["namespace"])
+
+        for line in file:
+            entry = json.loads(line)
+
+            if not overwrite and entry["key"] in handle:
+                continue
+
+            handle[entry["key"]] = (
+                entry["text"]
+                if "text" in entry
+                else base64.b64decode(entry["bytes"].encode())
+            )
+            count += 1
+
+    logger.info(f"Imported {count} entries from {path} into {header['namespace']}")
+
+    return count
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Export or import a cache namespace as a bundle."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("namespace")
+    export_parser.add_argument("path", type=Path)
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("path", type=Path)
+    import_parser.add_argument("--overwrite", action="store_true")
+    parsed = parser.parse_args(args)
+
+    if parsed.command == "export":
+        export_bundle(parsed.namespace, parsed.path)
+    else:
+        import_bundle(parsed.path, overwrite=parsed.overwrite)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,42 @@
-from collections.abc import Sequence
+import asyncio
+from collections.abc import Generator, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from dataclasses import dataclass
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import perf_counter
 from typing import Any
 
 from loguru import logger
-from result import Ok, Result, is_err, is_ok
+from result import Err, Ok, Result, is_err, is_ok
 
+from ssrq_retro_lab.pipeline.cache import get_cache_service
 from ssrq_retro_lab.pipeline.components.html_wrangler import HTMLWrangler
 from ssrq_retro_lab.pipeline.components.ner_annotator import NERAnnotator
 from ssrq_retro_lab.pipeline.components.ocr_corrector import OCRCorrector
-from ssrq_retro_lab.pipeline.components.protocol import Component, ComponentError
+from ssrq_retro_lab.pipeline.components.protocol import (
+    AsyncComponent,
+    Component,
+    ComponentError,
+)
 from ssrq_retro_lab.pipeline.components.tei_converter import TEIConverter
 from ssrq_retro_lab.pipeline.components.text_classifier import TextClassifier
-from ssrq_retro_lab.pipeline.components.text_extractor import TextExtractor
+from ssrq_retro_lab.pipeline.components.text_extractor import (
+    ExtractionInput,
+    TextExtractor,
+)
+from ssrq_retro_lab.pipeline.manifest import RunManifest, content_hash
+from ssrq_retro_lab.pipeline.metrics import (
+    ComponentMetrics,
+    MetricsRecorder,
+    measure_size,
+    track,
+)
 
 DEFAULT_COMPONENTS = (
     TextExtractor(),
@@ -22,8 +48,38 @@ DEFAULT_COMPONENTS = (
 )
 
 
+@dataclass(frozen=True, slots=True)
+class BatchResult:
+    """The outcome of a batch run over many articles.
+
+    Attributes:
+        results: The result of the chain for every article number.
+        elapsed_seconds: The wall time of the whole batch run.
+    """
+
+    results: dict[int, Result[Any, ComponentError]]
+    elapsed_seconds: float
+
+    @property
+    def articles_per_minute(self) -> float:
+        if self.elapsed_seconds == 0:
+            return 0.0
+        return len(self.results) / self.elapsed_seconds * 60
+
+    @property
+    def failed(self) -> tuple[int, ...]:
+        return tuple(
+            article_number
+            for article_number, result in self.results.items()
+            if is_err(result)
+        )
+
+
 def executor(
-    initial_input: Any, components: Sequence[Component]
+    initial_input: Any,
+    components: Sequence[Component],
+    metrics: MetricsRecorder | None = None,
+    manifest: RunManifest | None = None,
 ) -> Result[Any, ComponentError]:
     """Executes a sequence of components with the given input.
 
@@ -36,23 +92,447 @@ def executor(
     will log an error and return the error.
 
     The intermediate results of the components are passed to the next component as input.
-    The output of every component is logged by default.
+    The output of every component is logged by default. If a metrics recorder is given,
+    the wall time, the number of calls and retries, the input and output size as well as
+    the reported cache hits and misses are recorded for every component. If a run
+    manifest is given, the output of every component is checkpointed and components,
+    whose output for the same input is already stored, are skipped.
+
+    Args:
+        initial_input: The initial input for the first component.
+        components: The components to execute.
+        metrics: An optional recorder for per-component metrics.
+        manifest: An optional run manifest to checkpoint and resume from.
+
+    Returns:
+        The result of the last component or an error if any component failed.
+    """
+    return _run_steps(
+        _execution_steps(initial_input, components, metrics, manifest=manifest)
+    )
+
+
+async def async_executor(
+    initial_input: Any,
+    components: Sequence[Component],
+    metrics: MetricsRecorder | None = None,
+    manifest: RunManifest | None = None,
+) -> Result[Any, ComponentError]:
+    """Executes a sequence of components with the given input on the running event loop.
+
+    The asynchronous counterpart of `executor` with the same retry semantics (including
+    `_repeat_previous`). Components implementing the `AsyncComponent` protocol are
+    awaited directly, all other components are executed in a worker thread, so they
+    don't block the event loop. Many chains can be run concurrently, e.g. with
+    `asyncio.gather`.
 
     Args:
         initial_input: The initial input for the first component.
         components: The components to execute.
-        allowed_retries: The maximum number of retries for each component.
+        metrics: An optional recorder for per-component metrics.
+        manifest: An optional run manifest to checkpoint and resume from.
 
     Returns:
         The result of the last component or an error if any component failed.
     """
-    index = 0
+    steps = _execution_steps(initial_input, components, metrics, manifest=manifest)
+
+    try:
+        component, component_input = next(steps)
+
+        while True:
+            component, component_input = steps.send(
+                await _ainvoke(component, component_input)
+            )
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        steps.close()
+
+
+def batch_executor(
+    article_numbers: Iterable[int],
+    components: Sequence[Component] = DEFAULT_COMPONENTS,
+    max_workers: int = 4,
+    use_processes: bool = False,
+    metrics: MetricsRecorder | None = None,
+    manifest: RunManifest | None = None,
+) -> BatchResult:
+    """Executes the chain for many articles concurrently.
+
+    Every article is processed by its own call of `executor` inside a pool of
+    workers. A failing article – either by returning an error or by raising an
+    exception – does not stop the batch; its error is stored in the result and
+    the remaining articles are processed. The throughput (articles per minute) is
+    logged after every finished article, so the number of workers can be sized.
+    If a metrics recorder is given, the metrics of all articles are collected in it
+    and a summary table per component is logged at the end of the run. With a run
+    manifest, an interrupted run can be restarted and resumes every article at the
+    first component without a checkpoint.
+
+    Args:
+        article_numbers: The article numbers to process, e.g. `range(1, 1882)`.
+        components: The components to execute for every article.
+        max_workers: The maximum number of articles processed at the same time.
+        use_processes: Use a process pool instead of a thread pool. The components
+            must be picklable in this case.
+        metrics: An optional recorder for per-component metrics.
+        manifest: An optional run manifest to checkpoint and resume from.
+
+    Returns:
+        A BatchResult with the result of the chain for every article number.
+    """
+    article_numbers = tuple(article_numbers)
+    results: dict[int, Result[Any, ComponentError]] = {}
+    pool: Executor = (
+        ProcessPoolExecutor(max_workers=max_workers)
+        if use_processes
+        else ThreadPoolExecutor(max_workers=max_workers)
+    )
+    start = perf_counter()
+
+    if manifest is not None:
+        manifest.reset_statistics()
+
+    with pool:
+        futures = {
+            pool.submit(
+                _execute_article,
+                article_number,
+                components,
+                metrics is not None,
+                manifest,
+            ): article_number
+            for article_number in article_numbers
+        }
+
+        for future in as_completed(futures):
+            article_number = futures[future]
+
+            try:
+                results[article_number], records = future.result()
+
+                if metrics is not None:
+                    metrics.extend(records)
+            except Exception as e:
+                results[article_number] = Err(
+                    ComponentError(f"Chain for article {article_number} crashed: {e}")
+                )
+
+            elapsed = perf_counter() - start
+            logger.info(
+                f"Finished article {article_number} ({len(results)}/{len(article_numbers)}) "
+                f"– {len(results) / elapsed * 60:.2f} articles/minute"
+            )
+
+    batch_result = BatchResult(
+        results={number: results[number] for number in article_numbers},
+        elapsed_seconds=perf_counter() - start,
+    )
+
+    logger.info(
+        f"Processed {len(batch_result.results)} articles with {max_workers} workers "
+        f"in {batch_result.elapsed_seconds:.2f}s ({batch_result.articles_per_minute:.2f} "
+        f"articles/minute), {len(batch_result.failed)} failed."
+    )
+
+    if metrics is not None:
+        logger.info(f"Component metrics:\n{metrics.summary()}")
+
+    get_cache_service().log_statistics()
+
+    if manifest is not None:
+        manifest.log_report()
+
+    return batch_result
+
+
+def _execute_article(
+    article_number: int,
+    components: Sequence[Component],
+    collect_metrics: bool,
+    manifest: RunManifest | None,
+) -> tuple[Result[Any, ComponentError], tuple[ComponentMetrics, ...]]:
+    """Executes the chain for a single article inside a worker.
+
+    The metrics are collected by a worker-local recorder and returned to the
+    caller, so this also works across process boundaries."""
+    metrics = MetricsRecorder() if collect_metrics else None
+
+    try:
+        result = executor(
+            ExtractionInput(article_number=article_number),
+            components,
+            metrics,
+            manifest,
+        )
+    except Exception as e:
+        logger.error(f"Chain for article {article_number} raised an exception: {e}")
+        result = Err(ComponentError(f"Chain for article {article_number} crashed: {e}"))
+
+    return result, metrics.records if metrics else ()
+
+
+def _run_steps(
+    steps: Generator[
+        tuple[Component, Any], Result[Any, ComponentError], Result[Any, ComponentError]
+    ],
+) -> Result[Any, ComponentError]:
+    try:
+        component, component_input = next(steps)
+
+        while True:
+            component, component_input = steps.send(component.invoke(component_input))
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        steps.close()
+
+
+def streaming_executor(
+    article_numbers: Iterable[int],
+    components: Sequence[Component] = DEFAULT_COMPONENTS,
+    stage_workers: Mapping[str, int] | None = None,
+    queue_size: int = 2,
+    metrics: MetricsRecorder | None = None,
+    manifest: RunManifest | None = None,
+) -> Iterator[tuple[int, Result[Any, ComponentError]]]:
+    """Executes the chain for many articles as a pipeline of stages.
+
+    Every component is a stage with its own bounded input queue and its own worker
+    threads. While one article waits for an LLM, the next articles are already
+    extracted and wrangled by the earlier stages. Because all queues are bounded, a
+    slow stage blocks the stages in front of it (backpressure), so only a few
+    articles are in memory at any time – regardless of the length of the run.
+
+    The retry semantics are the same as in `executor`, they are applied per stage.
+    Articles are yielded in the order they finish, failed articles are yielded with
+    their error and don't stop the run.
+
+    Args:
+        article_numbers: The article numbers to process.
+        components: The components to execute; each one becomes a stage.
+        stage_workers: The number of worker threads per component name. Stages not
+            mentioned get a single worker.
+        queue_size: The maximum number of articles waiting in front of a stage.
+        metrics: An optional recorder for per-component metrics.
+        manifest: An optional run manifest to checkpoint and resume from.
+
+    Yields:
+        Tuples of article number and the result of the chain for this article.
+    """
+    if len(components) == 0:
+        for article_number in article_numbers:
+            yield article_number, Ok(ExtractionInput(article_number=article_number))
+        return
+
+    stage_workers = stage_workers or {}
+    worker_counts = [max(1, stage_workers.get(c._name, 1)) for c in components]
+    queues: list[Queue] = [
+        Queue(maxsize=queue_size) for _ in range(len(components) + 1)
+    ]
+    remaining_workers = list(worker_counts)
+    lock = Lock()
+    stopped = Event()
+
+    if manifest is not None:
+        manifest.reset_statistics()
+
+    def feed() -> None:
+        for article_number in article_numbers:
+            item = _StreamItem(
+                article_number, ExtractionInput(article_number=article_number)
+            )
+            if not _put(queues[0], item, stopped):
+                return
+
+        for _ in range(worker_counts[0]):
+            _put(queues[0], _STREAM_END, stopped)
+
+    def work(stage: int) -> None:
+        while (item := _get(queues[stage], stopped)) is not None:
+            if item is _STREAM_END:
+                with lock:
+                    remaining_workers[stage] -= 1
+                    is_last_worker = remaining_workers[stage] == 0
+
+                if is_last_worker:
+                    next_workers = (
+                        worker_counts[stage + 1] if stage + 1 < len(components) else 1
+                    )
+                    for _ in range(next_workers):
+                        _put(queues[stage + 1], _STREAM_END, stopped)
+                return
+
+            result = _run_stage(components, stage, item, metrics, manifest)
+
+            if is_err(result) or stage + 1 == len(components):
+                _put(queues[-1], (item.article_number, result), stopped)
+            else:
+                _put(
+                    queues[stage + 1],
+                    _StreamItem(item.article_number, result.unwrap()),
+                    stopped,
+                )
+
+    threads = [Thread(target=feed, daemon=True)] + [
+        Thread(target=work, args=(stage,), daemon=True)
+        for stage, count in enumerate(worker_counts)
+        for _ in range(count)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    start = perf_counter()
+    finished = 0
+
+    try:
+        while (output := queues[-1].get()) is not _STREAM_END:
+            finished += 1
+            yield output
+    finally:
+        stopped.set()
+
+    elapsed = perf_counter() - start
+    logger.info(
+        f"Streamed {finished} articles in {elapsed:.2f}s "
+        f"({finished / elapsed * 60 if elapsed else 0:.2f} articles/minute)."
+    )
+
+    if metrics is not None:
+        logger.info(f"Component metrics:\n{metrics.summary()}")
+
+    get_cache_service().log_statistics()
+
+    if manifest is not None:
+        manifest.log_report()
+
+
+@dataclass(slots=True)
+class _StreamItem:
+    article_number: int
+    value: Any
+
+
+_STREAM_END = object()
+
+
+def _put(queue: Queue, item: Any, stopped: Event) -> bool:
+    """Puts an item into a bounded queue, but gives up once the stream is stopped."""
+    while not stopped.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _get(queue: Queue, stopped: Event) -> Any | None:
+    """Gets an item from a queue or None once the stream is stopped."""
+    while not stopped.is_set():
+        try:
+            return queue.get(timeout=0.1)
+        except Empty:
+            continue
+    return None
+
+
+def _run_stage(
+    components: Sequence[Component],
+    stage: int,
+    item: _StreamItem,
+    metrics: MetricsRecorder | None,
+    manifest: RunManifest | None,
+) -> Result[Any, ComponentError]:
+    try:
+        return _run_steps(
+            _execution_steps(
+                item.value,
+                components,
+                metrics,
+                start=stage,
+                stop=stage + 1,
+                article_number=item.article_number,
+                manifest=manifest,
+            )
+        )
+    except Exception as e:
+        logger.error(
+            f"{components[stage]._name} raised an exception for article {item.article_number}: {e}"
+        )
+        return Err(
+            ComponentError(
+                f"{components[stage]._name} crashed for article {item.article_number}: {e}"
+            )
+        )
+
+
+async def _ainvoke(component: Component, input: Any) -> Result[Any, ComponentError]:
+    if isinstance(component, AsyncComponent):
+        return await component.ainvoke(input)
+
+    return await asyncio.to_thread(component.invoke, input)
+
+
+def _execution_steps(
+    initial_input: Any,
+    components: Sequence[Component],
+    metrics: MetricsRecorder | None,
+    start: int = 0,
+    stop: int | None = None,
+    article_number: int | None = None,
+    manifest: RunManifest | None = None,
+) -> Generator[
+    tuple[Component, Any], Result[Any, ComponentError], Result[Any, ComponentError]
+]:
+    """Implements the control flow shared by all executors.
+
+    Yields the next component together with its input and expects the result of the
+    invocation to be sent back. Returns the final result of the chain. With `start`
+    and `stop` only a slice of the components is executed – e.g. a single stage of
+    the streaming executor; `_repeat_previous` may still step back before `start`.
+    """
+    index = start
+    stop = len(components) if stop is None else stop
     retries = 0
     result = initial_input
+    article_number = (
+        getattr(initial_input, "article_number", None)
+        if article_number is None
+        else article_number
+    )
 
-    while index < len(components):
+    while index < stop:
         component = components[index]
-        component_result = component.invoke(result)
+        # hashed before the invocation, components may change their input
+        input_hash = None if manifest is None else content_hash(result)
+
+        if manifest is not None and (
+            checkpoint := manifest.load(
+                article_number, component._name, result, input_hash
+            )
+        ):
+            logger.info(
+                f"Skipping {component._name} for article {article_number}, output found in run manifest."
+            )
+            retries = 0
+            result = checkpoint.output
+            index += 1
+            continue
+
+        invocation_start = perf_counter()
+
+        if metrics is None:
+            record = None
+            component_result = yield component, result
+        else:
+            record = metrics.get(article_number, component._name)
+            record.input_size = measure_size(result)
+
+            with track(record):
+                component_result = yield component, result
 
         if is_err(component_result):
             logger.error(component_result.unwrap_err().message)
@@ -72,17 +552,36 @@ def executor(
                 )
                 retries += 1
                 index -= 1
+                if record:
+                    record.retries += 1
                 continue
 
             logger.warning(f"Retrying {component._name}...")
             retries += 1
+            if record:
+                record.retries += 1
             continue
 
         if is_ok(component_result):
             retries = 0
+
+            if manifest is not None:
+                manifest.store(
+                    article_number,
+                    component._name,
+                    result,
+                    component_result.unwrap(),
+                    perf_counter() - invocation_start,
+                    input_hash,
+                )
+
             result = component_result.unwrap()
             logger.success(f"{component._name} succeeded with result:\n{result}")
 
+            if record:
+                record.output_size = measure_size(result)
+                record.succeeded = True
+
             index += 1
 
     return Ok(result)
@@ -5,10 +5,9 @@ from typeguard import typechecked
 
 from ssrq_retro_lab.pipeline.components.protocol import Component, ComponentError
 from ssrq_retro_lab.pipeline.components.text_extractor import TextExtractionResult
-from ssrq_retro_lab.pipeline.parser.html_to_article import (
-    collect_article_nodes_from_pages,
-    remove_header_from_pages,
-)
+from ssrq_retro_lab.pipeline.parser.article_index import get_article_index
+from ssrq_retro_lab.pipeline.parser.header_mask import remove_page_furniture
+from ssrq_retro_lab.pipeline.parser.html_to_article import collect_article_nodes
 
 
 class HTMLTextExtractionResult(TextExtractionResult):
@@ -24,20 +23,22 @@ class HTMLWrangler(Component):
     def invoke(
         self, text: TextExtractionResult
     ) -> Result[HTMLTextExtractionResult, ComponentError]:
-        pages_without_header = remove_header_from_pages(pages=text["pages"])
+        # the pages are parsed once, header removal and article slicing share the tree
+        pages_without_header = remove_page_furniture(pages=text["pages"])
 
         if is_err(pages_without_header):
             return Err(ComponentError(pages_without_header.unwrap_err().args[0]))
 
         text["pages"] = pages_without_header.unwrap()
 
-        logger.debug(
-            f"Pages after removing header for article {text['entry'].no}:\n {text['pages']}"
+        # serialising the pages is only worth it, if debug messages are logged
+        logger.opt(lazy=True).debug(
+            "Pages after removing header for article {}:\n {}",
+            lambda: text["entry"].no,
+            lambda: [page.html for page in text["pages"]],
         )
 
-        article_nodes = collect_article_nodes_from_pages(
-            text["pages"], text["entry"].no, text["entry"].no + 1
-        )
+        article_nodes = self._collect_article_nodes(text)
 
         if is_err(article_nodes):
             return Err(ComponentError(article_nodes.unwrap_err().args[0]))
@@ -53,3 +54,26 @@ class HTMLWrangler(Component):
                 entry=text["entry"], pages=text["pages"], article=article_result
             )
         )
+
+    def _collect_article_nodes(
+        self, text: TextExtractionResult
+    ) -> Result[tuple[Selector, ...], ValueError]:
+        """Slices the article with the boundary index of its volume – if available.
+        Otherwise (or for pages not in the index) the pages are searched for the
+        article numbers."""
+        volume_paths = {page.volume_path for page in text["pages"]}
+        current_number, next_number = text["entry"].no, text["entry"].no + 1
+
+        if len(volume_paths) == 1 and (volume_path := volume_paths.pop()) is not None:
+            article_index = get_article_index(volume_path, build=False)
+
+            article_nodes = (
+                article_index.slice_article(text["pages"], current_number, next_number)
+                if article_index is not None
+                else None
+            )
+
+            if article_nodes is not None:
+                return article_nodes
+
+        return collect_article_nodes(text["pages"], current_number, next_number)
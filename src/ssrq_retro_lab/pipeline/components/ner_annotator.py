@@ -1,17 +1,42 @@
-from typing import cast
+import os
+from functools import cache
+from threading import Lock
+from time import perf_counter
+from typing import Sequence, cast
 
-from diskcache import Cache
+import spacy
 from result import Err, Ok, Result, is_err
+from spacy.language import Language
 from spacy.tokens import Doc, DocBin
+from spacy.vocab import Vocab
 from spacy_llm.util import assemble
 from typeguard import typechecked
 
-from ssrq_retro_lab.config import CACHE_DIR, PROJECT_ROOT, ZG_DATA_ROOT
+from ssrq_retro_lab.config import PROJECT_ROOT, ZG_DATA_ROOT
+from ssrq_retro_lab.pipeline import metrics
+from ssrq_retro_lab.pipeline.cache import (
+    NamespaceCache,
+    create_cache_key,
+    file_version,
+    get_cache,
+)
 from ssrq_retro_lab.pipeline.components.ocr_corrector import StructuredCorrectedArticle
 from ssrq_retro_lab.pipeline.components.protocol import Component, ComponentError
-from ssrq_retro_lab.pipeline.components.text_classifier import TextClassifier
+from ssrq_retro_lab.pipeline.llm.backend import get_backend_mode
+from ssrq_retro_lab.pipeline.llm.chat import acquire_rate_limit
+from ssrq_retro_lab.pipeline.llm.spacy_model import BACKEND_MODEL
 from loguru import logger
 
+NER_CONFIG = PROJECT_ROOT / "spacy_config.cfg"
+NER_EXAMPLES = ZG_DATA_ROOT / "examples" / "few-shot-ner.json"
+NER_MODEL = "gpt-4"
+NER_LANGUAGE = "de"
+# the number of NER prompts sent at the same time; enables the concurrent model
+NER_CONCURRENCY_ENV = "SSRQ_NER_CONCURRENCY"
+
+_PIPELINES: dict[tuple, Language] = {}
+_PIPELINES_LOCK = Lock()
+
 
 class NERAnnotator(Component):
     _allowed_retries = 0
@@ -23,62 +48,228 @@ class NERAnnotator(Component):
         self,
         corrected_article: StructuredCorrectedArticle,
     ) -> Result[tuple[StructuredCorrectedArticle, Doc], ComponentError]:
-        with Cache(CACHE_DIR / self._name) as cache:
-            annotated_text = self._annotate(corrected_article, cache)
+        cache = get_cache(self._name)
+        annotated_text = self._annotate(corrected_article, cache)
 
-            if is_err(annotated_text):
-                return annotated_text
+        if is_err(annotated_text):
+            return annotated_text
+
+        annotations = annotated_text.unwrap()
+
+        self._log_annotations(annotations)
+
+        return Ok(
+            (
+                corrected_article,
+                annotations,
+            )
+        )
+
+    def annotate_many(
+        self,
+        corrected_articles: Sequence[StructuredCorrectedArticle],
+        batch_size: int = 16,
+    ) -> list[Result[tuple[StructuredCorrectedArticle, Doc], ComponentError]]:
+        """Annotates many articles at once, e.g. all articles of a volume.
+
+        Cached articles are loaded from the cache, the others are passed to
+        `nlp.pipe` in batches of `batch_size` articles. The prompts of a batch are
+        sent to the LLM concurrently, if `SSRQ_NER_CONCURRENCY` is set (see
+        `_create_config_overrides`). Every annotated article is stored in the
+        per-article cache, so `invoke` finds it afterwards.
+
+        Args:
+            corrected_articles: The articles to annotate.
+            batch_size: The number of articles annotated at once.
+
+        Returns:
+            The results in the order of the given articles.
+        """
+        cache = get_cache(self._name)
+        annotations: dict[str, Result[Doc, ComponentError]] = {}
+        uncached_texts: dict[str, str] = {}
+
+        for corrected_article in corrected_articles:
+            cache_key = self._create_cache_key(corrected_article)
 
-            annotations = annotated_text.unwrap()
+            if cache_key in annotations or cache_key in uncached_texts:
+                continue
 
-            self._log_annotations(annotations)
+            if cache_key in cache:
+                metrics.record_cache_hit()
+                annotations[cache_key] = Ok(self._load_annotations(cache_key, cache))
+            else:
+                metrics.record_cache_miss()
+                uncached_texts[cache_key] = self._create_text(corrected_article)
 
-            return Ok(
-                (
-                    corrected_article,
-                    annotations,
+        cache_keys = list(uncached_texts)
+
+        for start in range(0, len(cache_keys), max(1, batch_size)):
+            batch = cache_keys[start : start + max(1, batch_size)]
+
+            try:
+                self._acquire_rate_limit(
+                    [uncached_texts[cache_key] for cache_key in batch]
                 )
+                docs = get_ner_pipeline().pipe(
+                    (uncached_texts[cache_key] for cache_key in batch),
+                    batch_size=len(batch),
+                )
+
+                for cache_key, doc in zip(batch, docs):
+                    self._store_annotations(doc, cache_key, cache)
+                    annotations[cache_key] = Ok(doc)
+            except Exception as e:
+                for cache_key in batch:
+                    annotations.setdefault(
+                        cache_key, Err(ComponentError(f"Failed to annotate text: {e}"))
+                    )
+
+            logger.debug(
+                f"Annotated {min(start + len(batch), len(cache_keys))} of {len(cache_keys)} uncached articles."
             )
 
+        results: list[
+            Result[tuple[StructuredCorrectedArticle, Doc], ComponentError]
+        ] = []
+
+        for corrected_article in corrected_articles:
+            annotated_text = annotations[self._create_cache_key(corrected_article)]
+
+            if is_err(annotated_text):
+                results.append(annotated_text)
+            else:
+                results.append(Ok((corrected_article, annotated_text.unwrap())))
+
+        return results
+
     def _annotate(
         self,
         corrected_article: StructuredCorrectedArticle,
-        cache: Cache,
+        cache: NamespaceCache,
     ) -> Result[Doc, ComponentError]:
-        cache_key = TextClassifier.create_cache_key(
-            "ner_annotated".join(corrected_article.corrected_text.text)
-        )
-        nlp = assemble(
-            (PROJECT_ROOT / "spacy_config.cfg"),
-            overrides={
-                "paths.examples": str((ZG_DATA_ROOT / "examples" / "few-shot-ner.json"))
-            },
-        )
+        cache_key = self._create_cache_key(corrected_article)
         if cache_key in cache:
+            metrics.record_cache_hit()
             logger.debug(
                 f"Annotated text with key {cache_key} / article number {corrected_article.article_number} found in cache."
             )
-            return Ok(
-                cast(
-                    Doc,
-                    list(
-                        DocBin()
-                        .from_bytes(cast(bytes, cache[cache_key]))
-                        .get_docs(nlp.vocab)
-                    )[0],
-                )
-            )
+            return Ok(self._load_annotations(cache_key, cache))
+
+        metrics.record_cache_miss()
 
         try:
-            doc = nlp("\n".join(corrected_article.corrected_text.text))
-            doc_bin = DocBin()
-            doc_bin.add(doc)
-            cache[cache_key] = doc_bin.to_bytes()
+            text = self._create_text(corrected_article)
+            self._acquire_rate_limit([text])
+            doc = get_ner_pipeline()(text)
+            self._store_annotations(doc, cache_key, cache)
         except Exception as e:
             return Err(ComponentError(f"Failed to annotate text: {e}"))
 
         return Ok(doc)
 
+    @staticmethod
+    def _acquire_rate_limit(texts: Sequence[str]) -> None:
+        """Waits until the requests for the given texts are allowed by the rate
+        limits. Only the configured model of spaCy-LLM sends its requests past
+        `pipeline.llm.chat`, the backend model is throttled by `generate`."""
+        if (
+            "components.llm.model.@llm_models"
+            in NERAnnotator._create_config_overrides()
+        ):
+            return
+
+        # every prompt contains the few-shot examples
+        examples = NER_EXAMPLES.read_text(encoding="utf-8")
+
+        for text in texts:
+            acquire_rate_limit(f"{examples}\n{text}", NER_MODEL)
+
+    @staticmethod
+    def _create_text(corrected_article: StructuredCorrectedArticle) -> str:
+        return "\n".join(corrected_article.corrected_text.text)
+
+    @staticmethod
+    def _load_annotations(cache_key: str, cache: NamespaceCache) -> Doc:
+        return cast(
+            Doc,
+            list(
+                DocBin().from_bytes(cast(bytes, cache[cache_key])).get_docs(get_vocab())
+            )[0],
+        )
+
+    @staticmethod
+    def _store_annotations(doc: Doc, cache_key: str, cache: NamespaceCache) -> None:
+        doc_bin = DocBin()
+        doc_bin.add(doc)
+        cache[cache_key] = doc_bin.to_bytes()
+
+    @staticmethod
+    def _create_cache_key(corrected_article: StructuredCorrectedArticle) -> str:
+        # the labels and the prompt are defined by the config and the examples,
+        # a swapped model (see `_create_config_overrides`) answers differently
+        model = NERAnnotator._create_config_overrides().get(
+            "components.llm.model.@llm_models"
+        )
+        return create_cache_key(
+            NERAnnotator._create_text(corrected_article),
+            NER_MODEL if model is None else f"{NER_MODEL}@{model}",
+            f"{file_version(NER_CONFIG)}+{file_version(NER_EXAMPLES)}",
+        )
+
+    @staticmethod
+    def _create_config_overrides() -> dict[str, str | int]:
+        """Creates the overrides of the spaCy config. The model of the config is
+        replaced by `ssrq.Backend.v1` (at temperature 0) to record / replay the
+        responses like all other components or – opt-in via `SSRQ_NER_CONCURRENCY`
+        – to send the prompts of a batch concurrently."""
+        overrides: dict[str, str | int] = {"paths.examples": str(NER_EXAMPLES)}
+        concurrency = os.environ.get(NER_CONCURRENCY_ENV, "")
+
+        if get_backend_mode() != "live" or concurrency:
+            overrides["components.llm.model.@llm_models"] = BACKEND_MODEL
+
+        if concurrency:
+            overrides["components.llm.model.max_concurrency"] = int(concurrency)
+
+        return overrides
+
     def _log_annotations(self, doc: Doc):
         for ent in doc.ents:
             logger.debug(f"Entity: {ent.text}, Label: {ent.label_}")
+
+
+def get_ner_pipeline() -> Language:
+    """Returns the spaCy-LLM pipeline used for NER.
+
+    Assembling the pipeline (parsing the config, resolving the registries, reading
+    the few-shot examples and setting up the model) is expensive, so it's done
+    once per process. The time needed is logged.
+
+    Returns:
+        The assembled pipeline.
+    """
+    overrides = NERAnnotator._create_config_overrides()
+    # a changed config or changed examples result in a new pipeline
+    key = (
+        file_version(NER_CONFIG),
+        file_version(NER_EXAMPLES),
+        *sorted(overrides.items()),
+    )
+
+    with _PIPELINES_LOCK:
+        if key not in _PIPELINES:
+            start = perf_counter()
+            _PIPELINES[key] = assemble(NER_CONFIG, overrides=overrides)
+            logger.info(
+                f"Assembled spaCy-LLM pipeline for NER in {perf_counter() - start:.2f}s"
+            )
+
+        return _PIPELINES[key]
+
+
+@cache
+def get_vocab() -> Vocab:
+    """Returns the vocab used to deserialize cached annotations – without
+    assembling the complete NER pipeline."""
+    return spacy.blank(NER_LANGUAGE).vocab
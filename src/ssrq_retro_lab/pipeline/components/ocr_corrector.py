@@ -1,23 +1,21 @@
 import json
 from typing import cast
 
-from diskcache import Cache
 from loguru import logger
 from pydantic import BaseModel
 from result import Err, Ok, Result, is_err, is_ok
 from typeguard import typechecked
 
-from ssrq_retro_lab.config import CACHE_DIR
+from ssrq_retro_lab.pipeline import metrics
+from ssrq_retro_lab.pipeline.cache import NamespaceCache, create_cache_key, get_cache
 from ssrq_retro_lab.pipeline.components.protocol import Component, ComponentError
-from ssrq_retro_lab.pipeline.components.text_classifier import (
-    StructuredArticle,
-    TextClassifier,
-)
+from ssrq_retro_lab.pipeline.components.text_classifier import StructuredArticle
 from ssrq_retro_lab.pipeline.llm.chat import (
+    agenerate,
     create_chat_completion_param,
     generate,
 )
-from ssrq_retro_lab.pipeline.templates.utils import render_template
+from ssrq_retro_lab.pipeline.templates.utils import render_template, template_version
 from ssrq_retro_lab.train.messages import SYSTEM_ROLE_V2
 
 
@@ -25,6 +23,10 @@ class CorrectedOCRText(BaseModel):
     text: list[str]
 
 
+CORRECTION_SCHEMA = json.dumps(CorrectedOCRText.model_json_schema(), indent=2)
+CORRECTION_TEMPLATE = "openai_ocr_training_user_v2.jinja2"
+
+
 class StructuredCorrectedArticle(StructuredArticle):
     corrected_references: CorrectedOCRText
     corrected_summary: CorrectedOCRText
@@ -36,13 +38,49 @@ class OCRCorrector(Component):
     _name = "OCRCorrector"
     _repeat_previous = False
     TOKEN_LIMIT = 16385
+    MODEL_NAME = "ft:gpt-3.5-turbo-1106:personal:ssrq-ocr-cor:8tgnqalq"
 
     @typechecked
     def invoke(
         self, article: StructuredArticle
     ) -> Result[StructuredCorrectedArticle, ComponentError]:
+        corrected_article = self._create_corrected_article(article)
+
+        cache = get_cache(self._name)
+        corrected_text = self._correct(
+            self._create_text_correction_prompt(corrected_article), cache
+        )
+
+        if is_err(corrected_text):
+            return Err(corrected_text.unwrap_err())
+
+        corrected_article.corrected_text = corrected_text.unwrap()
+
+        return Ok(corrected_article)
+
+    @typechecked
+    async def ainvoke(
+        self, article: StructuredArticle
+    ) -> Result[StructuredCorrectedArticle, ComponentError]:
+        corrected_article = self._create_corrected_article(article)
+
+        cache = get_cache(self._name)
+        corrected_text = await self._acorrect(
+            self._create_text_correction_prompt(corrected_article), cache
+        )
+
+        if is_err(corrected_text):
+            return Err(corrected_text.unwrap_err())
+
+        corrected_article.corrected_text = corrected_text.unwrap()
+
+        return Ok(corrected_article)
+
+    def _create_corrected_article(
+        self, article: StructuredArticle
+    ) -> StructuredCorrectedArticle:
         # ToDo: Implement correction of references and summary
-        corrected_article = StructuredCorrectedArticle(
+        return StructuredCorrectedArticle(
             article_number=article.article_number,
             date=article.date,
             corrected_references=CorrectedOCRText(text=article.references),
@@ -53,46 +91,80 @@ class OCRCorrector(Component):
             text=article.text,
             title=article.title,
         )
-        with Cache(CACHE_DIR / self._name) as cache:
-            text_correction_prompt = render_template(
-                template_name="openai_ocr_training_user_v2.jinja2",
-                schema=json.dumps(CorrectedOCRText.model_json_schema(), indent=2),
-                text_input=json.dumps(
-                    corrected_article.text, indent=2, ensure_ascii=False
-                ),
-            )
-
-            corrected_text = self._correct(text_correction_prompt, cache)
-
-            if is_err(corrected_text):
-                return Err(corrected_text.unwrap_err())
-
-            corrected_article.corrected_text = corrected_text.unwrap()
 
-        return Ok(corrected_article)
+    def _create_text_correction_prompt(
+        self, corrected_article: StructuredCorrectedArticle
+    ) -> str:
+        return render_template(
+            template_name=CORRECTION_TEMPLATE,
+            schema=CORRECTION_SCHEMA,
+            text_input=json.dumps(corrected_article.text, indent=2, ensure_ascii=False),
+        )
 
     def _correct(
-        self, user_prompt: str, cache: Cache
+        self, user_prompt: str, cache: NamespaceCache
     ) -> Result[CorrectedOCRText, ComponentError]:
         # ToDo: Check if user prompt exceeds token limit
-        cache_key = TextClassifier.create_cache_key(user_prompt)
+        cache_key = self._create_cache_key(user_prompt)
 
         if cache_key in cache:
-            logger.debug(f"Correction result for '{user_prompt}' found in cache")
-            logger.debug(f"Correction result from cache:\n {cache[cache_key]}")
-            return self._validate_correction_result(cast(str, cache[cache_key]))
+            metrics.record_cache_hit()
+            return self._load_cached_correction(user_prompt, cache_key, cache)
 
-        messages = create_chat_completion_param(
-            system=SYSTEM_ROLE_V2, user=user_prompt, assistant=None
-        )
+        metrics.record_cache_miss()
 
         result = generate(
-            prompt=messages,
-            model_name="ft:gpt-3.5-turbo-1106:personal:ssrq-ocr-cor:8tgnqalq",
+            prompt=self._create_messages(user_prompt),
+            model_name=self.MODEL_NAME,
             extract_language=True,
             language="json",
         )
 
+        return self._store_correction_result(result, cache_key, cache)
+
+    async def _acorrect(
+        self, user_prompt: str, cache: NamespaceCache
+    ) -> Result[CorrectedOCRText, ComponentError]:
+        cache_key = self._create_cache_key(user_prompt)
+
+        if cache_key in cache:
+            metrics.record_cache_hit()
+            return self._load_cached_correction(user_prompt, cache_key, cache)
+
+        metrics.record_cache_miss()
+
+        result = await agenerate(
+            prompt=self._create_messages(user_prompt),
+            model_name=self.MODEL_NAME,
+            extract_language=True,
+            language="json",
+        )
+
+        return self._store_correction_result(result, cache_key, cache)
+
+    def _create_cache_key(self, user_prompt: str) -> str:
+        return create_cache_key(
+            user_prompt,
+            self.MODEL_NAME,
+            template_version(CORRECTION_TEMPLATE),
+            CORRECTION_SCHEMA,
+        )
+
+    def _create_messages(self, user_prompt: str):
+        return create_chat_completion_param(
+            system=SYSTEM_ROLE_V2, user=user_prompt, assistant=None
+        )
+
+    def _load_cached_correction(
+        self, user_prompt: str, cache_key: str, cache: NamespaceCache
+    ) -> Result[CorrectedOCRText, ComponentError]:
+        logger.debug(f"Correction result for '{user_prompt}' found in cache")
+        logger.debug(f"Correction result from cache:\n {cache[cache_key]}")
+        return self._validate_correction_result(cast(str, cache[cache_key]))
+
+    def _store_correction_result(
+        self, result: Result[str, ValueError], cache_key: str, cache: NamespaceCache
+    ) -> Result[CorrectedOCRText, ComponentError]:
         if result.is_err():
             return Err(ComponentError(result.unwrap_err().args[0]))
 
@@ -6,6 +6,7 @@ from result import Result
 class ComponentError(Exception):
     def __init__(self, message: str):
         self.message = message
+        super().__init__(message)
 
 
 @runtime_checkable
@@ -16,3 +17,13 @@ class Component(Protocol):
 
     def invoke(self, input: Any) -> Result[Any, ComponentError]:
         ...
+
+
+@runtime_checkable
+class AsyncComponent(Component, Protocol):
+    """A component, which can be awaited – e.g. because it waits for
+    a network round-trip. Components without an async variant are executed
+    in a worker thread by the async executor."""
+
+    async def ainvoke(self, input: Any) -> Result[Any, ComponentError]:
+        ...
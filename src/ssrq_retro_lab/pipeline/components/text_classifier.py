@@ -1,22 +1,36 @@
+import asyncio
 import json
-from hashlib import md5
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from typing import Literal, cast
 
-from diskcache import Cache  # type: ignore
 from loguru import logger
 from pydantic import BaseModel
-from result import Err, Ok, Result
+from result import Err, Ok, Result, is_err
 from spacy_llm.registry.reader import fewshot_reader
 from textdistance import cosine
 from typeguard import typechecked
 
-from ssrq_retro_lab.config import CACHE_DIR, ZG_DATA_ROOT
+from ssrq_retro_lab.config import ZG_DATA_ROOT
+from ssrq_retro_lab.pipeline import metrics
+from ssrq_retro_lab.pipeline.cache import (
+    NamespaceCache,
+    create_cache_key,
+    file_version,
+    get_cache,
+)
 from ssrq_retro_lab.pipeline.components.html_wrangler import HTMLTextExtractionResult
 from ssrq_retro_lab.pipeline.components.protocol import Component, ComponentError
-from ssrq_retro_lab.pipeline.llm.chat import generate
-from ssrq_retro_lab.pipeline.templates.utils import render_template
+from ssrq_retro_lab.pipeline.components.textline_rules import (
+    RuleMatch,
+    classify_by_rules,
+)
+from ssrq_retro_lab.pipeline.llm.chat import agenerate, count_tokens, generate
+from ssrq_retro_lab.pipeline.templates.utils import render_template, template_version
 
 CLASSIFICATON_DEFAULT_TEMPLATE = "textline_classification_v1.jinja2"
+CLASSIFICATION_BATCH_TEMPLATE = "textline_classification_batch_v1.jinja2"
+CLASSIFICATION_MODEL = "gpt-3.5-turbo"
 FEWSHORT_EXAMPLE = ZG_DATA_ROOT / "examples" / "few-shot-article-lines.json"
 
 TextLabels = Literal["LINENUMBER", "REFERENCE", "SUMMARY", "TITLE", "TEXT"]
@@ -32,6 +46,21 @@ class ClassifiedText(BaseModel):
     classified_text: list[TextClass]
 
 
+CLASSIFICATION_SCHEMA = json.dumps(ClassifiedText.model_json_schema(), indent=2)
+
+
+class ClassifiedParagraph(BaseModel):
+    paragraph: int
+    classified_text: list[TextClass]
+
+
+class BatchClassifiedText(BaseModel):
+    paragraphs: list[ClassifiedParagraph]
+
+
+BATCH_SCHEMA = json.dumps(BatchClassifiedText.model_json_schema(), indent=2)
+
+
 class StructuredArticle(BaseModel):
     article_number: int
     date: str
@@ -45,11 +74,387 @@ class TextClassifier(Component):
     _allowed_retries = 1
     _name = "TextClassifier"
     _repeat_previous = False
-    structured_article: StructuredArticle
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        batch_token_budget: int | None = None,
+        use_rules: bool = True,
+    ):
+        """Initializes a new TextClassifier.
+
+        Args:
+            max_concurrency: The maximum number of requests for the uncached text lines
+                of an article, which are sent to the LLM at the same time.
+            batch_token_budget: If set, the uncached text lines are packed into as few
+                prompts as possible, each one at most this number of tokens long. If
+                None, every text line is classified with its own prompt.
+            use_rules: If True, obvious text lines (line numbers and archival
+                references) are classified by rules and not sent to the LLM. How
+                many lines the rules classify and how often they disagree with the
+                cached labels of the LLM is reported to the metrics recorder.
+        """
+        self.max_concurrency = max_concurrency
+        self.batch_token_budget = batch_token_budget
+        self.use_rules = use_rules
 
     @typechecked
     def invoke(self, text: HTMLTextExtractionResult):
-        self.structured_article = StructuredArticle(
+        structured_article = self._create_structured_article(text)
+        prompt_context = self._create_prompt_context()
+        textlines = self._collect_textlines(text)
+
+        cache = get_cache(self._name)
+        classification_results = self._classify_textlines(
+            textlines, structured_article.article_number, cache, prompt_context
+        )
+
+        return self._merge_classification_results(
+            structured_article, text["entry"].title, textlines, classification_results
+        )
+
+    @typechecked
+    async def ainvoke(self, text: HTMLTextExtractionResult):
+        structured_article = self._create_structured_article(text)
+        prompt_context = self._create_prompt_context()
+        textlines = self._collect_textlines(text)
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def classify(textline: str) -> Result[str, ValueError]:
+            if textline in rule_results:
+                return rule_results[textline]
+
+            async with semaphore:
+                return await self._aclassify_textline(
+                    textline=textline,
+                    article_number=structured_article.article_number,
+                    cache=cache,
+                    **prompt_context,
+                )
+
+        cache = get_cache(self._name)
+        rule_results = self._classify_by_rules(
+            textlines, structured_article.article_number, cache
+        )
+        # identical lines are only classified once
+        unique_textlines = list(dict.fromkeys(textlines))
+        results = dict(
+            zip(
+                unique_textlines,
+                await asyncio.gather(
+                    *(classify(textline) for textline in unique_textlines)
+                ),
+            )
+        )
+
+        return self._merge_classification_results(
+            structured_article,
+            text["entry"].title,
+            textlines,
+            [results[textline] for textline in textlines],
+        )
+
+    def _classify_textlines(
+        self,
+        textlines: list[str],
+        article_number: int,
+        cache: NamespaceCache,
+        prompt_context: dict,
+    ) -> list[Result[str, ValueError]]:
+        """Classifies all text lines of an article. Obvious lines are classified by
+        rules, cached lines are looked up directly, the uncached ones are sent to the
+        LLM concurrently (at most `max_concurrency` at the same time). Identical lines
+        are only classified once.
+
+        Args:
+            textlines: The text lines in document order.
+            article_number: The number of the article.
+            cache: The cache of the classification results.
+            prompt_context: The schema, examples and labels used for the prompt.
+
+        Returns:
+            The classification results in document order.
+        """
+
+        def classify(textline: str) -> Result[str, ValueError]:
+            return self._classify_textline(
+                textline=textline,
+                article_number=article_number,
+                cache=cache,
+                **prompt_context,
+            )
+
+        results = self._classify_by_rules(textlines, article_number, cache)
+        uncached_textlines: list[str] = []
+
+        def classify_batch(batch: list[str]) -> dict[str, Result[str, ValueError]]:
+            return self._classify_textline_batch(
+                textlines=batch,
+                article_number=article_number,
+                cache=cache,
+                **prompt_context,
+            )
+
+        for textline in dict.fromkeys(textlines):
+            if textline in results:
+                continue
+
+            if TextClassifier.create_cache_key(textline) in cache:
+                results[textline] = classify(textline)
+            else:
+                uncached_textlines.append(textline)
+
+        if self.batch_token_budget is not None and len(uncached_textlines) > 1:
+            batches = self._pack_textlines(
+                uncached_textlines, article_number, prompt_context
+            )
+
+            with ThreadPoolExecutor(
+                max_workers=max(1, min(self.max_concurrency, len(batches)))
+            ) as pool:
+                futures = [
+                    pool.submit(copy_context().run, classify_batch, batch)
+                    for batch in batches
+                ]
+
+                for future in futures:
+                    results.update(future.result())
+        elif self.max_concurrency <= 1 or len(uncached_textlines) <= 1:
+            results.update({t: classify(t) for t in uncached_textlines})
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrency, len(uncached_textlines))
+            ) as pool:
+                futures = {
+                    textline: pool.submit(copy_context().run, classify, textline)
+                    for textline in uncached_textlines
+                }
+                results.update({t: future.result() for t, future in futures.items()})
+
+        return [results[textline] for textline in textlines]
+
+    def _classify_by_rules(
+        self, textlines: list[str], article_number: int, cache: NamespaceCache
+    ) -> dict[str, Result[str, ValueError]]:
+        """Classifies the obvious text lines with `classify_by_rules`. The results
+        are not cached, because the rules are cheaper than a cache lookup.
+
+        Args:
+            textlines: The text lines in document order.
+            article_number: The number of the article.
+            cache: The cache of the classification results of the LLM, which the
+                rules are compared with.
+
+        Returns:
+            The classification results of the text lines classified by the rules.
+        """
+        results: dict[str, Result[str, ValueError]] = {}
+
+        if not self.use_rules:
+            return results
+
+        unique_textlines = dict.fromkeys(textlines)
+
+        for textline in unique_textlines:
+            match = classify_by_rules(textline)
+
+            if match is None:
+                metrics.record_rule_match(False)
+                continue
+
+            cached_result = cache.get(TextClassifier.create_cache_key(textline))
+            metrics.record_rule_match(True, self._agrees_with(match, cached_result))
+            results[textline] = Ok(
+                ClassifiedText(
+                    classified_text=[
+                        TextClass(text=match.text, label=match.label, reason=match.reason)  # type: ignore
+                    ]
+                ).model_dump_json()
+            )
+
+        logger.debug(
+            f"Classified {len(results)} of {len(unique_textlines)} text lines of article {article_number} by rules."
+        )
+
+        return results
+
+    def _agrees_with(self, match: RuleMatch, cached_result: str | None) -> bool | None:
+        if cached_result is None:
+            return None
+
+        try:
+            classified_text = ClassifiedText.model_validate_json(
+                self._extract_json_from_result(cached_result)
+            )
+        except Exception:
+            return None
+
+        labels = {c.label for c in classified_text.classified_text}
+
+        if labels != {match.label}:
+            logger.debug(
+                f"Rules classify {match.text} as {match.label}, the LLM as {sorted(labels)}."
+            )
+
+        return labels == {match.label}
+
+    def _pack_textlines(
+        self, textlines: list[str], article_number: int, prompt_context: dict
+    ) -> list[list[str]]:
+        """Packs the text lines greedily (in document order) into batches, whose
+        rendered prompt does not exceed the token budget. A single line, which
+        exceeds the budget on its own, becomes a batch of its own.
+
+        The prompt is rendered only twice: the tokens of a batch are the tokens of
+        the prompt without lines plus the tokens of each line and the markup around
+        it, so every line is tokenized once.
+
+        Args:
+            textlines: The text lines to pack.
+            article_number: The number of the article.
+            prompt_context: The schema, examples and labels used for the prompt.
+
+        Returns:
+            The batches of text lines.
+        """
+        budget = cast(int, self.batch_token_budget)
+        prompt_tokens, paragraph_tokens = (
+            count_tokens(
+                self._render_batch_prompt(
+                    paragraphs,
+                    article_number,
+                    prompt_context["examples"],
+                    prompt_context["labels"],
+                ),
+                CLASSIFICATION_MODEL,
+            )
+            for paragraphs in ([], [""])
+        )
+        markup_tokens = paragraph_tokens - prompt_tokens
+        batches: list[list[str]] = []
+        current_batch: list[str] = []
+        current_tokens = prompt_tokens
+
+        for textline in textlines:
+            textline_tokens = markup_tokens + count_tokens(
+                textline, CLASSIFICATION_MODEL
+            )
+
+            if len(current_batch) > 0 and current_tokens + textline_tokens > budget:
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = prompt_tokens
+
+            current_batch.append(textline)
+            current_tokens += textline_tokens
+
+        if current_batch:
+            batches.append(current_batch)
+
+        logger.debug(
+            f"Packed {len(textlines)} text lines of article {article_number} into {len(batches)} prompts."
+        )
+
+        return batches
+
+    def _classify_textline_batch(
+        self,
+        textlines: list[str],
+        article_number: int,
+        cache: NamespaceCache,
+        schema: str,
+        examples,
+        labels,
+    ) -> dict[str, Result[str, ValueError]]:
+        """Classifies many text lines with a single prompt and stores the result of
+        every line in the per-line cache. Lines missing in the answer of the LLM are
+        classified one by one.
+
+        Returns:
+            The classification result per text line.
+        """
+        results: dict[str, Result[str, ValueError]] = {}
+
+        result = generate(
+            self._render_batch_prompt(textlines, article_number, examples, labels),
+            CLASSIFICATION_MODEL,
+            True,
+            "json",
+        )
+
+        if result.is_ok():
+            try:
+                batch_result = BatchClassifiedText.model_validate_json(
+                    self._extract_json_from_result(result.unwrap())
+                )
+            except Exception as e:
+                logger.warning(f"Failed to validate batch classification result: {e}")
+                batch_result = BatchClassifiedText(paragraphs=[])
+
+            for paragraph in batch_result.paragraphs:
+                if not 0 <= paragraph.paragraph < len(textlines):
+                    continue
+
+                textline = textlines[paragraph.paragraph]
+                classification_result = ClassifiedText(
+                    classified_text=paragraph.classified_text
+                ).model_dump_json()
+                cache[TextClassifier.create_cache_key(textline)] = classification_result
+                results[textline] = Ok(classification_result)
+        else:
+            logger.warning(f"Batch classification failed: {result.unwrap_err()}")
+
+        # the lines classified one by one record their misses themselves
+        for _ in results:
+            metrics.record_cache_miss()
+
+        for textline in textlines:
+            if textline not in results:
+                logger.debug(
+                    f"Textline {textline} missing in batch result. Classifying it on its own..."
+                )
+                results[textline] = self._classify_textline(
+                    textline, article_number, cache, schema, examples, labels
+                )
+
+        return results
+
+    def _render_batch_prompt(
+        self, textlines: list[str], article_number: int, examples, labels
+    ) -> str:
+        return render_template(
+            CLASSIFICATION_BATCH_TEMPLATE,
+            paragraphs=textlines,
+            schema=BATCH_SCHEMA,
+            labels=labels,
+            prompt_examples=examples,
+            article_number=f"{article_number}.",
+        )
+
+    def _merge_classification_results(
+        self,
+        structured_article: StructuredArticle,
+        entry_title: str,
+        textlines: list[str],
+        classification_results: list[Result[str, ValueError]],
+    ) -> Result[StructuredArticle, ComponentError]:
+        for textline, classification_result in zip(textlines, classification_results):
+            handled_result = self._handle_raw_classification_result(
+                structured_article,
+                textline,
+                entry_title,
+                classification_result,
+            )
+
+            if is_err(handled_result):
+                return handled_result
+
+        return self._finalize_structured_article(structured_article)
+
+    def _create_structured_article(
+        self, text: HTMLTextExtractionResult
+    ) -> StructuredArticle:
+        return StructuredArticle(
             article_number=text["entry"].no,
             date=text["entry"].date,
             references=[],
@@ -58,81 +463,97 @@ class TextClassifier(Component):
             title=text["entry"].title,
         )
 
-        examples = fewshot_reader(FEWSHORT_EXAMPLE)()
-        schema = json.dumps(ClassifiedText.model_json_schema(), indent=2)
-        labels = TextLabels.__args__  # type: ignore
+    def _create_prompt_context(self) -> dict:
+        return {
+            "examples": fewshot_reader(FEWSHORT_EXAMPLE)(),
+            "schema": CLASSIFICATION_SCHEMA,
+            "labels": TextLabels.__args__,  # type: ignore
+        }
 
-        with Cache((CACHE_DIR / self._name)) as cache:
-            for i, p in enumerate(text["article"]):
-                textline = p.get()
+    def _collect_textlines(self, text: HTMLTextExtractionResult) -> list[str]:
+        textlines = []
 
-                if textline is None:
-                    logger.debug(f"Textline {i} is None. Skipping...")
-                    continue
+        for i, p in enumerate(text["article"]):
+            textline = p.get()
 
-                classification_result = self._classify_textline(
-                    textline=textline,
-                    cache=cache,
-                    schema=schema,
-                    examples=examples,
-                    labels=labels,
-                )
+            if textline is None:
+                logger.debug(f"Textline {i} is None. Skipping...")
+                continue
 
-                if classification_result.is_err():
-                    return Err(
-                        ComponentError(classification_result.unwrap_err().args[0])
-                    )
-
-                try:
-                    validated_classification_result = (
-                        ClassifiedText.model_validate_json(
-                            self._extract_json_from_result(
-                                classification_result.unwrap()
-                            )
-                        )
-                    )
-                except Exception as e:
-                    return Err(
-                        ComponentError(f"Failed to validate classification result: {e}")
-                    )
-
-                self._handle_classification_result(
-                    textline,
-                    text["entry"].title,
-                    validated_classification_result.classified_text,
-                )
+            textlines.append(textline)
 
-        if (
-            len(self.structured_article.text) == 0
-            and len(self.structured_article.summary) == 0
-        ):
+        return textlines
+
+    def _finalize_structured_article(
+        self, structured_article: StructuredArticle
+    ) -> Result[StructuredArticle, ComponentError]:
+        if len(structured_article.text) == 0 and len(structured_article.summary) == 0:
             Err(
                 ComponentError(
-                    f"No text or summary found in the article with number {self.structured_article.article_number}"
+                    f"No text or summary found in the article with number {structured_article.article_number}"
                 )
             )
 
-        return Ok(self.structured_article)
+        return Ok(structured_article)
 
     def _classify_textline(
-        self, textline: str, cache: Cache, schema: str, examples, labels
+        self,
+        textline: str,
+        article_number: int,
+        cache: NamespaceCache,
+        schema: str,
+        examples,
+        labels,
     ) -> Result[str, ValueError]:
         cache_key = TextClassifier.create_cache_key(textline)
 
         if cache_key in cache:
             logger.debug(f"Classification result for {textline} found in cache.")
+            metrics.record_cache_hit()
             return Ok(cast(str, cache[cache_key]))
 
-        prompt = render_template(
-            CLASSIFICATON_DEFAULT_TEMPLATE,
-            paragraph=textline,
-            schema=schema,
-            labels=labels,
-            prompt_examples=examples,
-            article_number=f"{self.structured_article.article_number}.",
+        metrics.record_cache_miss()
+
+        result = generate(
+            self._render_prompt(textline, article_number, schema, examples, labels),
+            CLASSIFICATION_MODEL,
+            True,
+            "json",
         )
 
-        result = generate(prompt, "gpt-3.5-turbo", True, "json")
+        if result.is_err():
+            return Err(ValueError(result.unwrap_err()))
+
+        classification_result = result.unwrap()
+
+        cache[cache_key] = classification_result
+
+        return Ok(classification_result)
+
+    async def _aclassify_textline(
+        self,
+        textline: str,
+        article_number: int,
+        cache: NamespaceCache,
+        schema: str,
+        examples,
+        labels,
+    ) -> Result[str, ValueError]:
+        cache_key = TextClassifier.create_cache_key(textline)
+
+        if cache_key in cache:
+            logger.debug(f"Classification result for {textline} found in cache.")
+            metrics.record_cache_hit()
+            return Ok(cast(str, cache[cache_key]))
+
+        metrics.record_cache_miss()
+
+        result = await agenerate(
+            self._render_prompt(textline, article_number, schema, examples, labels),
+            CLASSIFICATION_MODEL,
+            True,
+            "json",
+        )
 
         if result.is_err():
             return Err(ValueError(result.unwrap_err()))
@@ -143,6 +564,44 @@ class TextClassifier(Component):
 
         return Ok(classification_result)
 
+    def _render_prompt(
+        self, textline: str, article_number: int, schema: str, examples, labels
+    ) -> str:
+        return render_template(
+            CLASSIFICATON_DEFAULT_TEMPLATE,
+            paragraph=textline,
+            schema=schema,
+            labels=labels,
+            prompt_examples=examples,
+            article_number=f"{article_number}.",
+        )
+
+    def _handle_raw_classification_result(
+        self,
+        structured_article: StructuredArticle,
+        textline: str,
+        entry_title: str,
+        classification_result: Result[str, ValueError],
+    ) -> Result[None, ComponentError]:
+        if classification_result.is_err():
+            return Err(ComponentError(classification_result.unwrap_err().args[0]))
+
+        try:
+            validated_classification_result = ClassifiedText.model_validate_json(
+                self._extract_json_from_result(classification_result.unwrap())
+            )
+        except Exception as e:
+            return Err(ComponentError(f"Failed to validate classification result: {e}"))
+
+        self._handle_classification_result(
+            structured_article,
+            textline,
+            entry_title,
+            validated_classification_result.classified_text,
+        )
+
+        return Ok(None)
+
     def _extract_json_from_result(self, result: str) -> str:
         import re
 
@@ -156,7 +615,11 @@ class TextClassifier(Component):
         return result
 
     def _handle_classification_result(
-        self, textline: str, entry_title: str, classified_text: list[TextClass]
+        self,
+        structured_article: StructuredArticle,
+        textline: str,
+        entry_title: str,
+        classified_text: list[TextClass],
     ):
         for c in classified_text:
             match c.label:
@@ -164,25 +627,34 @@ class TextClassifier(Component):
                     logger.debug(f"Skipping line number {c.text}")
                     continue
                 case "REFERENCE":
-                    self.structured_article.references.append(c.text)
+                    structured_article.references.append(c.text)
                 case "SUMMARY":
-                    self.structured_article.summary.append(c.text)
+                    structured_article.summary.append(c.text)
                 case "TITLE":
                     if TextClassifier._is_real_title(
-                        self.structured_article.article_number,
+                        structured_article.article_number,
                         textline,
                         entry_title,
                         c.text,
                     ):
-                        self.structured_article.title = c.text
+                        structured_article.title = c.text
                     else:
-                        self.structured_article.summary.append(c.text)
+                        structured_article.summary.append(c.text)
                 case "TEXT":
-                    self.structured_article.text.append(c.text)
+                    structured_article.text.append(c.text)
 
     @staticmethod
     def create_cache_key(textline: str) -> str:
-        return md5(f"{textline}_classified".encode("utf-8")).hexdigest()
+        """Creates the cache key of the classification of a text line. The key
+        changes with the model, the prompt template, the few-shot examples and the
+        schema. Batched classifications are stored under the same key, because they
+        are validated against the same schema."""
+        return create_cache_key(
+            textline,
+            CLASSIFICATION_MODEL,
+            f"{template_version(CLASSIFICATON_DEFAULT_TEMPLATE)}+{file_version(FEWSHORT_EXAMPLE)}",
+            CLASSIFICATION_SCHEMA,
+        )
 
     @staticmethod
     def _is_real_title(
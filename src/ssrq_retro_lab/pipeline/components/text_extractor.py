@@ -6,9 +6,10 @@ from typeguard import typechecked
 
 from ssrq_retro_lab.config import ZG_DATA_ROOT
 from ssrq_retro_lab.pipeline.components.protocol import Component, ComponentError
-from ssrq_retro_lab.pipeline.parser.xml_toc_parser import VolumeEntry, parse_xml_toc
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import VolumeEntry, load_xml_toc
 from ssrq_retro_lab.pipeline.pdf import extraction
-from ssrq_retro_lab.repository.reader import PDFReader, XMLReader
+from ssrq_retro_lab.repository.reader import get_document_pool
 from pydantic import BaseModel
 
 
@@ -21,7 +22,7 @@ VolumeInfo = namedtuple("VolumeInfo", ["pdf_path", "toc_path"])
 
 class TextExtractionResult(TypedDict):
     entry: VolumeEntry
-    pages: tuple[str, ...]
+    pages: tuple[ParsedPage, ...]
 
 
 class TextExtractor(Component):
@@ -48,9 +49,7 @@ class TextExtractor(Component):
         volume_info = self._map_article_number_to_volume(
             extraction_input.article_number
         )
-        xml_toc_infos = parse_xml_toc(
-            XMLReader(volume_info.toc_path).read(), volume_info.pdf_path
-        )
+        xml_toc_infos = load_xml_toc(volume_info.toc_path, volume_info.pdf_path)
 
         if is_err(xml_toc_infos):
             return Err(ComponentError(xml_toc_infos.unwrap_err().message))
@@ -62,13 +61,23 @@ class TextExtractor(Component):
 
         unwrapped_entry = entry.unwrap()
 
-        pdf = PDFReader(volume_info.pdf_path).read()
+        # the lease is held for the whole extraction, so concurrent articles of
+        # the same volume are extracted one after another
+        with get_document_pool().document(volume_info.pdf_path) as pdf:
+            pages = extraction.extract_pages(
+                pdf=pdf, toc=xml_toc_infos.unwrap(), entry=unwrapped_entry
+            )
+
+        page_numbers = extraction.calc_pdf_pages(
+            xml_toc_infos.unwrap(), unwrapped_entry
+        )
 
         return Ok(
             TextExtractionResult(
                 entry=unwrapped_entry,
-                pages=extraction.extract_pages(
-                    pdf=pdf, toc=xml_toc_infos.unwrap(), entry=unwrapped_entry
+                pages=tuple(
+                    ParsedPage(page, volume_info.pdf_path, number)
+                    for page, number in zip(pages, page_numbers)
                 ),
             )
         )
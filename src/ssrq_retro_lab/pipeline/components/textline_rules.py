@@ -0,0 +1,81 @@
+import re
+from dataclasses import dataclass
+
+from parsel import Selector
+
+__all__ = ["RuleMatch", "classify_by_rules"]
+
+# the transcripts are set in 10pt, the line numbers and the apparatus are smaller
+MAX_LINENUMBER_FONT_SIZE = 7.0
+MAX_REFERENCE_FONT_SIZE = 9.0
+
+_FONT_SIZE = re.compile(r"font-size:\s*(\d+(?:\.\d+)?)pt")
+_LINENUMBER = re.compile(r"[0-9]{1,3}")
+# an archive siglum with a signature (e.g. "StAR 2,178.") or the start of a note
+_REFERENCE = re.compile(
+    r"(?:(?:[A-Z][a-z]*)?A[A-Z]{0,3}\s+[0-9A-Z]|Vgl\.|Druck|Abschrift|Kopie|Lit\.)"
+)
+
+
+@dataclass(frozen=True, slots=True)
+class RuleMatch:
+    """A text line, which was classified by the rules.
+
+    Attributes:
+        label: The label of the text line.
+        text: The text of the text line.
+        reason: The rule, which matched.
+    """
+
+    label: str
+    text: str
+    reason: str
+
+
+def classify_by_rules(textline: str) -> RuleMatch | None:
+    """Classifies the obvious text lines without the LLM: line numbers and archival
+    references. Only text lines, which consist of a single class, are classified.
+
+    A line number is a multiple of five in a small font. A reference is set in a
+    small bold and italic font and starts with an archive siglum or a note like
+    "Vgl." – see the few-shot examples.
+
+    Args:
+        textline: The paragraph (`<p>`) of the HTML export.
+
+    Returns:
+        The match or None, if no rule is confident.
+    """
+    spans = Selector(text=textline, type="xml").xpath("//span")
+    texts = ["".join(span.root.itertext()) for span in spans]
+    text = "".join(texts).strip()
+    font_sizes = [
+        float(font_size.group(1))
+        for span in spans
+        if (font_size := _FONT_SIZE.search(span.attrib.get("style", "")))
+    ]
+
+    if len(text) == 0 or len(font_sizes) != len(spans):
+        return None
+
+    if (
+        _LINENUMBER.fullmatch(text)
+        and int(text) % 5 == 0
+        and max(font_sizes) <= MAX_LINENUMBER_FONT_SIZE
+    ):
+        return RuleMatch("LINENUMBER", text, "Rule: multiple of five in a small font")
+
+    if (
+        _REFERENCE.match(text)
+        and max(font_sizes) <= MAX_REFERENCE_FONT_SIZE
+        and all(
+            span.root.xpath("boolean(ancestor::b) and boolean(ancestor::i)")
+            for span, span_text in zip(spans, texts)
+            if span_text.strip()
+        )
+    ):
+        return RuleMatch(
+            "REFERENCE", text, "Rule: archival reference in small bold and italics"
+        )
+
+    return None
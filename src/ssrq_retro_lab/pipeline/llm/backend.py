@@ -0,0 +1,275 @@
+import json
+import os
+import random
+import time
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+from typing import Any, Iterable, Literal, Protocol, cast, runtime_checkable
+
+from diskcache import Cache  # type: ignore
+from loguru import logger
+from openai.types.chat import ChatCompletionMessageParam
+from result import Err, Ok, Result
+
+from ssrq_retro_lab.config import CACHE_DIR
+
+__all__ = [
+    "BackendMode",
+    "FakeOpenAIServer",
+    "LLMBackend",
+    "RecordingBackend",
+    "ReplayBackend",
+    "get_backend_mode",
+]
+
+BackendMode = Literal["live", "record", "replay", "fake-server"]
+
+BACKEND_MODE_ENV = "SSRQ_LLM_BACKEND"
+RECORDING_STORE_ENV = "SSRQ_LLM_STORE"
+REPLAY_LATENCY_ENV = "SSRQ_LLM_LATENCY"
+DEFAULT_RECORDING_STORE = CACHE_DIR / "llm_recordings"
+
+
+@runtime_checkable
+class LLMBackend(Protocol):
+    """Sends chat prompts to a model – or pretends to.
+
+    Attributes:
+        rate_limited: Whether requests count against the rate limits of the API.
+    """
+
+    rate_limited: bool
+
+    def complete(
+        self, prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+    ) -> Result[str, str]: ...
+
+
+class RecordingBackend:
+    """Passes all requests to another backend and records the responses.
+
+    The recordings are stored in a diskcache, so many processes can record into
+    the same store.
+
+    Attributes:
+        backend: The backend, which actually answers the requests.
+        store: The directory of the recordings.
+    """
+
+    rate_limited = True
+
+    def __init__(self, backend: LLMBackend, store: Path = DEFAULT_RECORDING_STORE):
+        self.backend = backend
+        self.store = store
+        self._recordings = Cache(store)
+
+    def complete(
+        self, prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+    ) -> Result[str, str]:
+        messages = _normalize_messages(prompt)
+        result = self.backend.complete(messages, model_name)
+
+        if result.is_ok():
+            self._recordings[create_recording_key(messages, model_name)] = (
+                result.unwrap()
+            )
+
+        return result
+
+
+class ReplayBackend:
+    """Answers requests with recorded responses – without any network access.
+
+    Attributes:
+        store: The directory of the recordings.
+        latency: The synthetic latency of every response in seconds.
+        jitter: The maximum random deviation from the latency in seconds.
+    """
+
+    rate_limited = False
+
+    def __init__(
+        self,
+        store: Path = DEFAULT_RECORDING_STORE,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self._recordings = Cache(store)
+
+    def complete(
+        self, prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+    ) -> Result[str, str]:
+        messages = _normalize_messages(prompt)
+        response = self._recordings.get(create_recording_key(messages, model_name))
+
+        if self.latency or self.jitter:
+            time.sleep(
+                max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+            )
+
+        if response is None:
+            return Err(f"No recorded response of {model_name} for prompt:\n {prompt}")
+
+        return Ok(cast(str, response))
+
+
+class FakeOpenAIServer:
+    """A local HTTP server, which plays the chat completions API of OpenAI.
+
+    Requests are answered by another backend (usually a `ReplayBackend`), so the
+    complete HTTP stack of a client can be exercised offline.
+
+    Attributes:
+        backend: The backend, which answers the requests.
+        base_url: The base URL to pass to an OpenAI client.
+    """
+
+    def __init__(self, backend: LLMBackend, host: str = "127.0.0.1", port: int = 0):
+        self.backend = backend
+        self._server = _FakeOpenAIHTTPServer((host, port), _FakeOpenAIHandler)
+        self._server.backend = backend
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        logger.info(f"Fake OpenAI server listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+class _FakeOpenAIHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    backend: LLMBackend
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _FakeOpenAIHTTPServer
+
+    def do_GET(self):
+        if not self.path.endswith("/models"):
+            return self._send(404, {"error": {"message": "Not found"}})
+
+        self._send(200, {"object": "list", "data": []})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        if not self.path.endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": "Not found"}})
+
+        result = self.server.backend.complete(body["messages"], body["model"])
+
+        if result.is_err():
+            return self._send(
+                404, {"error": {"message": result.unwrap_err(), "type": "replay"}}
+            )
+
+        self._send(
+            200,
+            {
+                "id": "chatcmpl-replay",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": result.unwrap()},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                },
+            },
+        )
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: dict[str, Any]) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def get_backend_mode() -> BackendMode:
+    """Returns the backend mode configured by the `SSRQ_LLM_BACKEND` environment
+    variable – `live` if it isn't set.
+
+    The environment is inherited by worker processes, so all processes of a batch
+    run use the same mode."""
+    mode = os.environ.get(BACKEND_MODE_ENV, "live")
+
+    if mode not in ("live", "record", "replay", "fake-server"):
+        raise ValueError(f"Unknown LLM backend mode {mode}")
+
+    return cast(BackendMode, mode)
+
+
+def get_recording_store() -> Path:
+    """Returns the recording store configured by `SSRQ_LLM_STORE`."""
+    return Path(os.environ.get(RECORDING_STORE_ENV, DEFAULT_RECORDING_STORE))
+
+
+def get_replay_latency() -> float:
+    """Returns the synthetic latency configured by `SSRQ_LLM_LATENCY`."""
+    return float(os.environ.get(REPLAY_LATENCY_ENV, 0.0))
+
+
+def create_recording_key(
+    prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+) -> str:
+    """Creates the key of a recorded response.
+
+    Args:
+        prompt: The prompt or the messages of the request.
+        model_name: The name of the model.
+
+    Returns:
+        A hash of the model name and the messages.
+    """
+    return sha256(
+        json.dumps(
+            {"model": model_name, "messages": _normalize_messages(prompt)},
+            sort_keys=True,
+            ensure_ascii=False,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def _normalize_messages(
+    prompt: str | Iterable[ChatCompletionMessageParam],
+) -> list[dict[str, Any]]:
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+
+    return [
+        {"role": message["role"], "content": message.get("content")}
+        for message in prompt
+    ]
@@ -1,31 +1,361 @@
+import asyncio
+import os
+import random
 import re
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from functools import cache
+from threading import Lock
 from typing import Iterable
+from weakref import WeakKeyDictionary
 
+import httpx
 import openai
+import tiktoken
 from loguru import logger
 from openai.types.chat import ChatCompletionMessageParam
 from result import Err, Ok, Result
 
-__all__ = ["create_chat_completion_param", "generate"]
+from ssrq_retro_lab.pipeline.llm.backend import (
+    FakeOpenAIServer,
+    LLMBackend,
+    RecordingBackend,
+    ReplayBackend,
+    get_backend_mode,
+    get_recording_store,
+    get_replay_latency,
+)
+from ssrq_retro_lab.pipeline.llm.rate_limit import RateLimiter
+
+__all__ = [
+    "LLMClient",
+    "acquire_rate_limit",
+    "agenerate",
+    "count_tokens",
+    "create_chat_completion_param",
+    "generate",
+    "get_default_client",
+]
 
 USED_OPENAI_MODEL = [
     "ft:gpt-3.5-turbo-1106:personal:ssrq-ocr-cor:8tgnqalq",
     "gpt-3.5-turbo",
+    "gpt-4",
     "gpt-4-0125-preview",
 ]
 
+# the completion tokens reserved for a request, before its actual usage is known
+COMPLETION_TOKEN_BUDGET = 256
+
+_RETRIED_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class LLMClient:
+    """A reusable client for OpenAI's chat API.
+
+    The client keeps a pool of keep-alive HTTP connections, which is shared by all
+    threads using the client. Every request has a timeout. Rate limit errors,
+    timeouts, connection errors and server errors are retried with exponential
+    backoff (with jitter); a `Retry-After` header sent by the server is honoured.
+    Async requests (see `acomplete`) follow the same policy.
+
+    Attributes:
+        timeout: The timeout of a single request in seconds.
+        max_retries: The maximum number of retries of a request.
+        backoff_base: The delay before the first retry in seconds.
+        backoff_max: The maximum delay between two retries in seconds.
+        rate_limited: Whether requests count against the rate limits of the API.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        timeout: float = 60.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 20,
+        rate_limited: bool = True,
+    ):
+        """Initializes a new LLMClient.
+
+        Args:
+            api_key: The API key. Read from `OPENAI_API_KEY` if not given.
+            base_url: The base URL of the API, e.g. of a local stand-in server.
+                Read from `OPENAI_BASE_URL` if not given.
+            timeout: The timeout of a single request in seconds.
+            max_retries: The maximum number of retries of a request.
+            backoff_base: The delay before the first retry in seconds.
+            backoff_max: The maximum delay between two retries in seconds.
+            max_connections: The maximum number of open connections.
+            max_keepalive_connections: The maximum number of idle connections kept open.
+            rate_limited: Whether requests count against the rate limits of the API.
+                Disable for local stand-in servers.
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limited = rate_limited
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._http_client = httpx.Client(
+            limits=self._limits, timeout=httpx.Timeout(timeout)
+        )
+        self._client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=0,
+            http_client=self._http_client,
+        )
+        # the connections of an async client are bound to the event loop they
+        # were created in, so one async client is kept per loop
+        self._async_clients: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, openai.AsyncOpenAI
+        ] = WeakKeyDictionary()
+
+    def complete(
+        self, prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+    ) -> Result[str, str]:
+        """Requests a chat completion and retries it if it fails temporarily.
+
+        Args:
+            prompt: The prompt or the messages to send.
+            model_name: The name of the model.
+
+        Returns:
+            The content of the first choice or an error message.
+        """
+        attempt = 0
+
+        while True:
+            try:
+                resp = self._client.chat.completions.create(
+                    model=model_name,
+                    messages=_create_messages(prompt),
+                    temperature=0,
+                )
+            except _RETRIED_ERRORS as e:
+                if attempt >= self.max_retries:
+                    return Err(
+                        f"Request to {model_name} failed after {attempt + 1} attempts: {e}"
+                    )
+
+                time.sleep(self._log_retry(attempt, e, model_name))
+                attempt += 1
+                continue
+            except openai.APIError as e:
+                return Err(f"Request to {model_name} failed: {e}")
+
+            return _get_content(resp, prompt, model_name)
+
+    async def acomplete(
+        self, prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+    ) -> Result[str, str]:
+        """Requests a chat completion without blocking the event loop – with the
+        timeout, the retries and the connection limits of `complete`.
+
+        Args:
+            prompt: The prompt or the messages to send.
+            model_name: The name of the model.
+
+        Returns:
+            The content of the first choice or an error message.
+        """
+        attempt = 0
+
+        while True:
+            try:
+                resp = await self._get_async_client().chat.completions.create(
+                    model=model_name,
+                    messages=_create_messages(prompt),
+                    temperature=0,
+                )
+            except _RETRIED_ERRORS as e:
+                if attempt >= self.max_retries:
+                    return Err(
+                        f"Request to {model_name} failed after {attempt + 1} attempts: {e}"
+                    )
+
+                await asyncio.sleep(self._log_retry(attempt, e, model_name))
+                attempt += 1
+                continue
+            except openai.APIError as e:
+                return Err(f"Request to {model_name} failed: {e}")
+
+            return _get_content(resp, prompt, model_name)
+
+    @property
+    def api_key(self) -> str:
+        return self._client.api_key
+
+    @property
+    def base_url(self) -> str:
+        return str(self._client.base_url)
+
+    def close(self) -> None:
+        """Closes all pooled connections – those of the async clients included.
+
+        The connections of an async client can only be closed by its event loop.
+        Prefer `aclose` within a loop; clients of loops, which were closed in the
+        meantime, are only dropped.
+        """
+        self._client.close()
+
+        for loop, async_client in list(self._async_clients.items()):
+            if loop.is_closed():
+                continue
+
+            if not loop.is_running():
+                loop.run_until_complete(async_client.close())
+            elif _is_running_in(loop):
+                # the loop is busy with the caller, it closes the client afterwards
+                loop.create_task(async_client.close())
+            else:
+                asyncio.run_coroutine_threadsafe(async_client.close(), loop).result(
+                    self.timeout
+                )
+
+        self._async_clients.clear()
+
+    async def aclose(self) -> None:
+        """Closes all pooled connections, like `close`, without blocking the event
+        loop."""
+        loop = asyncio.get_running_loop()
+
+        if (async_client := self._async_clients.pop(loop, None)) is not None:
+            await async_client.close()
+
+        await asyncio.to_thread(self.close)
+
+    def __enter__(self) -> "LLMClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "LLMClient":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    def _get_async_client(self) -> openai.AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+
+        if loop not in self._async_clients:
+            self._async_clients[loop] = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=self._limits, timeout=httpx.Timeout(self.timeout)
+                ),
+            )
+
+        return self._async_clients[loop]
+
+    def _log_retry(self, attempt: int, error: Exception, model_name: str) -> float:
+        delay = self._calc_delay(attempt, error)
+        logger.warning(
+            f"Request to {model_name} failed ({type(error).__name__}), retrying in {delay:.2f}s..."
+        )
+        return delay
+
+    def _calc_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = (
+            _parse_retry_after(error.response.headers)
+            if isinstance(error, openai.APIStatusError)
+            else None
+        )
+
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+
+        return min(self.backoff_max, self.backoff_base * 2**attempt) * random.uniform(
+            0.5, 1.0
+        )
+
+
+_DEFAULT_RATE_LIMITER = RateLimiter()
+
+# the tokens used by the last request of the current thread / task, as reported by
+# the API (see `_get_content`)
+_USED_TOKENS: ContextVar[int | None] = ContextVar("_USED_TOKENS", default=None)
+
+_DEFAULT_CLIENT: tuple[int, LLMBackend] | None = None
+_DEFAULT_CLIENT_LOCK = Lock()
+
+
+def get_default_client() -> LLMBackend:
+    """Returns the backend used by `generate`, if no client is passed.
+
+    The backend depends on the mode set by `SSRQ_LLM_BACKEND` (see
+    `get_backend_mode`):
+
+    - `live`: a pooled `LLMClient` for the OpenAI API.
+    - `record`: a `LLMClient`, whose responses are recorded to `SSRQ_LLM_STORE`.
+    - `replay`: the recorded responses, delayed by `SSRQ_LLM_LATENCY` seconds.
+    - `fake-server`: a `LLMClient` talking to a local server, which replays the
+      recorded responses via the HTTP API of OpenAI.
+
+    The backend is created on first use and once per process, so pooled
+    connections are never shared between forked worker processes."""
+    global _DEFAULT_CLIENT
+
+    with _DEFAULT_CLIENT_LOCK:
+        if _DEFAULT_CLIENT is None or _DEFAULT_CLIENT[0] != os.getpid():
+            _DEFAULT_CLIENT = (os.getpid(), _create_default_client())
+
+        return _DEFAULT_CLIENT[1]
+
+
+def _create_default_client() -> LLMBackend:
+    match get_backend_mode():
+        case "record":
+            return RecordingBackend(LLMClient(), get_recording_store())
+        case "replay":
+            return ReplayBackend(get_recording_store(), get_replay_latency())
+        case "fake-server":
+            server = FakeOpenAIServer(
+                ReplayBackend(get_recording_store(), get_replay_latency())
+            ).start()
+            return LLMClient(
+                api_key="replay", base_url=server.base_url, rate_limited=False
+            )
+        case _:
+            return LLMClient()
+
 
 def generate(
     prompt: str | Iterable[ChatCompletionMessageParam],
     model_name: str,
     extract_language: bool,
     language: str,
+    client: LLMBackend | None = None,
+    rate_limiter: RateLimiter | None = None,
 ) -> Result[str, ValueError]:
     """Generate text completion for a given prompt using a specified model.
 
     Args:
         prompt (str): The prompt to generate text completion for.
         model_name (str): The name of the model to use for text completion.
+        client (LLMBackend | None): The client to use. Defaults to the shared
+            backend of the process (see `get_default_client`).
+        rate_limiter (RateLimiter | None): The rate limiter to respect. Defaults to
+            the limiter shared by all processes.
 
     Returns:
         Result[str, ValueError]: The generated text completion or an error if the model name is not supported.
@@ -33,14 +363,68 @@ def generate(
     if model_name not in USED_OPENAI_MODEL:
         return Err(ValueError(f"Model name {model_name} is not supported"))
 
-    result = _chat_with_open_ai(prompt, model_name)
-    if result.is_err():
-        return Err(ValueError(result.unwrap_err()))
+    client = client or get_default_client()
 
-    if extract_language:
-        return Ok(_extract_language_block_from_chat_result(result.unwrap(), language))
+    if not client.rate_limited:
+        result = _chat_with_open_ai(prompt, model_name, client)
+        return _process_chat_result(result, extract_language, language)
 
-    return Ok(result.unwrap())
+    rate_limiter = rate_limiter or _DEFAULT_RATE_LIMITER
+    reserved = _estimate_tokens(prompt, model_name)
+    rate_limiter.acquire(model_name, reserved)
+    _USED_TOKENS.set(None)
+
+    result = _chat_with_open_ai(prompt, model_name, client)
+    _settle_tokens(rate_limiter, prompt, model_name, reserved, result)
+
+    return _process_chat_result(result, extract_language, language)
+
+
+async def agenerate(
+    prompt: str | Iterable[ChatCompletionMessageParam],
+    model_name: str,
+    extract_language: bool,
+    language: str,
+    client: LLMBackend | None = None,
+    rate_limiter: RateLimiter | None = None,
+) -> Result[str, ValueError]:
+    """Generate text completion for a given prompt without blocking the event loop.
+
+    This is the asynchronous counterpart of `generate`, it uses the async client of
+    the OpenAI SDK, so many requests can be in flight on a single event loop.
+
+    Args:
+        prompt (str): The prompt to generate text completion for.
+        model_name (str): The name of the model to use for text completion.
+        client (LLMBackend | None): The client to use. Defaults to the shared
+            backend of the process (see `get_default_client`).
+        rate_limiter (RateLimiter | None): The rate limiter to respect. Defaults to
+            the limiter shared by all processes.
+
+    Returns:
+        Result[str, ValueError]: The generated text completion or an error if the model name is not supported.
+    """
+    if model_name not in USED_OPENAI_MODEL:
+        return Err(ValueError(f"Model name {model_name} is not supported"))
+
+    client = client or get_default_client()
+
+    if not client.rate_limited:
+        result = await _acomplete(prompt, model_name, client)
+        return _process_chat_result(result, extract_language, language)
+
+    rate_limiter = rate_limiter or _DEFAULT_RATE_LIMITER
+    reserved = _estimate_tokens(prompt, model_name)
+    await rate_limiter.aacquire(model_name, reserved)
+    _USED_TOKENS.set(None)
+
+    result = await _acomplete(prompt, model_name, client)
+    # the state file of the rate limiter is locked with a blocking flock
+    await asyncio.to_thread(
+        _settle_tokens, rate_limiter, prompt, model_name, reserved, result
+    )
+
+    return _process_chat_result(result, extract_language, language)
 
 
 def create_chat_completion_param(
@@ -67,14 +451,101 @@ def create_chat_completion_param(
     return messages
 
 
-def _chat_with_open_ai(
+def count_tokens(text: str, model_name: str = "gpt-3.5-turbo") -> int:
+    """Counts the tokens of a text with the tokenizer of the given model.
+
+    Args:
+        text (str): The text to count the tokens of.
+        model_name (str): The name of the model, whose tokenizer should be used.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return len(_get_encoding(model_name).encode(text))
+
+
+def acquire_rate_limit(
+    prompt: str | Iterable[ChatCompletionMessageParam],
+    model_name: str,
+    rate_limiter: RateLimiter | None = None,
+) -> None:
+    """Waits until a request is allowed by the rate limits – for requests, which
+    aren't sent by `generate` (e.g. by the models of spaCy-LLM).
+
+    Args:
+        prompt (str): The prompt of the request.
+        model_name (str): The name of the model.
+        rate_limiter (RateLimiter | None): The rate limiter to respect. Defaults to
+            the limiter shared by all processes.
+    """
+    (rate_limiter or _DEFAULT_RATE_LIMITER).acquire(
+        model_name, _estimate_tokens(prompt, model_name)
+    )
+
+
+def _estimate_tokens(
     prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+) -> int:
+    """Estimates the tokens a request will consume: the prompt plus a small budget
+    for the completion. The estimate is settled to the actual usage, once the
+    response is received (see `_settle_tokens`)."""
+    return _count_prompt_tokens(prompt, model_name) + COMPLETION_TOKEN_BUDGET
+
+
+def _count_prompt_tokens(
+    prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+) -> int:
+    if isinstance(prompt, str):
+        return count_tokens(prompt, model_name)
+
+    return sum(
+        count_tokens(str(message.get("content") or ""), model_name)
+        for message in prompt
+    )
+
+
+def _settle_tokens(
+    rate_limiter: RateLimiter,
+    prompt: str | Iterable[ChatCompletionMessageParam],
+    model_name: str,
+    reserved: int,
+    result: Result[str, str],
+) -> None:
+    """Settles the tokens reserved for a request to the tokens it used: the usage
+    reported by the API or – if the backend doesn't report it – the tokens of the
+    prompt and the completion. Failed requests keep their reservation."""
+    if result.is_err():
+        return
+
+    used = _USED_TOKENS.get()
+
+    if used is None:
+        used = _count_prompt_tokens(prompt, model_name) + count_tokens(
+            result.unwrap(), model_name
+        )
+
+    rate_limiter.settle(model_name, reserved, used)
+
+
+@cache
+def _get_encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _chat_with_open_ai(
+    prompt: str | Iterable[ChatCompletionMessageParam],
+    model_name: str,
+    client: LLMBackend,
 ) -> Result[str, str]:
     """Return chat completion for a given prompt using OpenAI's chat API.
 
     Args:
         prompt (str): The prompt to generate text completion for.
         model_name (str): The name of the model to use for text completion.
+        client (LLMBackend): The client to send the request with.
 
     Returns:
         Result[str, str]: The generated text completion or an error if the model name is not supported.
@@ -83,24 +554,114 @@ def _chat_with_open_ai(
         f"Requestion chat completion with model {model_name} for prompt:\n {prompt}"
     )
 
-    resp = openai.chat.completions.create(
-        model=model_name,
-        messages=[{"role": "user", "content": prompt}]
-        if isinstance(prompt, str)
-        else prompt,
-        temperature=0,
+    result = client.complete(prompt, model_name)
+
+    if result.is_ok():
+        logger.debug(f"Result returned by {model_name}:\n {result.unwrap()}")
+
+    return result
+
+
+async def _achat_with_open_ai(
+    prompt: str | Iterable[ChatCompletionMessageParam],
+    model_name: str,
+    client: LLMClient,
+) -> Result[str, str]:
+    """Return chat completion for a given prompt using OpenAI's async chat API.
+
+    Args:
+        prompt (str): The prompt to generate text completion for.
+        model_name (str): The name of the model to use for text completion.
+        client (LLMClient): The client to send the request with.
+
+    Returns:
+        Result[str, str]: The generated text completion or an error if the model name is not supported.
+    """
+    logger.debug(
+        f"Requestion async chat completion with model {model_name} for prompt:\n {prompt}"
     )
 
+    result = await client.acomplete(prompt, model_name)
+
+    if result.is_ok():
+        logger.debug(f"Result returned by {model_name}:\n {result.unwrap()}")
+
+    return result
+
+
+async def _acomplete(
+    prompt: str | Iterable[ChatCompletionMessageParam],
+    model_name: str,
+    client: LLMBackend,
+) -> Result[str, str]:
+    if isinstance(client, LLMClient):
+        return await _achat_with_open_ai(prompt, model_name, client)
+
+    return await asyncio.to_thread(client.complete, prompt, model_name)
+
+
+def _get_content(
+    resp, prompt: str | Iterable[ChatCompletionMessageParam], model_name: str
+) -> Result[str, str]:
     result = resp.choices[0].message.content
 
+    if resp.usage is not None:
+        _USED_TOKENS.set(resp.usage.total_tokens)
+
     if result is None:
         return Err(f"OpenAI model {model_name} returned None for prompt:\n {prompt}")
 
-    logger.debug(f"Result returned by {model_name}:\n {result}")
-
     return Ok(result)
 
 
+def _is_running_in(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def _parse_retry_after(headers: httpx.Headers) -> float | None:
+    """Parses the delay requested by the server from the `retry-after-ms` or
+    `retry-after` header (seconds or HTTP date)."""
+    if (retry_after_ms := headers.get("retry-after-ms")) is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    if (retry_after := headers.get("retry-after")) is None:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _create_messages(
+    prompt: str | Iterable[ChatCompletionMessageParam],
+) -> Iterable[ChatCompletionMessageParam]:
+    return [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+
+
+def _process_chat_result(
+    result: Result[str, str], extract_language: bool, language: str
+) -> Result[str, ValueError]:
+    if result.is_err():
+        return Err(ValueError(result.unwrap_err()))
+
+    if extract_language:
+        return Ok(_extract_language_block_from_chat_result(result.unwrap(), language))
+
+    return Ok(result.unwrap())
+
+
 def _extract_language_block_from_chat_result(result: str, language: str) -> str:
     if f"```{language}" not in result:
         return result
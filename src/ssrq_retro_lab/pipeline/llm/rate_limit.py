@@ -0,0 +1,220 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from ssrq_retro_lab.config import CACHE_DIR
+
+__all__ = ["DEFAULT_LIMITS", "ModelLimits", "RateLimiter"]
+
+RATE_LIMIT_FILE = CACHE_DIR / "rate_limits.json"
+
+
+@dataclass(frozen=True, slots=True)
+class ModelLimits:
+    """The rate limits of a model.
+
+    Attributes:
+        requests_per_minute: The maximum number of requests per minute.
+        tokens_per_minute: The maximum number of tokens per minute.
+    """
+
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+DEFAULT_LIMITS: dict[str, ModelLimits] = {
+    "ft:gpt-3.5-turbo-1106:personal:ssrq-ocr-cor:8tgnqalq": ModelLimits(3_500, 80_000),
+    "gpt-3.5-turbo": ModelLimits(3_500, 80_000),
+    "gpt-4": ModelLimits(500, 10_000),
+    "gpt-4-0125-preview": ModelLimits(500, 30_000),
+}
+
+
+class RateLimiter:
+    """A token bucket rate limiter per model, which meters requests and tokens.
+
+    The state of the buckets is kept in a small JSON file, which is locked while it
+    is updated. All threads and processes using the same file therefore share the
+    limits – a batch run with many workers stays just below the limits of the API
+    instead of running into rate limit errors.
+
+    Both buckets of a model hold at most one minute worth of capacity (scaled by
+    `headroom`) and are refilled continuously.
+
+    Attributes:
+        path: The path of the state file.
+        limits: The limits per model name. Models without limits aren't throttled.
+        headroom: The fraction of the limits, which is actually used.
+    """
+
+    def __init__(
+        self,
+        path: Path = RATE_LIMIT_FILE,
+        limits: dict[str, ModelLimits] = DEFAULT_LIMITS,
+        headroom: float = 0.9,
+    ):
+        self.path = path
+        self.limits = limits
+        self.headroom = headroom
+
+    def acquire(self, model_name: str, tokens: int) -> float:
+        """Blocks until a request with the given number of tokens is allowed.
+
+        Args:
+            model_name: The name of the model.
+            tokens: The estimated number of tokens of the request.
+
+        Returns:
+            The number of seconds waited.
+        """
+        waited = 0.0
+
+        while (wait := self.try_acquire(model_name, tokens)) > 0:
+            time.sleep(wait)
+            waited += wait
+
+        self._log_wait(model_name, waited)
+
+        return waited
+
+    async def aacquire(self, model_name: str, tokens: int) -> float:
+        """Waits without blocking the event loop until a request with the given
+        number of tokens is allowed.
+
+        Args:
+            model_name: The name of the model.
+            tokens: The estimated number of tokens of the request.
+
+        Returns:
+            The number of seconds waited.
+        """
+        if model_name not in self.limits:
+            return 0.0
+
+        waited = 0.0
+
+        # the state file is locked with a blocking flock, which must not stall
+        # the event loop while another process holds it
+        while (
+            wait := await asyncio.to_thread(self.try_acquire, model_name, tokens)
+        ) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+
+        self._log_wait(model_name, waited)
+
+        return waited
+
+    def try_acquire(self, model_name: str, tokens: int) -> float:
+        """Takes capacity for a single request from the buckets of a model, if
+        enough capacity is left.
+
+        Args:
+            model_name: The name of the model.
+            tokens: The estimated number of tokens of the request.
+
+        Returns:
+            0 if the request is allowed, otherwise the number of seconds until
+            enough capacity will be available.
+        """
+        if (limits := self.limits.get(model_name)) is None:
+            return 0.0
+
+        capacity = (
+            limits.requests_per_minute * self.headroom,
+            limits.tokens_per_minute * self.headroom,
+        )
+        # requests larger than the bucket would never be allowed otherwise
+        needed = (1.0, min(float(tokens), capacity[1]))
+
+        with self._locked_state() as state:
+            now = time.time()
+            bucket = state.get(
+                model_name,
+                {"requests": capacity[0], "tokens": capacity[1], "updated": now},
+            )
+            elapsed = max(0.0, now - bucket["updated"])
+            available = (
+                min(capacity[0], bucket["requests"] + elapsed * capacity[0] / 60),
+                min(capacity[1], bucket["tokens"] + elapsed * capacity[1] / 60),
+            )
+
+            if available[0] >= needed[0] and available[1] >= needed[1]:
+                state[model_name] = {
+                    "requests": available[0] - needed[0],
+                    "tokens": available[1] - needed[1],
+                    "updated": now,
+                }
+                return 0.0
+
+            return max(
+                (needed[0] - available[0]) * 60 / capacity[0],
+                (needed[1] - available[1]) * 60 / capacity[1],
+            )
+
+    def settle(self, model_name: str, reserved: int, used: int) -> None:
+        """Corrects the tokens taken by `acquire` once the actual usage of a
+        request is known: unused tokens are returned to the bucket, additional
+        tokens are taken (the bucket may become negative).
+
+        Args:
+            model_name: The name of the model.
+            reserved: The number of tokens passed to `acquire`.
+            used: The number of tokens actually used by the request.
+        """
+        if (limits := self.limits.get(model_name)) is None or reserved == used:
+            return
+
+        capacity = limits.tokens_per_minute * self.headroom
+        # the same cap as in `try_acquire`
+        reserved = min(reserved, int(capacity))
+
+        with self._locked_state() as state:
+            if (bucket := state.get(model_name)) is None:
+                return
+
+            bucket["tokens"] = min(capacity, bucket["tokens"] + reserved - used)
+
+    def _locked_state(self) -> "_LockedState":
+        return _LockedState(self.path)
+
+    @staticmethod
+    def _log_wait(model_name: str, waited: float) -> None:
+        if waited > 0:
+            logger.debug(f"Throttled request to {model_name} for {waited:.2f}s")
+
+
+class _LockedState:
+    """Reads the state file under an exclusive lock and writes it back on exit."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __enter__(self) -> dict[str, dict[str, float]]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+        try:
+            content = self.path.read_text(encoding="utf-8")
+            self._state = json.loads(content) if content else {}
+        except json.JSONDecodeError:
+            self._state = {}
+
+        return self._state
+
+    def __exit__(self, exc_type, *args) -> None:
+        try:
+            if exc_type is None:
+                data = json.dumps(self._state).encode("utf-8")
+                os.ftruncate(self._fd, 0)
+                os.pwrite(self._fd, data, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable
+
+from spacy_llm.registry import registry
+
+from ssrq_retro_lab.pipeline.llm.chat import generate
+
+__all__ = ["BACKEND_MODEL", "BackendModel", "create_backend_model"]
+
+BACKEND_MODEL = "ssrq.Backend.v1"
+
+
+class BackendModel:
+    """A spaCy-LLM model, which sends its prompts through `pipeline.llm.chat` – so
+    spaCy-LLM shares the pooled client, the rate limits and the record / replay
+    backends with the other components.
+
+    The OpenAI chat API answers a single prompt per request, so the prompts of all
+    docs passed at once (e.g. a batch of `nlp.pipe`) are sent concurrently.
+
+    Attributes:
+        name: The name of the model.
+        context_length: The context length of the model, used by spaCy-LLM to
+            shard long docs.
+        max_concurrency: The maximum number of requests sent at the same time.
+    """
+
+    def __init__(self, name: str, context_length: int, max_concurrency: int):
+        self.name = name
+        self.context_length = context_length
+        self.max_concurrency = max_concurrency
+
+    def __call__(self, prompts: Iterable[Iterable[str]]) -> Iterable[Iterable[str]]:
+        prompts_per_doc = [list(doc_prompts) for doc_prompts in prompts]
+        flat_prompts = [
+            prompt for doc_prompts in prompts_per_doc for prompt in doc_prompts
+        ]
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_concurrency, len(flat_prompts)))
+        ) as pool:
+            responses = iter(list(pool.map(self._complete, flat_prompts)))
+
+        return [
+            [next(responses) for _ in doc_prompts] for doc_prompts in prompts_per_doc
+        ]
+
+    def _complete(self, prompt: str) -> str:
+        result = generate(prompt, self.name, False, "")
+
+        if result.is_err():
+            raise result.unwrap_err()
+
+        return result.unwrap()
+
+
+@registry.llm_models(BACKEND_MODEL)
+def create_backend_model(
+    name: str = "gpt-4",
+    context_length: int = 8192,
+    max_concurrency: int = 8,
+    config: dict[Any, Any] = {},
+) -> BackendModel:
+    """Creates a spaCy-LLM model, which sends its prompts through the backend of
+    `pipeline.llm.chat`.
+
+    Args:
+        name: The name of the model.
+        context_length: The context length of the model in tokens.
+        max_concurrency: The maximum number of requests sent at the same time.
+        config: The config of the replaced model. Only accepted, so the model can
+            be swapped in by overriding `@llm_models` alone. The requests are sent
+            with the settings of `pipeline.llm.chat` (e.g. temperature 0).
+
+    Returns:
+        The model.
+    """
+    return BackendModel(name, context_length, max_concurrency)
@@ -0,0 +1,229 @@
+import pickle
+from collections.abc import Mapping
+from dataclasses import dataclass, is_dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Any
+
+from diskcache import Cache  # type: ignore
+from loguru import logger
+from parsel import Selector
+from pydantic import BaseModel
+
+from ssrq_retro_lab.config import CACHE_DIR
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage
+
+__all__ = ["Checkpoint", "RunManifest", "content_hash"]
+
+RUN_MANIFEST_DIR = CACHE_DIR / "runs"
+
+
+@dataclass(frozen=True, slots=True)
+class Checkpoint:
+    """The stored output of a component for a single article.
+
+    Attributes:
+        output: The output of the component.
+        seconds: The wall time the component needed to create the output.
+    """
+
+    output: Any
+    seconds: float
+
+
+class RunManifest:
+    """Persists the output of every component per article, so an interrupted run
+    can be resumed.
+
+    Outputs are keyed by article number, component name and a content hash of the
+    input of the component. A restarted run skips every component whose input did
+    not change and continues with the first component without a stored output.
+    Outputs, which can't be pickled (e.g. parsel Selectors), are not stored; the
+    component is simply executed again on resume.
+
+    The manifest is backed by diskcache, so it can be shared by the threads and
+    processes of a batch run.
+
+    Attributes:
+        path: The directory of the manifest.
+    """
+
+    def __init__(self, path: Path):
+        """Opens (or creates) a run manifest.
+
+        Args:
+            path: The directory of the manifest, e.g. `RUN_MANIFEST_DIR / "zg-full"`.
+        """
+        self.path = path
+        self._checkpoints = Cache(path / "checkpoints")
+        self._statistics = Cache(path / "statistics")
+
+    def load(
+        self,
+        article_number: int | None,
+        component_name: str,
+        component_input: Any,
+        input_hash: str | None = None,
+    ) -> Checkpoint | None:
+        """Loads the stored output of a component.
+
+        Args:
+            article_number: The article number.
+            component_name: The name of the component.
+            component_input: The input of the component.
+            input_hash: The content hash of the input, if already calculated.
+
+        Returns:
+            The checkpoint or None if the component has to be executed.
+        """
+        key = self._create_key(
+            article_number, component_name, component_input, input_hash
+        )
+        checkpoint = self._checkpoints.get(key)
+
+        if checkpoint is None:
+            return None
+
+        self._statistics.incr(("skipped", component_name))
+        self._statistics.incr(("saved_seconds", component_name), checkpoint.seconds)
+
+        return checkpoint
+
+    def store(
+        self,
+        article_number: int | None,
+        component_name: str,
+        component_input: Any,
+        output: Any,
+        seconds: float,
+        input_hash: str | None = None,
+    ) -> bool:
+        """Stores the output of a component.
+
+        Args:
+            article_number: The article number.
+            component_name: The name of the component.
+            component_input: The input of the component.
+            output: The output of the component.
+            seconds: The wall time the component needed.
+            input_hash: The content hash of the input, if already calculated.
+                Components may change their input (e.g. the HTMLWrangler removes
+                headers from the pages), so the hash has to be calculated before
+                the component is invoked.
+
+        Returns:
+            True if the output was stored, False if it can't be serialized.
+        """
+        key = self._create_key(
+            article_number, component_name, component_input, input_hash
+        )
+
+        try:
+            self._checkpoints[key] = Checkpoint(output, seconds)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug(
+                f"Output of {component_name} for article {article_number} can't be checkpointed: {e}"
+            )
+            return False
+
+        self._statistics.incr(("stored", component_name))
+
+        return True
+
+    def reset_statistics(self) -> None:
+        """Resets the skipped / stored counters, e.g. at the start of a new run."""
+        self._statistics.clear()
+
+    def report(self) -> dict[str, dict[str, float]]:
+        """Returns the number of skipped and stored component executions as well
+        as the saved wall time per component since the last reset."""
+        report: dict[str, dict[str, float]] = {}
+
+        for kind, component_name in self._statistics.iterkeys():
+            report.setdefault(component_name, {"skipped": 0, "stored": 0})
+            report[component_name][kind] = self._statistics[(kind, component_name)]
+
+        return report
+
+    def log_report(self) -> None:
+        """Logs how much work was skipped thanks to the manifest."""
+        report = self.report()
+        skipped = sum(r.get("skipped", 0) for r in report.values())
+        saved_seconds = sum(r.get("saved_seconds", 0) for r in report.values())
+
+        logger.info(
+            f"Run manifest {self.path}: skipped {skipped:.0f} component executions "
+            f"(~{saved_seconds:.2f}s of work)."
+        )
+
+        for component_name, statistics in report.items():
+            logger.info(
+                f"{component_name}: skipped {statistics.get('skipped', 0):.0f}, "
+                f"stored {statistics.get('stored', 0):.0f}, "
+                f"saved ~{statistics.get('saved_seconds', 0):.2f}s"
+            )
+
+    def close(self) -> None:
+        self._checkpoints.close()
+        self._statistics.close()
+
+    def __enter__(self) -> "RunManifest":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @staticmethod
+    def _create_key(
+        article_number: int | None,
+        component_name: str,
+        component_input: Any,
+        input_hash: str | None,
+    ) -> str:
+        if input_hash is None:
+            input_hash = content_hash(component_input)
+
+        return f"{article_number}/{component_name}/{input_hash}"
+
+
+def content_hash(value: Any) -> str:
+    """Calculates a stable hash of the content of a component input.
+
+    Args:
+        value: The value to hash, e.g. a pydantic model or a TypedDict.
+
+    Returns:
+        The hex digest of the hash.
+    """
+    digest = sha256()
+    _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value: Any) -> None:
+    match value:
+        case bytes():
+            digest.update(value)
+        case str():
+            digest.update(value.encode("utf-8"))
+        case BaseModel():
+            digest.update(type(value).__name__.encode("utf-8"))
+            digest.update(value.model_dump_json().encode("utf-8"))
+        case Selector():
+            _update_digest(digest, value.get())
+        case ParsedPage():
+            _update_digest(digest, value.html)
+        case Mapping():
+            for key in sorted(value, key=str):
+                _update_digest(digest, str(key))
+                _update_digest(digest, value[key])
+        case tuple() | list():
+            digest.update(f"[{len(value)}]".encode("utf-8"))
+            for item in value:
+                _update_digest(digest, item)
+        case int() | float() | None:
+            digest.update(repr(value).encode("utf-8"))
+        case _ if hasattr(value, "to_bytes") and not is_dataclass(value):
+            digest.update(value.to_bytes())
+        case _:
+            digest.update(repr(value).encode("utf-8"))
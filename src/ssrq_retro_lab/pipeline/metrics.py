@@ -0,0 +1,279 @@
+import json
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Any
+
+import numpy as np
+from parsel import Selector
+from pydantic import BaseModel
+
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage
+
+__all__ = [
+    "ComponentMetrics",
+    "MetricsRecorder",
+    "measure_size",
+    "record_cache_hit",
+    "record_cache_miss",
+    "record_rule_match",
+    "track",
+]
+
+_CURRENT_METRICS: ContextVar["ComponentMetrics | None"] = ContextVar(
+    "current_component_metrics", default=None
+)
+
+
+@dataclass(slots=True)
+class ComponentMetrics:
+    """Measurements of a single component for a single article.
+
+    Attributes:
+        article: The article number (if the chain was started with one).
+        component: The name of the component.
+        wall_time: The summed wall time of all invocations in seconds.
+        calls: The number of invocations (including retries).
+        retries: The number of retries.
+        input_size: The size of the (last) input in bytes.
+        output_size: The size of the output in bytes.
+        cache_hits: The number of cache hits reported by the component.
+        cache_misses: The number of cache misses reported by the component.
+        rule_hits: The number of inputs classified by rules instead of a model.
+        rule_misses: The number of inputs, which the rules couldn't classify.
+        rule_compared: The number of rule hits with a cached label of the model.
+        rule_disagreements: The number of compared rule hits with another label.
+        succeeded: Whether the component finally succeeded.
+    """
+
+    article: int | None
+    component: str
+    wall_time: float = 0.0
+    calls: int = 0
+    retries: int = 0
+    input_size: int = 0
+    output_size: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    rule_hits: int = 0
+    rule_misses: int = 0
+    rule_compared: int = 0
+    rule_disagreements: int = 0
+    succeeded: bool = False
+
+
+class MetricsRecorder:
+    """Collects the metrics of one or many chain executions.
+
+    The recorder is thread-safe, so it can be shared by the workers of a batch run.
+    """
+
+    def __init__(self) -> None:
+        self._records: dict[tuple[int | None, str], ComponentMetrics] = {}
+        self._lock = Lock()
+
+    @property
+    def records(self) -> tuple[ComponentMetrics, ...]:
+        with self._lock:
+            return tuple(self._records.values())
+
+    def get(self, article: int | None, component: str) -> ComponentMetrics:
+        """Returns the metrics for an article and a component – creates them if needed.
+
+        Args:
+            article: The article number.
+            component: The name of the component.
+
+        Returns:
+            The (mutable) metrics record.
+        """
+        with self._lock:
+            key = (article, component)
+
+            if key not in self._records:
+                self._records[key] = ComponentMetrics(article, component)
+
+            return self._records[key]
+
+    def extend(self, records: Iterable[ComponentMetrics]) -> None:
+        """Adds records collected elsewhere, e.g. in another process."""
+        with self._lock:
+            for record in records:
+                self._records[(record.article, record.component)] = record
+
+    def to_jsonl(self, path: Path) -> None:
+        """Writes one JSON object per article and component to the given path."""
+        with open(path, "w", encoding="utf-8") as file:
+            for record in self.records:
+                file.write(json.dumps(asdict(record)) + "\n")
+
+    def to_prometheus(self, path: Path) -> None:
+        """Writes the metrics aggregated per component in the Prometheus text format."""
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus_text())
+
+    def prometheus_text(self) -> str:
+        """Returns the metrics aggregated per component in the Prometheus text format.
+
+        See https://prometheus.io/docs/instrumenting/exposition_formats/
+        """
+        by_component = self._group_by_component()
+        lines = [
+            "# HELP ssrq_component_wall_time_seconds Wall time per article and component.",
+            "# TYPE ssrq_component_wall_time_seconds summary",
+        ]
+
+        for component, records in by_component.items():
+            wall_times = [r.wall_time for r in records]
+            for quantile in (0.5, 0.95, 1.0):
+                lines.append(
+                    f'ssrq_component_wall_time_seconds{{component="{component}",quantile="{quantile}"}} '
+                    f"{np.quantile(wall_times, quantile):.6f}"
+                )
+            lines.append(
+                f'ssrq_component_wall_time_seconds_sum{{component="{component}"}} {sum(wall_times):.6f}'
+            )
+            lines.append(
+                f'ssrq_component_wall_time_seconds_count{{component="{component}"}} {len(wall_times)}'
+            )
+
+        counters = {
+            "calls": "Invocations of a component.",
+            "retries": "Retries of a component.",
+            "cache_hits": "Cache hits reported by a component.",
+            "cache_misses": "Cache misses reported by a component.",
+            "rule_hits": "Inputs classified by rules instead of a model.",
+            "rule_misses": "Inputs the rules couldn't classify.",
+            "rule_compared": "Rule hits compared with a cached label of the model.",
+            "rule_disagreements": "Rule hits with another label than the model.",
+            "input_size": "Bytes passed to a component.",
+            "output_size": "Bytes returned by a component.",
+        }
+
+        for field, description in counters.items():
+            name = f"ssrq_component_{field}_total"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+
+            for component, records in by_component.items():
+                lines.append(
+                    f'{name}{{component="{component}"}} '
+                    f"{sum(getattr(r, field) for r in records)}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Returns a table with p50, p95 and max wall time as well as the
+        cache statistics per component."""
+        header = (
+            f"{'component':<16} {'articles':>8} {'p50 (s)':>9} {'p95 (s)':>9} "
+            f"{'max (s)':>9} {'retries':>8} {'hits':>7} {'misses':>7}"
+        )
+        rows = [header, "-" * len(header)]
+
+        for component, records in self._group_by_component().items():
+            wall_times = [r.wall_time for r in records]
+            rows.append(
+                f"{component:<16} {len(records):>8} "
+                f"{np.quantile(wall_times, 0.5):>9.3f} "
+                f"{np.quantile(wall_times, 0.95):>9.3f} "
+                f"{max(wall_times):>9.3f} "
+                f"{sum(r.retries for r in records):>8} "
+                f"{sum(r.cache_hits for r in records):>7} "
+                f"{sum(r.cache_misses for r in records):>7}"
+            )
+
+        return "\n".join(rows)
+
+    def _group_by_component(self) -> dict[str, list[ComponentMetrics]]:
+        by_component: dict[str, list[ComponentMetrics]] = {}
+
+        for record in self.records:
+            by_component.setdefault(record.component, []).append(record)
+
+        return by_component
+
+
+@contextmanager
+def track(record: ComponentMetrics) -> Iterator[ComponentMetrics]:
+    """Measures a single invocation of a component.
+
+    While the context is active, cache hits and misses reported by the component
+    are added to the given record.
+
+    Args:
+        record: The metrics record of the invoked component.
+
+    Yields:
+        The given record.
+    """
+    token = _CURRENT_METRICS.set(record)
+    start = perf_counter()
+
+    try:
+        yield record
+    finally:
+        record.wall_time += perf_counter() - start
+        record.calls += 1
+        _CURRENT_METRICS.reset(token)
+
+
+def record_cache_hit() -> None:
+    """Reports a cache hit for the component, which is currently executed."""
+    if (metrics := _CURRENT_METRICS.get()) is not None:
+        metrics.cache_hits += 1
+
+
+def record_cache_miss() -> None:
+    """Reports a cache miss for the component, which is currently executed."""
+    if (metrics := _CURRENT_METRICS.get()) is not None:
+        metrics.cache_misses += 1
+
+
+def record_rule_match(hit: bool, agrees: bool | None = None) -> None:
+    """Reports an input checked by the rules of the component, which is currently
+    executed.
+
+    Args:
+        hit: Whether the rules classified the input.
+        agrees: Whether the cached label of the model is the same – None, if there
+            is no cached label.
+    """
+    if (metrics := _CURRENT_METRICS.get()) is not None:
+        metrics.rule_hits += hit
+        metrics.rule_misses += not hit
+        metrics.rule_compared += agrees is not None
+        metrics.rule_disagreements += agrees is False
+
+
+def measure_size(value: Any) -> int:
+    """Estimates the size of an input or output of a component in bytes.
+
+    Args:
+        value: The value to measure.
+
+    Returns:
+        The size of the serialized value in bytes.
+    """
+    match value:
+        case bytes():
+            return len(value)
+        case str():
+            return len(value.encode("utf-8"))
+        case BaseModel():
+            return len(value.model_dump_json().encode("utf-8"))
+        case Selector():
+            return measure_size(value.get())
+        case ParsedPage():
+            return measure_size(value.html)
+        case Mapping():
+            return sum(measure_size(v) for v in value.values())
+        case tuple() | list():
+            return sum(measure_size(v) for v in value)
+        case _:
+            return measure_size(str(value))
@@ -0,0 +1,384 @@
+import argparse
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Sequence
+
+from loguru import logger
+from parsel import Selector
+from result import Err, Ok, Result
+
+from ssrq_retro_lab.config import ZG_DATA_ROOT
+from ssrq_retro_lab.pipeline.cache import get_cache
+from ssrq_retro_lab.pipeline.parser.html_to_article import (
+    ParsedPage,
+    remove_header,
+    select_article_paragraphs,
+)
+from ssrq_retro_lab.pipeline.parser.header_mask import (
+    HEADER_MASK_VERSION,
+    HeaderMask,
+    build_header_mask,
+    get_header_mask,
+)
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import TOC_CACHE_NAMESPACE
+from ssrq_retro_lab.pipeline.pdf.extraction import read_volume
+from ssrq_retro_lab.pipeline.pdf.page_store import get_page_store
+
+__all__ = [
+    "ArticleBoundaryIndex",
+    "build_article_index",
+    "get_article_index",
+]
+
+# bump, when the structure of the pickled classes or the markers change
+ARTICLE_INDEX_FORMAT = 3
+
+_DIGITS = re.compile(r"[0-9]+")
+_NUMBERS = re.compile(r"([0-9]+)\.")
+
+_INDEXES: dict[Path, tuple[tuple[int, ...], "ArticleBoundaryIndex"]] = {}
+_INDEX_LOCKS: dict[Path, Lock] = {}
+_INDEXES_LOCK = Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class ParagraphMarkers:
+    """The article numbers found in the (child) spans of a paragraph.
+
+    Attributes:
+        group: The group of siblings of the paragraph on its page.
+        numbers: The numbers `n`, which occur as `n.` in a span.
+        digits: The digit sequences of the spans, to look up numbers without a dot.
+    """
+
+    group: int
+    numbers: frozenset[int]
+    digits: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class PageMarkers:
+    """The article numbers found on a page (after removing the header).
+
+    Attributes:
+        numbers: The numbers `n`, which occur as `n.` in any span of the page.
+        paragraphs: The markers of every paragraph in document order.
+        group_count: The number of groups of sibling paragraphs on the page.
+    """
+
+    numbers: frozenset[int]
+    paragraphs: tuple[ParagraphMarkers, ...]
+    group_count: int
+
+
+@dataclass(frozen=True, slots=True)
+class ArticleBoundaryIndex:
+    """The positions of the article numbers of a volume, which mark the boundaries
+    of the articles. It's computed once for all pages of a volume, so an article is
+    sliced from its pages by looking up its number and the next one – instead of
+    searching every page for both numbers again.
+
+    Attributes:
+        volume_path: The path to the PDF of the volume.
+        pages: The markers per (0-based) page index of the PDF.
+        positions: The sorted (page, paragraph) positions per article number,
+            where the number occurs followed by a dot.
+    """
+
+    volume_path: Path
+    pages: dict[int, PageMarkers]
+    positions: dict[int, tuple[tuple[int, int], ...]]
+
+    def slice_article(
+        self,
+        pages: Sequence[ParsedPage],
+        current_article_number: int,
+        next_article_number: int | None,
+    ) -> Result[tuple[Selector, ...], ValueError] | None:
+        """Slices the nodes of an article from its pages (without headers), the
+        same way as `collect_article_nodes`.
+
+        The paragraphs of a page are selected by the positions of the article
+        numbers on it. Only pages with several groups of sibling paragraphs are
+        searched paragraph by paragraph.
+
+        Args:
+            pages: The parsed pages of the article.
+            current_article_number: The current article number.
+            next_article_number: The next article number.
+
+        Returns:
+            The article nodes as Result like `collect_article_nodes` or None, if the
+            pages are not part of the index.
+        """
+        result_nodes: list[Selector] = []
+
+        for page in pages:
+            if (
+                page.volume_path != self.volume_path
+                or (markers := self.pages.get(page.number)) is None  # type: ignore
+            ):
+                return None
+
+            paragraphs = page.selector.xpath("//p")
+
+            if len(paragraphs) != len(markers.paragraphs):
+                return None
+
+            selected = self._select_paragraphs(
+                page.number, markers, current_article_number, next_article_number  # type: ignore
+            )
+            result_nodes.extend(paragraphs[index] for index in selected)
+
+        if len(result_nodes) == 0:
+            return Err(ValueError("No article nodes found."))
+
+        return Ok(tuple(result_nodes))
+
+    def positions_on_page(self, article_number: int, page: int) -> list[int]:
+        """Returns the indices of the paragraphs of a page, where the article number
+        occurs followed by a dot."""
+        positions = self.positions.get(article_number, ())
+        start = bisect_left(positions, (page, -1))
+        end = bisect_left(positions, (page + 1, -1), start)
+
+        return [paragraph for _, paragraph in positions[start:end]]
+
+    def _select_paragraphs(
+        self,
+        page: int,
+        markers: PageMarkers,
+        current_article_number: int,
+        next_article_number: int | None,
+    ) -> Sequence[int]:
+        """Selects the paragraphs of an article on a page like
+        `select_article_paragraphs`."""
+        current_is_on_page = current_article_number in markers.numbers
+        next_is_on_page = next_article_number in markers.numbers
+
+        if not current_is_on_page and not next_is_on_page:
+            return range(len(markers.paragraphs))
+
+        currents = self.positions_on_page(current_article_number, page)
+
+        # several sibling groups or a start without marker need every paragraph
+        if markers.group_count != 1 or (
+            current_is_on_page and next_is_on_page and len(currents) == 0
+        ):
+            start_marker = str(current_article_number)
+            return select_article_paragraphs(
+                [paragraph.group for paragraph in markers.paragraphs],
+                [
+                    any(start_marker in digits for digits in paragraph.digits)
+                    for paragraph in markers.paragraphs
+                ],
+                [
+                    current_article_number in paragraph.numbers
+                    for paragraph in markers.paragraphs
+                ],
+                [
+                    next_article_number in paragraph.numbers
+                    for paragraph in markers.paragraphs
+                ],
+                current_is_on_page,
+                next_is_on_page,
+            )
+
+        if not next_is_on_page:
+            return range(currents[0], len(markers.paragraphs)) if currents else ()
+
+        # the article ends before the paragraph preceding the last next marker
+        nexts = self.positions_on_page(next_article_number, page)  # type: ignore
+        end = nexts[-1] if nexts else 0
+
+        if not current_is_on_page:
+            return range(end - 1)
+
+        # the article starts at the first marker – or earlier at a paragraph with
+        # the number without a dot
+        start_marker = str(current_article_number)
+        selected = [
+            index
+            for index in range(min(currents[0], end))
+            if any(
+                start_marker in digits for digits in markers.paragraphs[index].digits
+            )
+        ]
+        selected.extend(range(currents[0], end))
+
+        return selected[:-1]
+
+
+def build_article_index(
+    volume_path: Path,
+    pages: Iterable[str | None] | None = None,
+    header_mask: HeaderMask | None = None,
+) -> ArticleBoundaryIndex:
+    """Builds the article boundary index of a volume in one pass over all pages.
+
+    Args:
+        volume_path: The path to the PDF of the volume.
+        pages: The HTML of every page of the volume (None for missing pages). By
+            default the pages are read from the page store or extracted.
+        header_mask: The header mask used to remove the page furniture, like
+            `remove_page_furniture` does. By default it's the mask of
+            `get_header_mask` – or built from the given pages.
+
+    Returns:
+        The index.
+    """
+    if pages is None:
+        # the volume is read once, a missing mask is built from the same pages
+        pages = list(read_volume(volume_path))
+
+        if header_mask is None:
+            header_mask = get_header_mask(volume_path, pages=pages)
+    else:
+        pages = list(pages)
+
+    if header_mask is None:
+        header_mask = build_header_mask(volume_path, pages)
+
+    page_markers: dict[int, PageMarkers] = {}
+    positions: dict[int, list[tuple[int, int]]] = {}
+
+    for number, html in enumerate(pages):
+        if html is None:
+            continue
+
+        page = ParsedPage(html, volume_path, number)
+
+        if header_mask.apply((page,)) is None:
+            remove_header((page,))
+
+        page_markers[number] = markers = _collect_markers(page)
+
+        for position, paragraph in enumerate(markers.paragraphs):
+            for article_number in paragraph.numbers:
+                positions.setdefault(article_number, []).append((number, position))
+
+    logger.info(f"Indexed the article boundaries of {len(page_markers)} pages")
+
+    return ArticleBoundaryIndex(
+        volume_path,
+        page_markers,
+        {number: tuple(found) for number, found in positions.items()},
+    )
+
+
+def get_article_index(
+    volume_path: Path, build: bool = True
+) -> ArticleBoundaryIndex | None:
+    """Returns the article boundary index of a volume. It's kept in memory and
+    persisted next to the parsed table of contents; a changed PDF invalidates it.
+
+    Args:
+        volume_path: The path to the PDF of the volume.
+        build: Whether to build a missing index. If False, a missing index is only
+            built, when the page store of the volume is available.
+
+    Returns:
+        The index or None, if it's missing and shouldn't be built.
+    """
+    try:
+        stat = volume_path.stat()
+    except FileNotFoundError:
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with _INDEXES_LOCK:
+        if (index := _INDEXES.get(volume_path)) and index[0] == version:
+            return index[1]
+
+        volume_lock = _INDEX_LOCKS.setdefault(volume_path, Lock())
+
+    # the index of a volume is built by one thread, the others don't wait for it,
+    # if they only use an existing index
+    if not volume_lock.acquire(blocking=build):
+        return None
+
+    try:
+        if (index := _INDEXES.get(volume_path)) and index[0] == version:
+            return index[1]
+
+        cache = get_cache(TOC_CACHE_NAMESPACE)
+        # the index depends on the header mask, which removed the page furniture
+        cache_key = (
+            f"v{ARTICLE_INDEX_FORMAT}/articles/mask-v{HEADER_MASK_VERSION}/"
+            f"{version[0]}-{version[1]}/{volume_path}"
+        )
+
+        if (article_index := cache.get(cache_key)) is None:
+            if not build and get_page_store(volume_path) is None:
+                return None
+
+            article_index = build_article_index(volume_path)
+            cache[cache_key] = article_index
+
+        with _INDEXES_LOCK:
+            _INDEXES[volume_path] = (version, article_index)
+
+        return article_index
+    finally:
+        volume_lock.release()
+
+
+def _collect_markers(page: ParsedPage) -> PageMarkers:
+    parents: dict[object, int] = {}
+    paragraphs = []
+
+    for paragraph in page.selector.xpath("//p"):
+        texts = [
+            "".join(child.itertext()) for child in paragraph.root if child.tag == "span"
+        ]
+        paragraphs.append(
+            ParagraphMarkers(
+                parents.setdefault(paragraph.root.getparent(), len(parents)),
+                frozenset(number for text in texts for number in _find_numbers(text)),
+                tuple(digits for text in texts for digits in _DIGITS.findall(text)),
+            )
+        )
+
+    return PageMarkers(
+        frozenset(
+            number
+            for span in page.selector.root.iter("span")
+            for number in _find_numbers("".join(span.itertext()))
+        ),
+        tuple(paragraphs),
+        len(parents),
+    )
+
+
+def _find_numbers(text: str) -> set[int]:
+    """Finds all numbers `n`, for which `f"{n}."` occurs in the text – i.e. every
+    suffix of a digit sequence followed by a dot."""
+    return {
+        int(digits[start:])
+        for digits in _NUMBERS.findall(text)
+        for start in range(len(digits))
+    }
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Build the article boundary index of the volumes."
+    )
+    parser.add_argument(
+        "pdfs",
+        nargs="*",
+        type=Path,
+        default=sorted((ZG_DATA_ROOT / "pdf").glob("ZG_*.pdf")),
+    )
+    parsed = parser.parse_args(args)
+
+    for pdf_path in parsed.pdfs:
+        get_article_index(pdf_path)
+
+
+if __name__ == "__main__":
+    main()
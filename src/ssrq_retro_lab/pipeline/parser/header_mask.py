@@ -0,0 +1,366 @@
+import html
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Sequence
+
+import numpy as np
+from loguru import logger
+from result import Ok, Result
+
+from ssrq_retro_lab.pipeline.cache import get_cache
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage, remove_header
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import TOC_CACHE_NAMESPACE
+from ssrq_retro_lab.pipeline.pdf.extraction import read_volume
+from ssrq_retro_lab.pipeline.pdf.page_store import get_page_store
+
+__all__ = [
+    "HEADER_MASK_VERSION",
+    "HeaderMask",
+    "build_header_mask",
+    "get_header_mask",
+    "remove_page_furniture",
+]
+
+# bump, when the structure of the pickled class or the detection changes
+HEADER_MASK_FORMAT = 2
+BAND_TOLERANCE = 3.0
+MAX_SHIFT = 15.0
+MIN_REPEATS = 3
+# the share of the pages with a band, which must have a page number at the offset
+MIN_PAGE_NUMBER_SHARE = 0.5
+# the version of the masks built by `get_header_mask`, part of the cache keys of
+# the mask and of everything derived from it
+HEADER_MASK_VERSION = (
+    f"{HEADER_MASK_FORMAT}-{BAND_TOLERANCE}-{MAX_SHIFT}-{MIN_REPEATS}-"
+    f"{MIN_PAGE_NUMBER_SHARE}"
+)
+
+_PARAGRAPH = re.compile(r"<p\b([^>]*)>(.*?)</p>", re.S)
+_TOP = re.compile(r"top:\s*(\d+(?:\.\d+)?)pt")
+_TAG = re.compile(r"<[^>]+>")
+_DIGITS = re.compile(r"[0-9]+")
+_SPACES = re.compile(r"\s+")
+_PAGE_NUMBER = re.compile(r"[0-9]{1,4}")
+_LETTER = re.compile(r"[^\W\d_]")
+
+_MASKS: dict[Path, tuple[tuple[int, ...], "HeaderMask"]] = {}
+_MASK_LOCKS: dict[Path, Lock] = {}
+_MASKS_LOCK = Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class HeaderMask:
+    """The page furniture (running heads, page numbers and footers) of a volume.
+
+    Attributes:
+        volume_path: The path to the PDF of the volume.
+        paragraph_counts: The number of paragraphs per (0-based) page index.
+        masked: The indices of the paragraphs per page index, which are page
+            furniture. Pages without furniture are missing.
+    """
+
+    volume_path: Path
+    paragraph_counts: dict[int, int]
+    masked: dict[int, frozenset[int]]
+
+    def apply(
+        self, pages: Sequence[ParsedPage]
+    ) -> Result[tuple[ParsedPage, ...], ValueError] | None:
+        """Removes the page furniture from the parsed pages. The pages are changed
+        in place, like by `remove_header`.
+
+        Args:
+            pages: The pages to clean.
+
+        Returns:
+            The cleaned pages or None, if a page isn't part of the mask. Then no
+            page is changed.
+        """
+        paragraphs_per_page = []
+
+        for page in pages:
+            if (
+                page.volume_path != self.volume_path
+                or page.number not in self.paragraph_counts
+            ):
+                return None
+
+            paragraphs = page.selector.xpath("//p")
+
+            if len(paragraphs) != self.paragraph_counts[page.number]:  # type: ignore
+                return None
+
+            paragraphs_per_page.append(paragraphs)
+
+        for page, paragraphs in zip(pages, paragraphs_per_page):
+            for index in self.masked.get(page.number, ()):  # type: ignore
+                paragraphs[index].drop()
+
+        return Ok(tuple(pages))
+
+    def masked_positions(
+        self, number: int, paragraph_count: int
+    ) -> frozenset[int] | None:
+        """Returns the indices of the page furniture of a page – e.g. to remove it
+        from the lines of the structured text, which match the paragraphs.
+
+        Args:
+            number: The (0-based) index of the page.
+            paragraph_count: The number of paragraphs (or lines) of the page.
+
+        Returns:
+            The indices or None, if the page isn't part of the mask.
+        """
+        if self.paragraph_counts.get(number) != paragraph_count:
+            return None
+
+        return self.masked.get(number, frozenset())
+
+
+def build_header_mask(
+    volume_path: Path,
+    pages: Iterable[str | None] | None = None,
+    band_tolerance: float = BAND_TOLERANCE,
+    max_shift: float = MAX_SHIFT,
+    min_repeats: int = MIN_REPEATS,
+) -> HeaderMask:
+    """Detects the page furniture of a volume in one pass over all its pages.
+
+    The top position and the text of every paragraph of the volume are collected
+    in arrays. The first (and last) band of a page – the paragraphs within
+    `band_tolerance` of its topmost (bottommost) paragraph – is a candidate for a
+    header (footer), if the band is at most `max_shift` away from the position,
+    where most pages of the volume start (end). A band of candidates is page
+    furniture as a whole, if it contains a text repeated on other pages. Otherwise
+    only its page number is furniture.
+
+    A page number is a number, whose difference to the page index is the same on
+    at least `min_repeats` pages and on at least `MIN_PAGE_NUMBER_SHARE` of the
+    pages with a band – so numbers in the margin, e.g. line numbers, which share
+    an offset by chance, aren't taken for page numbers. A text is repeated, if it
+    contains letters and occurs – ignoring its digits (e.g. the article numbers of
+    a running head) – in the candidates of at least `min_repeats` pages.
+
+    Args:
+        volume_path: The path to the PDF of the volume.
+        pages: The HTML of every page of the volume (None for missing pages). By
+            default the pages are read from the page store or extracted.
+        band_tolerance: The maximum distance (in pt) of paragraphs in a band.
+        max_shift: The maximum distance (in pt) of a band from the usual position
+            of the headers (footers) to be considered one.
+        min_repeats: The minimum number of pages a page number offset or a text
+            must occur on.
+
+    Returns:
+        The mask.
+    """
+    if pages is None:
+        pages = read_volume(volume_path)
+
+    paragraph_counts: dict[int, int] = {}
+    page_numbers: list[int] = []
+    positions: list[int] = []
+    tops: list[float] = []
+    texts: list[str] = []
+
+    for number, page in enumerate(pages):
+        if page is None:
+            continue
+
+        paragraphs = _PARAGRAPH.findall(page)
+        paragraph_counts[number] = len(paragraphs)
+
+        for position, (attributes, content) in enumerate(paragraphs):
+            if (top := _TOP.search(attributes)) is None:
+                continue
+
+            page_numbers.append(number)
+            positions.append(position)
+            tops.append(float(top.group(1)))
+            texts.append(_SPACES.sub(" ", html.unescape(_TAG.sub("", content))).strip())
+
+    masked: dict[int, set[int]] = {}
+
+    if len(tops) > 0:
+        page_array = np.array(page_numbers)
+        top_array = np.array(tops)
+        is_furniture = _detect_bands(
+            page_array, top_array, texts, band_tolerance, max_shift, min_repeats
+        ) | _detect_bands(
+            page_array, -top_array, texts, band_tolerance, max_shift, min_repeats
+        )
+
+        for index in np.flatnonzero(is_furniture):
+            masked.setdefault(page_numbers[index], set()).add(positions[index])
+
+    logger.info(
+        f"Found page furniture on {len(masked)} of {len(paragraph_counts)} pages "
+        f"of {volume_path.name}"
+    )
+
+    return HeaderMask(
+        volume_path,
+        paragraph_counts,
+        {number: frozenset(found) for number, found in masked.items()},
+    )
+
+
+def get_header_mask(
+    volume_path: Path,
+    build: bool = True,
+    pages: Sequence[str | None] | None = None,
+) -> HeaderMask | None:
+    """Returns the header mask of a volume. It's kept in memory and persisted next
+    to the parsed table of contents; a changed PDF invalidates it.
+
+    Args:
+        volume_path: The path to the PDF of the volume.
+        build: Whether to build a missing mask. If False, a missing mask is only
+            built, when the page store of the volume is available.
+        pages: The HTML of every page of the volume (None for missing pages), if
+            the caller has read them already. A missing mask is built from them
+            instead of reading the volume again.
+
+    Returns:
+        The mask or None, if it's missing and shouldn't be built.
+    """
+    try:
+        stat = volume_path.stat()
+    except FileNotFoundError:
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with _MASKS_LOCK:
+        if (mask := _MASKS.get(volume_path)) and mask[0] == version:
+            return mask[1]
+
+        volume_lock = _MASK_LOCKS.setdefault(volume_path, Lock())
+
+    # like the article index, callers which don't build don't wait for a build
+    if not volume_lock.acquire(blocking=build):
+        return None
+
+    try:
+        if (mask := _MASKS.get(volume_path)) and mask[0] == version:
+            return mask[1]
+
+        cache = get_cache(TOC_CACHE_NAMESPACE)
+        cache_key = (
+            f"v{HEADER_MASK_VERSION}/header-mask/"
+            f"{version[0]}-{version[1]}/{volume_path}"
+        )
+
+        if (header_mask := cache.get(cache_key)) is None:
+            if not build and get_page_store(volume_path) is None:
+                return None
+
+            header_mask = build_header_mask(volume_path, pages)
+            cache[cache_key] = header_mask
+
+        with _MASKS_LOCK:
+            _MASKS[volume_path] = (version, header_mask)
+
+        return header_mask
+    finally:
+        volume_lock.release()
+
+
+def remove_page_furniture(
+    pages: Sequence[ParsedPage], min_top_position: int = 85
+) -> Result[tuple[ParsedPage, ...], ValueError]:
+    """Removes the page furniture from the parsed pages with the header mask of
+    their volume – if available. Otherwise the headers are removed with the
+    threshold of `remove_header`.
+
+    Args:
+        pages: The pages to clean, which are changed in place.
+        min_top_position: The threshold used without a header mask.
+
+    Returns:
+        The cleaned pages.
+    """
+    volume_paths = {page.volume_path for page in pages}
+
+    if len(volume_paths) == 1 and (volume_path := volume_paths.pop()) is not None:
+        header_mask = get_header_mask(volume_path, build=False)
+        cleaned_pages = header_mask.apply(pages) if header_mask is not None else None
+
+        if cleaned_pages is not None:
+            return cleaned_pages
+
+    return remove_header(pages, min_top_position)
+
+
+def _detect_bands(
+    pages: np.ndarray,
+    tops: np.ndarray,
+    texts: list[str],
+    band_tolerance: float,
+    max_shift: float,
+    min_repeats: int,
+) -> np.ndarray:
+    """Detects the furniture in the first band of the pages. Footers are detected
+    by passing the negated top positions."""
+    page_count = int(pages.max()) + 1
+    first_tops = np.full(page_count, np.inf)
+    np.minimum.at(first_tops, pages, tops)
+
+    occupied = np.isfinite(first_tops)
+    bands, counts = np.unique(
+        np.round(first_tops[occupied] / band_tolerance), return_counts=True
+    )
+
+    if counts.max() < min_repeats:
+        return np.zeros(len(tops), dtype=bool)
+
+    usual_top = bands[counts.argmax()] * band_tolerance
+    candidates = (tops <= first_tops[pages] + band_tolerance) & (
+        np.abs(first_tops[pages] - usual_top) <= max_shift
+    )
+    indices = np.flatnonzero(candidates)
+    candidate_pages = pages[indices]
+
+    keys = np.array(
+        [_SPACES.sub(" ", _DIGITS.sub("", texts[i])).strip().lower() for i in indices],
+        dtype=object,
+    )
+    has_letters = np.array([_LETTER.search(key) is not None for key in keys], bool)
+    repeated = np.zeros(len(indices), dtype=bool)
+
+    if has_letters.any():
+        key_ids = np.unique(keys.astype(str), return_inverse=True)[1].reshape(-1)
+        pairs = np.unique(np.stack([key_ids, candidate_pages])[:, has_letters], axis=1)
+        pages_per_key = np.bincount(pairs[0], minlength=key_ids.max() + 1)
+        repeated = has_letters & (pages_per_key[key_ids] >= min_repeats)
+
+    numbers = np.array(
+        [int(texts[i]) if _PAGE_NUMBER.fullmatch(texts[i]) else -1 for i in indices],
+        dtype=np.int64,
+    )
+    is_number = numbers >= 0
+    is_page_number = np.zeros(len(indices), dtype=bool)
+
+    if is_number.any():
+        offsets, offset_counts = np.unique(
+            (numbers - candidate_pages)[is_number], return_counts=True
+        )
+
+        if offset_counts.max() >= max(
+            min_repeats, MIN_PAGE_NUMBER_SHARE * len(np.unique(candidate_pages))
+        ):
+            is_page_number = is_number & (
+                numbers - candidate_pages == offsets[offset_counts.argmax()]
+            )
+
+    # a band with a repeated text is furniture as a whole, e.g. a running head
+    # next to its page number – a page number alone doesn't mask its band
+    furniture_pages = np.zeros(page_count, dtype=bool)
+    furniture_pages[candidate_pages[repeated]] = True
+
+    is_furniture = np.zeros(len(tops), dtype=bool)
+    is_furniture[indices] = furniture_pages[candidate_pages] | is_page_number
+
+    return is_furniture
@@ -1,97 +1,233 @@
 import re
+from pathlib import Path
+from typing import Sequence
 
 from parsel import Selector
 from result import Err, Ok, Result
 
 
-def collect_article_nodes_from_pages(
-    pages: tuple[str, ...], current_article_number: int, next_article_number: int | None
+class ParsedPage:
+    """A page of the HTML export of PyMuPDF, which is parsed once (on first access)
+    and shared by all components – instead of serialising and re-parsing the page
+    in every step. Changes of the tree (e.g. removed headers) are kept.
+
+    When pickled (e.g. by the run manifest or for a process pool), the page is
+    serialised to HTML and parsed again on first access.
+
+    Attributes:
+        volume_path: The path to the PDF of the volume, if known.
+        number: The (0-based) index of the page in the PDF, if known.
+    """
+
+    __slots__ = ("_html", "_selector", "volume_path", "number")
+
+    def __init__(
+        self, html: str, volume_path: Path | None = None, number: int | None = None
+    ):
+        self._html = html
+        self._selector: Selector | None = None
+        self.volume_path = volume_path
+        self.number = number
+
+    @classmethod
+    def of(cls, page: "str | ParsedPage") -> "ParsedPage":
+        return page if isinstance(page, ParsedPage) else cls(page)
+
+    @property
+    def selector(self) -> Selector:
+        if self._selector is None:
+            self._selector = Selector(text=self._html, type="xml")
+
+        return self._selector
+
+    @property
+    def html(self) -> str:
+        """The (current) HTML of the page."""
+        return self._html if self._selector is None else self._selector.get()
+
+    def __getstate__(self) -> tuple[str, Path | None, int | None]:
+        return self.html, self.volume_path, self.number
+
+    def __setstate__(self, state: tuple[str, Path | None, int | None]) -> None:
+        self._html, self.volume_path, self.number = state
+        self._selector = None
+
+
+def collect_article_nodes(
+    pages: Sequence[ParsedPage],
+    current_article_number: int,
+    next_article_number: int | None,
 ) -> Result[tuple[Selector, ...], ValueError]:
     """A naive and AI-free function to extract all
     relevant nodes for a given article (a document).
 
+    The article starts at the paragraph with a span containing the current article
+    number and ends before the paragraph with a span containing the next article
+    number. Every page is scanned once: the paragraphs are selected by their
+    position relative to these marker paragraphs among their siblings.
+
     Args:
-        pages: The pages to extract the article nodes from as HTML export from PyMuPDF.
+        pages: The parsed pages to extract the article nodes from.
         current_article_number: The current article number.
         next_article_number: The next article number.
 
     Returns:
         The article nodes as a tuple of Selector instances. If no article nodes
         are found, a ValueError is returned as an error."""
+    current_marker = f"{current_article_number}."
+    next_marker = f"{next_article_number}."
     result_nodes: list[Selector] = []
 
     for page in pages:
-        page_selector = Selector(text=page, type="xml")
+        spans = [_text_of(span) for span in page.selector.root.iter("span")]
+        paragraphs = page.selector.xpath("//p")
+        parents: dict[object, int] = {}
+        span_texts = [_child_span_texts(paragraph) for paragraph in paragraphs]
 
-        current_article_is_on_page = bool(
-            page_selector.xpath(
-                f"//span[contains(., '{current_article_number}.')]"
-            ).get()
-        )
-        next_article_is_on_page = bool(
-            page_selector.xpath(f"//span[contains(., '{next_article_number}.')]").get()
+        selected = select_article_paragraphs(
+            [
+                parents.setdefault(paragraph.root.getparent(), len(parents))
+                for paragraph in paragraphs
+            ],
+            [_contains(texts, str(current_article_number)) for texts in span_texts],
+            [_contains(texts, current_marker) for texts in span_texts],
+            [_contains(texts, next_marker) for texts in span_texts],
+            any(current_marker in span for span in spans),
+            any(next_marker in span for span in spans),
         )
+        result_nodes.extend(paragraphs[index] for index in selected)
 
-        if current_article_is_on_page and next_article_is_on_page:
-            result_nodes.extend(
-                page_selector.xpath(
-                    f"""//p[preceding-sibling::p[span[contains(., '{current_article_number}.')]]
-                    or self::p[span[contains(., '{current_article_number}')]]]
-                    [following-sibling::p[span[contains(., '{next_article_number}.')]]]
-                    [position() < last()]"""
-                )
-            )
-            continue
-
-        if current_article_is_on_page and not next_article_is_on_page:
-            result_nodes.extend(
-                page_selector.xpath(
-                    f"""//p[preceding-sibling::p[span[contains(., '{current_article_number}.')]]
-                    or self::p[span[contains(., '{current_article_number}.')]]]"""
-                )
+    if len(result_nodes) == 0:
+        return Err(ValueError("No article nodes found."))
+
+    return Ok(tuple(result_nodes))
+
+
+def collect_article_nodes_from_pages(
+    pages: Sequence[str | ParsedPage],
+    current_article_number: int,
+    next_article_number: int | None,
+) -> Result[tuple[Selector, ...], ValueError]:
+    """Like `collect_article_nodes`, for pages as HTML export from PyMuPDF.
+
+    Args:
+        pages: The pages to extract the article nodes from as HTML export from PyMuPDF.
+        current_article_number: The current article number.
+        next_article_number: The next article number.
+
+    Returns:
+        The article nodes as a tuple of Selector instances. If no article nodes
+        are found, a ValueError is returned as an error."""
+    return collect_article_nodes(
+        tuple(ParsedPage.of(page) for page in pages),
+        current_article_number,
+        next_article_number,
+    )
+
+
+def select_article_paragraphs(
+    groups: Sequence[int],
+    starts: Sequence[bool],
+    currents: Sequence[bool],
+    nexts: Sequence[bool],
+    current_article_is_on_page: bool,
+    next_article_is_on_page: bool,
+) -> list[int]:
+    """Selects the paragraphs of an article on a page.
+
+    If neither the current nor the next article is on the page, all paragraphs
+    belong to the article. Otherwise the article starts at the paragraph with the
+    current article number and ends before the last paragraph preceding the one
+    with the next article number – among sibling paragraphs.
+
+    Args:
+        groups: The group of siblings (e.g. the index of the parent) per paragraph.
+        starts: Whether a paragraph has a span containing the current article
+            number (without a dot).
+        currents: Whether a paragraph has a span containing the current article
+            number followed by a dot.
+        nexts: Whether a paragraph has a span containing the next article number
+            followed by a dot.
+        current_article_is_on_page: Whether any span of the page contains the
+            current article number followed by a dot.
+        next_article_is_on_page: The same for the next article number.
+
+    Returns:
+        The indices of the selected paragraphs in document order.
+    """
+    if not current_article_is_on_page and not next_article_is_on_page:
+        return list(range(len(groups)))
+
+    siblings: dict[int, list[int]] = {}
+
+    for index, group in enumerate(groups):
+        siblings.setdefault(group, []).append(index)
+
+    selected: list[int] = []
+
+    for indices in siblings.values():
+        # whether a following sibling contains the marker of the next article
+        followed_by_next = [False] * len(indices)
+
+        for position in range(len(indices) - 2, -1, -1):
+            followed_by_next[position] = followed_by_next[position + 1] or (
+                next_article_is_on_page and nexts[indices[position + 1]]
             )
-            continue
 
-        if not current_article_is_on_page and next_article_is_on_page:
-            result_nodes.extend(
-                page_selector.xpath(
-                    f"//p[following-sibling::p[span[contains(., '{next_article_number}.')]]][position() < last()]"
-                )
+        selected_siblings: list[int] = []
+        preceded_by_current = False
+
+        for position, index in enumerate(indices):
+            if not next_article_is_on_page:
+                if preceded_by_current or currents[index]:
+                    selected_siblings.append(index)
+            elif not current_article_is_on_page:
+                if followed_by_next[position]:
+                    selected_siblings.append(index)
+            elif (preceded_by_current or starts[index]) and followed_by_next[position]:
+                selected_siblings.append(index)
+
+            preceded_by_current = preceded_by_current or (
+                current_article_is_on_page and currents[index]
             )
-            continue
 
-        result_nodes.extend(page_selector.xpath("//p"))
+        # the last paragraph before the next article is not part of the article
+        selected.extend(
+            selected_siblings[:-1] if next_article_is_on_page else selected_siblings
+        )
 
-    if len(result_nodes) == 0:
-        return Err(ValueError("No article nodes found."))
+    return sorted(selected)
 
-    return Ok(tuple(result_nodes))
 
+def _contains(texts: list[str], marker: str) -> bool:
+    return any(marker in text for text in texts)
 
-def remove_header_from_pages(
-    pages: tuple[str, ...], min_top_position: int = 85
-) -> Result[tuple[str, ...], ValueError]:
-    """A utility function, which cleans the headers (Kopfzeilen) from
-    the pages – if present. It uses a hard-coded threshold to determine
+
+def _child_span_texts(paragraph: Selector) -> list[str]:
+    return [_text_of(child) for child in paragraph.root if child.tag == "span"]
+
+
+def _text_of(element) -> str:
+    return "".join(element.itertext())
+
+
+def remove_header(
+    pages: Sequence[ParsedPage], min_top_position: int = 85
+) -> Result[tuple[ParsedPage, ...], ValueError]:
+    """Removes the headers (Kopfzeilen) from the parsed pages – if present. The
+    pages are changed in place. It uses a hard-coded threshold to determine
     if a paragraph is a header.
 
     Args:
-        pages: The pages to clean. Each page is HTML as a string.
+        pages: The pages to clean.
         min_top_position: The minimum top position of a paragraph not to be
             considered a header.
 
     Returns:
-        The cleaned pages. Each page is HTML as a string. If the number of
-        cleaned pages is not equal to the number of pages, a ValueError is
-        returned as an error.
-
+        The cleaned pages.
     """
-
-    cleaned_pages = []
-
-    for p in pages:
-        page_selector = Selector(text=p, type="xml")
-        for para in page_selector.css("div p[style]"):
+    for page in pages:
+        for para in page.selector.css("div p[style]"):
             style = para.xpath("@style").get()
 
             if style is None:
@@ -101,7 +237,35 @@ def remove_header_from_pages(
                 if float(top_value.group(1)) <= min_top_position:
                     para.drop()
 
-        cleaned_pages.append(page_selector.get())
+    return Ok(tuple(pages))
+
+
+def remove_header_from_pages(
+    pages: Sequence[str | ParsedPage], min_top_position: int = 85
+) -> Result[tuple[str, ...], ValueError]:
+    """A utility function, which cleans the headers (Kopfzeilen) from
+    the pages – if present. It uses a hard-coded threshold to determine
+    if a paragraph is a header.
+
+    Args:
+        pages: The pages to clean. Each page is HTML as a string or a parsed page,
+            which is changed in place.
+        min_top_position: The minimum top position of a paragraph not to be
+            considered a header.
+
+    Returns:
+        The cleaned pages. Each page is HTML as a string. If the number of
+        cleaned pages is not equal to the number of pages, a ValueError is
+        returned as an error.
+
+    """
+
+    cleaned_pages = [
+        page.html
+        for page in remove_header(
+            tuple(ParsedPage.of(page) for page in pages), min_top_position
+        ).unwrap()
+    ]
 
     if len(cleaned_pages) != len(pages):
         return Err(
@@ -1,9 +1,24 @@
-from dataclasses import dataclass
+from collections import defaultdict
+from dataclasses import dataclass, field
 from pathlib import Path
+from threading import Lock
 
-from parsel import Selector
+from loguru import logger
+from parsel import Selector, SelectorList
 from result import Err, Ok, Result, is_err, is_ok
 
+from ssrq_retro_lab.pipeline.cache import file_version, get_cache
+from ssrq_retro_lab.repository.reader import XMLReader
+
+ENTRY_XPATH = "//entry[date][not(entry[date])]"
+TOC_CACHE_NAMESPACE = "XMLToC"
+# bump, when the structure of the pickled classes changes
+TOC_CACHE_FORMAT = 1
+
+_TOCS: dict[tuple[Path, Path], tuple[str, "XMLToC"]] = {}
+_TOC_LOCKS: dict[tuple[Path, Path], Lock] = {}
+_TOC_LOCKS_LOCK = Lock()
+
 
 class XMLToCParsingError(Exception):
     """Base class for XMLToC parsing errors."""
@@ -34,6 +49,16 @@ class XMLToC:
     meta: VolumeMeta
     volume_path: Path
     page_to_image: dict[int, int]
+    _index: dict[int, VolumeEntry] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        index: dict[int, VolumeEntry] = {}
+
+        for entry in self.entries:
+            # some article numbers occur twice, the first entry wins
+            index.setdefault(entry.no, entry)
+
+        object.__setattr__(self, "_index", index)
 
     def get_entry(self, article_number: int) -> Result[VolumeEntry, XMLToCParsingError]:
         """Gets the volume entry for a given article number.
@@ -45,9 +70,7 @@ class XMLToC:
             The volume entry as Result with VolumeEntry as Ok value
             or an XMLToCParsingError as Err value.
         """
-        entry = next(
-            (entry for entry in self.entries if entry.no == article_number), None
-        )
+        entry = self._index.get(article_number)
 
         return (
             Ok(entry)
@@ -93,6 +116,51 @@ def parse_xml_toc(
     )
 
 
+def load_xml_toc(
+    toc_path: Path, volume_path: Path
+) -> Result[XMLToC, XMLToCParsingError]:
+    """Loads the parsed table of contents of a volume.
+
+    The parsed table of contents is kept in memory and persisted in the cache.
+    Both are invalidated, when the content of the XML file changes.
+
+    Args:
+        toc_path: The path to the XML table of contents.
+        volume_path: The path to the volume.
+
+    Returns:
+        The parsed table of contents as Result with XMLToC as Ok value
+        or an XMLToCParsingError as Err value."""
+    version = file_version(toc_path)
+    key = (toc_path, volume_path)
+
+    # one lock per table of contents, so parsing one doesn't block the others
+    with _TOC_LOCKS_LOCK:
+        toc_lock = _TOC_LOCKS.setdefault(key, Lock())
+
+    with toc_lock:
+        if (toc := _TOCS.get(key)) and toc[0] == version:
+            return Ok(toc[1])
+
+        cache = get_cache(TOC_CACHE_NAMESPACE)
+        cache_key = f"v{TOC_CACHE_FORMAT}/{version}/{volume_path}"
+
+        if cache_key in cache:
+            xml_toc = Ok(cache[cache_key])
+        else:
+            xml_toc = parse_xml_toc(XMLReader(toc_path).read(), volume_path)
+
+            if is_err(xml_toc):
+                return xml_toc
+
+            logger.debug(f"Parsed table of contents {version}")
+            cache[cache_key] = xml_toc.unwrap()
+
+        _TOCS[key] = (version, xml_toc.unwrap())
+
+        return xml_toc
+
+
 def _get_volume_meta_infos(toc: Selector) -> Result[VolumeMeta, XMLToCParsingError]:
     canton = toc.xpath("/volinfo/@canton").get()
     title = toc.xpath("/volinfo/title/text()").get()
@@ -114,6 +182,10 @@ def _get_volume_entries(
 ) -> Result[tuple[VolumeEntry, ...], XMLToCParsingError]:
     """Retrieves the volume entries from the table of contents.
 
+    The entries are visited once in document order. The start pages of all
+    entries are collected first, so the page range of an entry is derived from
+    the start page of its successor without searching the document again.
+
     Args:
         toc: The table of contents.
 
@@ -121,9 +193,10 @@ def _get_volume_entries(
         The volume entries as Result with tuple of VolumeEntry as Ok value
         or an XMLToCParsingError as Err value.
     """
-    entries = toc.xpath("//entry[date][not(entry[date])]")
+    entries = toc.xpath(ENTRY_XPATH)
+    start_pages = _collect_start_pages(entries)
 
-    parsed_entries = tuple(_parse_entry(entry, toc) for entry in entries)
+    parsed_entries = tuple(_parse_entry(entry, toc, start_pages) for entry in entries)
     return (
         Ok(tuple(e.unwrap() for e in parsed_entries))
         if all(is_ok(e) for e in parsed_entries)
@@ -136,14 +209,36 @@ def _get_volume_entries(
     )
 
 
+def _collect_start_pages(entries: SelectorList) -> dict[str, list[str]]:
+    """Collects the start pages of the entries by their (textual) number.
+
+    Args:
+        entries: The entries of the table of contents.
+
+    Returns:
+        The start pages as dict with the number as key and the pages as value.
+    """
+    start_pages: dict[str, list[str]] = defaultdict(list)
+
+    for entry in entries:
+        pages = entry.xpath("pg/text()").getall()
+
+        for no in entry.xpath("no/text()").getall():
+            start_pages[no].extend(pages)
+
+    return start_pages
+
+
 def _parse_entry(
-    entry: Selector, toc: Selector
+    entry: Selector, toc: Selector, start_pages: dict[str, list[str]] | None = None
 ) -> Result[VolumeEntry, XMLToCParsingError]:
     """Parses a single volume entry.
 
     Args:
         entry: The entry to parse.
         toc: The table of contents.
+        start_pages: The start pages of all entries by their number, collected
+            from the table of contents if missing.
 
     Returns:
         The parsed volume entry as Result with VolumeEntry as Ok value
@@ -171,7 +266,12 @@ def _parse_entry(
             )
         )
 
-    pages = _get_pages(toc, article_number, start_page)
+    if start_pages is None:
+        start_pages = _collect_start_pages(toc.xpath(ENTRY_XPATH))
+
+    pages = _get_pages(
+        start_pages.get(str(article_number + 1), []), article_number, start_page
+    )
 
     if is_err(pages):
         return pages
@@ -188,12 +288,12 @@ def _parse_entry(
 
 
 def _get_pages(
-    toc: Selector, article_number: int, start_page: int
+    end_pages: list[str], article_number: int, start_page: int
 ) -> Result[tuple[int, ...], XMLToCParsingError]:
     """Gets the pages for a given article number.
 
     Args:
-        toc: The table of contents.
+        end_pages: The start pages of the following article(s).
         article_number: The article number.
         start_page: The start page.
 
@@ -201,10 +301,6 @@ def _get_pages(
         The pages as Result with tuple of int as Ok value
         or an XMLToCParsingError as Err value."""
     try:
-        end_pages = toc.xpath(
-            f"//entry[date][not(entry[date])][no/text() = '{article_number + 1!s}']/pg/text()"
-        ).getall()
-
         end_page = sorted(
             [page for p in end_pages if p and (page := int(p)) >= start_page]
         )
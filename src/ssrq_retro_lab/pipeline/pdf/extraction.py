@@ -1,8 +1,24 @@
+import argparse
 import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+from typing import Iterator, Literal
 
 import fitz  # type: ignore
+from loguru import logger
 
+from ssrq_retro_lab.config import ZG_DATA_ROOT
 from ssrq_retro_lab.pipeline.parser.xml_toc_parser import XMLToC, VolumeEntry
+from ssrq_retro_lab.pipeline.pdf.page_store import (
+    get_page_store,
+    page_store_path,
+    write_page_store,
+)
+from ssrq_retro_lab.repository.reader import get_document_pool
+
+PageFormat = Literal["html", "text"]
 
 
 def extract_pages(
@@ -17,13 +33,145 @@ def extract_pages(
     Returns:
         The extracted text. Is uses the extractHTML from PyMuPDF to extract the text.
         See https://pymupdf.readthedocs.io/en/latest/textpage.html#TextPage.extractHTML
+        The pages are read from the page store of the volume (see `ingest_volume`),
+        only missing pages are extracted from the PDF.
     """
     print(entry)
+    store = get_page_store(Path(pdf.name)) if pdf.name else None
+
     return tuple(
-        _unescape_extracted_text(pdf.load_page(page).get_textpage().extractHTML())
-        for page in _calc_pdf_pages(toc, entry)
+        (
+            text
+            if store is not None and (text := store.get(page)) is not None
+            else _extract_page(pdf, page)
+        )
+        for page in calc_pdf_pages(toc, entry)
+    )
+
+
+def extract_volume(
+    pdf_path: Path,
+    page_format: PageFormat = "html",
+    max_workers: int | None = None,
+    chunk_size: int = 16,
+) -> Iterator[str]:
+    """Extracts all pages of a volume in parallel.
+
+    The pages are split into chunks, which are extracted by a pool of worker
+    processes – each with its own open document. The pages are yielded in page
+    order and the throughput (pages per second) is logged at the end.
+
+    Args:
+        pdf_path: The path to the PDF of the volume.
+        page_format: The format of the pages: `html` like `extract_pages` or plain
+            `text` (sorted in reading order).
+        max_workers: The number of worker processes, defaults to the number of
+            cores.
+        chunk_size: The number of pages extracted by a worker at once.
+
+    Yields:
+        The text of every page of the volume.
+    """
+    with get_document_pool().document(pdf_path) as pdf:
+        page_count = pdf.page_count
+
+    chunks = [
+        (pdf_path, start, min(start + chunk_size, page_count), page_format)
+        for start in range(0, page_count, chunk_size)
+    ]
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(chunks)))
+    start = perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for pages in pool.map(_extract_chunk, chunks):
+            yield from pages
+
+    elapsed = perf_counter() - start
+    logger.info(
+        f"Extracted {page_count} pages of {pdf_path.name} with {max_workers} workers "
+        f"in {elapsed:.2f}s ({page_count / elapsed:.1f} pages/s)"
+    )
+
+
+def read_volume(pdf_path: Path) -> Iterator[str | None]:
+    """Reads all pages of a volume from its page store – or extracts them, if the
+    volume wasn't ingested.
+
+    Args:
+        pdf_path: The path to the PDF of the volume.
+
+    Yields:
+        The text of every page of the volume, None for pages missing in the store.
+    """
+    store = get_page_store(pdf_path)
+
+    if store is None:
+        yield from extract_volume(pdf_path)
+    else:
+        yield from (store.get(page) for page in range(len(store)))
+
+
+def ingest_volume(pdf_path: Path, max_workers: int | None = None) -> Path:
+    """Extracts all pages of a volume once and writes them to its page store.
+
+    Args:
+        pdf_path: The path to the PDF of the volume.
+        max_workers: The number of worker processes, see `extract_volume`.
+
+    Returns:
+        The path of the page store.
+    """
+    store_path = page_store_path(pdf_path)
+    page_count = write_page_store(
+        store_path, pdf_path, extract_volume(pdf_path, "html", max_workers)
     )
 
+    logger.info(f"Stored {page_count} pages of {pdf_path.name} in {store_path}")
+
+    return store_path
+
+
+def export_volume_text(
+    pdf_path: Path, output_path: Path, max_workers: int | None = None
+) -> Path:
+    """Exports the plain text of all pages of a volume to a single text file,
+    like the files in `data/export`.
+
+    Args:
+        pdf_path: The path to the PDF of the volume.
+        output_path: The path of the text file.
+        max_workers: The number of worker processes, see `extract_volume`.
+
+    Returns:
+        The path of the text file.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(output_path, "w", encoding="utf-8") as file:
+        file.writelines(extract_volume(pdf_path, "text", max_workers))
+
+    return output_path
+
+
+def _extract_chunk(
+    chunk: tuple[Path, int, int, PageFormat],
+) -> list[str]:
+    pdf_path, start, stop, page_format = chunk
+
+    with get_document_pool().document(pdf_path) as pdf:
+        return [
+            (
+                _extract_page(pdf, page)
+                if page_format == "html"
+                else pdf.load_page(page).get_textpage().extractText(sort=True)
+            )
+            for page in range(start, stop)
+        ]
+
+
+def _extract_page(pdf: fitz.Document, page: int) -> str:
+    return _unescape_extracted_text(pdf.load_page(page).get_textpage().extractHTML())
+
 
 def _unescape_extracted_text(text: str) -> str:
     """Unescapes the extracted text.
@@ -37,7 +185,7 @@ def _unescape_extracted_text(text: str) -> str:
     return html.unescape(text)
 
 
-def _calc_pdf_pages(toc: XMLToC, entry: VolumeEntry) -> range:
+def calc_pdf_pages(toc: XMLToC, entry: VolumeEntry) -> range:
     """Calculates the pages to extract.
 
     Args:
@@ -50,3 +198,37 @@ def _calc_pdf_pages(toc: XMLToC, entry: VolumeEntry) -> range:
     end_page = toc.page_to_image[max(entry.pages)]
 
     return range(start_page - 1, end_page)
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Extract all pages of the volumes to their page stores."
+    )
+    parser.add_argument(
+        "pdfs",
+        nargs="*",
+        type=Path,
+        default=sorted((ZG_DATA_ROOT / "pdf").glob("ZG_*.pdf")),
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--text-dir",
+        type=Path,
+        default=None,
+        help="Export the plain text of the volumes to this directory instead.",
+    )
+    parsed = parser.parse_args(args)
+
+    for pdf_path in parsed.pdfs:
+        if parsed.text_dir is None:
+            ingest_volume(pdf_path, parsed.workers)
+        else:
+            export_volume_text(
+                pdf_path,
+                parsed.text_dir / f"{pdf_path.stem.replace('.', '_')}.txt",
+                parsed.workers,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+from pathlib import Path
+from typing import Sequence
+
+import fitz  # type: ignore
+from loguru import logger
+from result import Err, Ok, Result, is_err
+
+from ssrq_retro_lab.config import ZG_DATA_ROOT
+from ssrq_retro_lab.pipeline.parser.header_mask import get_header_mask
+from ssrq_retro_lab.pipeline.parser.html_to_article import select_article_paragraphs
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import (
+    VolumeEntry,
+    XMLToC,
+    load_xml_toc,
+)
+from ssrq_retro_lab.pipeline.pdf.extraction import calc_pdf_pages
+from ssrq_retro_lab.repository.reader import get_document_pool
+
+__all__ = [
+    "LineRecord",
+    "collect_article_lines",
+    "export_article_lines",
+    "extract_line_records",
+    "extract_page_lines",
+    "remove_header_lines",
+    "remove_page_furniture_lines",
+]
+
+# superscript, italic, monospaced and bold spans are wrapped in the HTML export
+EMPHASIS_FLAGS = 1 | 2 | 8 | 16
+# the HTML export places a line at the baseline minus 80 % of the font size
+TOP_OFFSET = 0.8
+
+
+class LineRecord:
+    """A line of a page, built from the structured text of PyMuPDF – the
+    counterpart of a paragraph (`<p>`) of the HTML export, without generating,
+    unescaping and parsing HTML.
+
+    Attributes:
+        page: The (0-based) index of the page in the PDF.
+        top: The top position in pt, like `top` in the style of the HTML export.
+        x0: The left edge of the bounding box.
+        y0: The upper edge of the bounding box.
+        x1: The right edge of the bounding box.
+        y1: The lower edge of the bounding box.
+        size: The font size of the first span.
+        spans: The text of every span.
+        emphasis: A bit mask of the spans, which are emphasised (e.g. italic). In
+            the HTML export they aren't direct children of the paragraph.
+    """
+
+    __slots__ = ("page", "top", "x0", "y0", "x1", "y1", "size", "spans", "emphasis")
+
+    def __init__(
+        self,
+        page: int,
+        top: float,
+        bbox: tuple[float, float, float, float],
+        size: float,
+        spans: tuple[str, ...],
+        emphasis: int,
+    ):
+        self.page = page
+        self.top = top
+        self.x0, self.y0, self.x1, self.y1 = bbox
+        self.size = size
+        self.spans = spans
+        self.emphasis = emphasis
+
+    @property
+    def text(self) -> str:
+        return "".join(self.spans)
+
+    @property
+    def plain_spans(self) -> tuple[str, ...]:
+        """The spans, which are not emphasised."""
+        return tuple(
+            span
+            for index, span in enumerate(self.spans)
+            if not self.emphasis & (1 << index)
+        )
+
+    def __repr__(self) -> str:
+        return f"LineRecord(page={self.page}, top={self.top:.1f}, text={self.text!r})"
+
+
+def extract_line_records(pdf: fitz.Document, page: int) -> tuple[LineRecord, ...]:
+    """Extracts the lines of a page from the structured text of PyMuPDF.
+
+    Args:
+        pdf: The PDF to extract the lines from.
+        page: The (0-based) index of the page.
+
+    Returns:
+        The lines of the page in reading order.
+    """
+    lines: list[LineRecord] = []
+
+    for block in pdf.load_page(page).get_text("dict")["blocks"]:
+        for line in block.get("lines", ()):
+            spans = line["spans"]
+
+            if len(spans) == 0:
+                continue
+
+            lines.append(
+                LineRecord(
+                    page,
+                    round(spans[0]["origin"][1] - TOP_OFFSET * spans[0]["size"], 1),
+                    line["bbox"],
+                    spans[0]["size"],
+                    tuple(span["text"] for span in spans),
+                    sum(
+                        1 << index
+                        for index, span in enumerate(spans)
+                        if span["flags"] & EMPHASIS_FLAGS
+                    ),
+                )
+            )
+
+    return tuple(lines)
+
+
+def extract_page_lines(
+    pdf: fitz.Document, toc: XMLToC, entry: VolumeEntry
+) -> tuple[tuple[LineRecord, ...], ...]:
+    """Extracts the lines of the pages of an entry – the line based counterpart
+    of `extract_pages`.
+
+    Args:
+        pdf: The PDF to extract the lines from.
+        toc: The table of contents of the volume.
+        entry: The entry of the article.
+
+    Returns:
+        The lines of every page of the entry.
+    """
+    return tuple(extract_line_records(pdf, page) for page in calc_pdf_pages(toc, entry))
+
+
+def remove_header_lines(
+    pages: Sequence[Sequence[LineRecord]], min_top_position: float = 85
+) -> tuple[tuple[LineRecord, ...], ...]:
+    """Removes the headers (Kopfzeilen) from the pages, like `remove_header`.
+
+    Args:
+        pages: The lines of every page.
+        min_top_position: The minimum top position of a line not to be considered
+            a header.
+
+    Returns:
+        The lines of every page without the header.
+    """
+    return tuple(
+        tuple(line for line in lines if line.top > min_top_position) for lines in pages
+    )
+
+
+def remove_page_furniture_lines(
+    volume_path: Path,
+    pages: Sequence[Sequence[LineRecord]],
+    min_top_position: float = 85,
+) -> tuple[tuple[LineRecord, ...], ...]:
+    """Removes the page furniture from the pages, like `remove_page_furniture`:
+    with the header mask of the volume – if available – otherwise with the
+    threshold of `remove_header_lines`.
+
+    Args:
+        volume_path: The path to the PDF of the volume.
+        pages: The lines of every page.
+        min_top_position: The threshold used without a header mask.
+
+    Returns:
+        The lines of every page without the furniture.
+    """
+    header_mask = get_header_mask(volume_path, build=False)
+    masked_per_page: list[frozenset[int]] = []
+
+    for lines in pages:
+        if len(lines) == 0:
+            masked_per_page.append(frozenset())
+            continue
+
+        if (
+            header_mask is None
+            or (masked := header_mask.masked_positions(lines[0].page, len(lines)))
+            is None
+        ):
+            return remove_header_lines(pages, min_top_position)
+
+        masked_per_page.append(masked)
+
+    return tuple(
+        tuple(line for index, line in enumerate(lines) if index not in masked)
+        for lines, masked in zip(pages, masked_per_page)
+    )
+
+
+def collect_article_lines(
+    pages: Sequence[Sequence[LineRecord]],
+    current_article_number: int,
+    next_article_number: int | None,
+) -> Result[tuple[LineRecord, ...], ValueError]:
+    """Collects the lines of an article with the same rules as
+    `collect_article_nodes`.
+
+    Args:
+        pages: The lines of every page (without the header).
+        current_article_number: The current article number.
+        next_article_number: The next article number.
+
+    Returns:
+        The lines of the article. If no lines are found, a ValueError is returned
+        as an error.
+    """
+    current_marker = f"{current_article_number}."
+    next_marker = f"{next_article_number}."
+    start_marker = str(current_article_number)
+    result_lines: list[LineRecord] = []
+
+    for lines in pages:
+        plain_spans = [line.plain_spans for line in lines]
+        selected = select_article_paragraphs(
+            # the lines of a page are siblings in the HTML export
+            [0] * len(lines),
+            [_contains(spans, start_marker) for spans in plain_spans],
+            [_contains(spans, current_marker) for spans in plain_spans],
+            [_contains(spans, next_marker) for spans in plain_spans],
+            any(_contains(line.spans, current_marker) for line in lines),
+            any(_contains(line.spans, next_marker) for line in lines),
+        )
+        result_lines.extend(lines[index] for index in selected)
+
+    if len(result_lines) == 0:
+        return Err(ValueError("No article lines found."))
+
+    return Ok(tuple(result_lines))
+
+
+def export_article_lines(pdf_path: Path, toc: XMLToC, output_dir: Path) -> int:
+    """Exports the text of every article of a volume to a text file per article
+    (`<number>.txt`, one line per line of the PDF). The articles are sliced from the
+    line records, every page is read once. The page furniture is removed like in
+    the HTML export (see `remove_page_furniture_lines`), so both slice the same
+    text.
+
+    Args:
+        pdf_path: The path to the PDF of the volume.
+        toc: The table of contents of the volume.
+        output_dir: The directory of the text files.
+
+    Returns:
+        The number of exported articles.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pages: dict[int, tuple[LineRecord, ...]] = {}
+    exported = 0
+
+    with get_document_pool().document(pdf_path) as pdf:
+        for entry in toc.entries:
+            page_numbers = calc_pdf_pages(toc, entry)
+
+            for page in page_numbers:
+                if page not in pages:
+                    pages[page] = extract_line_records(pdf, page)
+
+            article_lines = collect_article_lines(
+                remove_page_furniture_lines(
+                    pdf_path, [pages[page] for page in page_numbers]
+                ),
+                entry.no,
+                entry.no + 1,
+            )
+
+            if is_err(article_lines):
+                logger.warning(f"No lines found for article {entry.no}")
+                continue
+
+            (output_dir / f"{entry.no}.txt").write_text(
+                "".join(f"{line.text}\n" for line in article_lines.unwrap()),
+                encoding="utf-8",
+            )
+            exported += 1
+
+    logger.info(f"Exported {exported} articles of {pdf_path.name} to {output_dir}")
+
+    return exported
+
+
+def _contains(spans: tuple[str, ...], marker: str) -> bool:
+    return any(marker in span for span in spans)
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Export the text of the articles of the volumes, sliced from the "
+        "lines of the PDF instead of its HTML export."
+    )
+    parser.add_argument(
+        "pdfs",
+        nargs="*",
+        type=Path,
+        default=sorted((ZG_DATA_ROOT / "pdf").glob("ZG_*.pdf")),
+    )
+    parser.add_argument("--toc-dir", type=Path, default=ZG_DATA_ROOT / "toc")
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        required=True,
+        help="The articles of a volume are written to a subdirectory (e.g. ZG_1_1).",
+    )
+    parsed = parser.parse_args(args)
+
+    for pdf_path in parsed.pdfs:
+        toc = load_xml_toc(
+            parsed.toc_dir / f"{pdf_path.stem.replace('.', '-')}.xml", pdf_path
+        )
+
+        if is_err(toc):
+            logger.error(toc.unwrap_err().message)
+            continue
+
+        export_article_lines(
+            pdf_path,
+            toc.unwrap(),
+            parsed.output_dir / pdf_path.stem.replace(".", "_"),
+        )
+
+
+if __name__ == "__main__":
+    main()
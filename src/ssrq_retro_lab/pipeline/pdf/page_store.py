@@ -0,0 +1,211 @@
+import mmap
+import os
+import struct
+import zlib
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
+from threading import Lock
+from typing import Iterable
+
+import fitz  # type: ignore
+
+from ssrq_retro_lab.config import CACHE_DIR
+
+__all__ = ["PageStore", "get_page_store", "page_store_path", "write_page_store"]
+
+PAGE_STORE_DIR = CACHE_DIR / "pages"
+PAGE_STORE_MAGIC = b"SSRQPGS2"
+# bump, when the extraction of the pages changes
+EXTRACTOR_FORMAT = 1
+EXTRACTOR_VERSION = f"{EXTRACTOR_FORMAT}/pymupdf-{fitz.VersionBind}".encode("ascii")
+# magic, extractor version, mtime (ns) and size of the source PDF, number of pages
+_HEADER = struct.Struct("<8s32sqqI")
+_OFFSET = struct.Struct("<Q")
+
+
+class PageStore:
+    """Read-only access to the extracted pages of a volume.
+
+    The store is a single file: a header, the offsets of all pages and the zlib
+    compressed pages. The file is memory-mapped, so a page is read without loading
+    the whole volume and the pages are shared by all processes via the page cache.
+    Recently read pages are kept decompressed in a LRU.
+
+    The pages are indexed by their (0-based) index in the PDF, i.e. the image
+    number minus one. Pages, which weren't extracted, are missing.
+
+    Attributes:
+        path: The path of the store.
+        extractor_version: The version of the extraction, see `EXTRACTOR_VERSION`.
+        source_mtime_ns: The modification time of the PDF when it was extracted.
+        source_size: The size of the PDF when it was extracted.
+    """
+
+    def __init__(self, path: Path, lru_size: int = 256):
+        self.path = path
+
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(PAGE_STORE_MAGIC)] != PAGE_STORE_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a page store of the current format")
+
+        (
+            _,
+            extractor_version,
+            self.source_mtime_ns,
+            self.source_size,
+            self._page_count,
+        ) = _HEADER.unpack_from(self._mmap)
+        self.extractor_version = extractor_version.rstrip(b"\0")
+
+        self._data_start = _HEADER.size + (self._page_count + 1) * _OFFSET.size
+        self._cached_read = lru_cache(maxsize=lru_size)(self._read)
+
+    def get(self, page: int) -> str | None:
+        """Returns the extracted (HTML) text of a page.
+
+        Args:
+            page: The index of the page in the PDF.
+
+        Returns:
+            The text of the page or None, if the page is missing or the store was
+            closed (e.g. because it's outdated, see `get_page_store`).
+        """
+        if self._mmap.closed:
+            return None
+
+        return self._cached_read(page)
+
+    def _read(self, page: int) -> str | None:
+        if not 0 <= page < self._page_count:
+            return None
+
+        start, end = (
+            _OFFSET.unpack_from(self._mmap, _HEADER.size + index * _OFFSET.size)[0]
+            for index in (page, page + 1)
+        )
+
+        if start == end:
+            return None
+
+        return zlib.decompress(
+            self._mmap[self._data_start + start : self._data_start + end]
+        ).decode("utf-8")
+
+    def is_current(self, source: Path) -> bool:
+        """Checks if the store was extracted from the current version of a PDF
+        with the current extractor."""
+        stat = source.stat()
+        return (self.extractor_version, stat.st_mtime_ns, stat.st_size) == (
+            EXTRACTOR_VERSION,
+            self.source_mtime_ns,
+            self.source_size,
+        )
+
+    def close(self) -> None:
+        self._cached_read.cache_clear()
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self._page_count
+
+
+_STORES: dict[Path, tuple[tuple[int, ...], PageStore | None]] = {}
+_STORES_LOCK = Lock()
+
+
+def page_store_path(source: Path) -> Path:
+    # volumes with the same name in different directories get their own store
+    directory = sha256(str(source.resolve().parent).encode("utf-8")).hexdigest()[:12]
+    return PAGE_STORE_DIR / f"{source.stem}-{directory}.pages"
+
+
+def write_page_store(
+    path: Path, source: Path, pages: Iterable[str | None], level: int = 6
+) -> int:
+    """Writes the extracted pages of a PDF to a store. The store is replaced
+    atomically, so readers never see a partially written store.
+
+    Args:
+        path: The path of the store.
+        source: The path to the PDF, the pages were extracted from.
+        pages: The text of every page of the PDF in order, None for missing pages.
+        level: The zlib compression level.
+
+    Returns:
+        The number of pages.
+    """
+    offsets = [0]
+    chunks: list[bytes] = []
+
+    for page in pages:
+        chunk = b"" if page is None else zlib.compress(page.encode("utf-8"), level)
+        chunks.append(chunk)
+        offsets.append(offsets[-1] + len(chunk))
+
+    stat = source.stat()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    with open(tmp_path, "wb") as file:
+        file.write(
+            _HEADER.pack(
+                PAGE_STORE_MAGIC,
+                EXTRACTOR_VERSION,
+                stat.st_mtime_ns,
+                stat.st_size,
+                len(chunks),
+            )
+        )
+        file.write(b"".join(_OFFSET.pack(offset) for offset in offsets))
+        file.writelines(chunks)
+
+    os.replace(tmp_path, path)
+
+    return len(chunks)
+
+
+def get_page_store(source: Path) -> PageStore | None:
+    """Returns the page store of a PDF, which is opened once per process. An
+    outdated store is closed, when its replacement is opened.
+
+    Args:
+        source: The path to the PDF.
+
+    Returns:
+        The page store or None, if the PDF wasn't extracted, has changed since or
+        was extracted by another version of the extractor.
+    """
+    path = page_store_path(source)
+
+    try:
+        source_stat = source.stat()
+        version = (
+            path.stat().st_mtime_ns,
+            source_stat.st_mtime_ns,
+            source_stat.st_size,
+        )
+    except FileNotFoundError:
+        return None
+
+    with _STORES_LOCK:
+        if (store := _STORES.get(path)) is None or store[0] != version:
+            # threads still holding the outdated store read missing pages from now
+            # on and extract them from the PDF instead
+            if store is not None and store[1] is not None:
+                store[1].close()
+
+            try:
+                page_store: PageStore | None = PageStore(path)
+            except ValueError:
+                page_store = None
+
+            if page_store is not None and not page_store.is_current(source):
+                page_store = None
+
+            _STORES[path] = store = (version, page_store)
+
+        return store[1]
@@ -1,10 +1,113 @@
 from pathlib import Path
+from threading import Lock
 
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    StrictUndefined,
+    Template,
+)
 
-__all__ = ["render_template"]
+from ssrq_retro_lab.config import CACHE_DIR
+from ssrq_retro_lab.pipeline.cache import file_version
+
+__all__ = [
+    "TemplateRegistry",
+    "get_template_registry",
+    "render_template",
+    "template_version",
+]
 
 TEMPLATE_DIR: Path = Path(__file__).parent
+TEMPLATE_BYTECODE_DIR: Path = CACHE_DIR / "jinja2"
+
+
+class TemplateRegistry:
+    """Compiles every template once and keeps it for the lifetime of the process.
+
+    The compiled templates are also stored in a bytecode cache on disk, so new
+    (worker) processes load them without parsing and compiling them again. Jinja
+    checks the checksum of the source, so outdated bytecode is never used.
+
+    The compiled templates are keyed by their `template_version`, like the cache
+    keys of the LLM results. A changed template is compiled again, so a long
+    running process never renders an outdated template for a new cache key.
+    """
+
+    def __init__(
+        self,
+        template_dir: Path = TEMPLATE_DIR,
+        bytecode_dir: Path = TEMPLATE_BYTECODE_DIR,
+    ):
+        bytecode_dir.mkdir(parents=True, exist_ok=True)
+
+        self._template_dir = template_dir
+        self._environment = Environment(
+            loader=FileSystemLoader(template_dir),
+            undefined=StrictUndefined,
+            bytecode_cache=FileSystemBytecodeCache(str(bytecode_dir)),
+            auto_reload=True,
+            cache_size=-1,
+        )
+        self._templates: dict[str, tuple[str, Template]] = {}
+        self._lock = Lock()
+
+    def get(self, template_name: str) -> Template:
+        """Returns a compiled template.
+
+        Args:
+            template_name: The name of the template.
+
+        Returns:
+            The compiled template.
+        """
+        version = file_version(self._template_dir / template_name)
+        template = self._templates.get(template_name)
+
+        if template is None or template[0] != version:
+            with self._lock:
+                template = self._templates.get(template_name)
+
+                if template is None or template[0] != version:
+                    template = (
+                        version,
+                        self._environment.get_template(template_name),
+                    )
+                    self._templates[template_name] = template
+
+        return template[1]
+
+    def render(self, template_name: str, **kwargs) -> str:
+        return self.get(template_name).render(**kwargs)
+
+    def precompile(self) -> int:
+        """Compiles all templates, e.g. before workers are started.
+
+        Returns:
+            The number of compiled templates.
+        """
+        template_names = self._environment.list_templates(extensions=["jinja2"])
+
+        for template_name in template_names:
+            self.get(template_name)
+
+        return len(template_names)
+
+
+_REGISTRY: TemplateRegistry | None = None
+_REGISTRY_LOCK = Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Returns the template registry of the process."""
+    global _REGISTRY
+
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = TemplateRegistry()
+
+        return _REGISTRY
 
 
 def render_template(template_name: str, **kwargs) -> str:
@@ -17,7 +120,16 @@ def render_template(template_name: str, **kwargs) -> str:
     Returns:
         str: The rendered template.
     """
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), undefined=StrictUndefined)
-    template = env.get_template(template_name)
+    return get_template_registry().render(template_name, **kwargs)
+
 
-    return template.render(**kwargs)
+def template_version(template_name: str) -> str:
+    """Return the version of a template, which changes whenever the template is edited.
+
+    Args:
+        template_name (str): The name of the template.
+
+    Returns:
+        str: The name of the template and a short hash of its content.
+    """
+    return file_version(TEMPLATE_DIR / template_name)
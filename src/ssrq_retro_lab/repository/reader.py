@@ -1,7 +1,11 @@
+import atexit
 import json
+import os
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any
+from threading import Lock, RLock
+from typing import Any, Iterator
 
 import fitz  # type: ignore
 from parsel import Selector
@@ -61,6 +65,99 @@ class PDFReader(Reader):
         return fitz.open(self.path)
 
 
+class PDFDocumentPool:
+    """Keeps one open PDF document per volume, instead of opening the (large)
+    volume again for every article.
+
+    PyMuPDF documents must not be used by several threads at the same time, so a
+    document is leased with `document` and other threads wait until it's returned.
+    All leases of a volume are serialized, leases of different volumes aren't.
+    Every process has its own pool, see `get_document_pool`.
+    """
+
+    def __init__(self):
+        self._documents: dict[Path, tuple[fitz.Document, RLock]] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def document(self, path: Path) -> Iterator[fitz.Document]:
+        """Leases the open document of a PDF file, it's opened on first use.
+
+        Args:
+            path: The path to the PDF file.
+
+        Yields:
+            The document as a fitz Document.
+        """
+        path = path.resolve()
+
+        with self._lock:
+            entry = self._documents.get(path)
+
+        if entry is None:
+            # opening a large volume takes a while, it must not block the leases
+            # of the other volumes
+            opened = PDFReader(path).read()
+
+            with self._lock:
+                entry = self._documents.setdefault(path, (opened, RLock()))
+
+            if entry[0] is not opened:
+                opened.close()
+
+        document, document_lock = entry
+
+        with document_lock:
+            yield document
+
+    def close(self) -> None:
+        """Closes all documents, they are reopened on the next lease."""
+        with self._lock:
+            for document, document_lock in self._documents.values():
+                with document_lock:
+                    document.close()
+
+            self._documents.clear()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __enter__(self) -> "PDFDocumentPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+_DOCUMENT_POOL: tuple[int, PDFDocumentPool] | None = None
+_DOCUMENT_POOL_LOCK = Lock()
+
+
+def get_document_pool() -> PDFDocumentPool:
+    """Returns the document pool of the current process.
+
+    A forked worker process gets its own pool, because open documents can't be
+    shared between processes. The pool is closed when the process exits.
+
+    Returns:
+        The document pool.
+    """
+    global _DOCUMENT_POOL
+
+    with _DOCUMENT_POOL_LOCK:
+        if _DOCUMENT_POOL is None or _DOCUMENT_POOL[0] != os.getpid():
+            _DOCUMENT_POOL = (os.getpid(), PDFDocumentPool())
+
+        return _DOCUMENT_POOL[1]
+
+
+@atexit.register
+def _close_document_pool() -> None:
+    with _DOCUMENT_POOL_LOCK:
+        if _DOCUMENT_POOL is not None and _DOCUMENT_POOL[0] == os.getpid():
+            _DOCUMENT_POOL[1].close()
+
+
 class JSONLReader(Reader):
     def read(self):
         """Reads a JSONL file.
@@ -0,0 +1,12 @@
+import os
+import shutil
+import tempfile
+
+# the caches of a test run must not end up in the cache directory of the checkout,
+# the variable is set before the package is imported and inherited by workers
+_CACHE_DIR = tempfile.mkdtemp(prefix="ssrq-test-cache-")
+os.environ["SSRQ_CACHE_DIR"] = _CACHE_DIR
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_CACHE_DIR, ignore_errors=True)
@@ -1,14 +1,24 @@
+from types import SimpleNamespace
+
 import pytest
 from result import is_ok
 
+from ssrq_retro_lab.pipeline.components import html_wrangler
 from ssrq_retro_lab.pipeline.components.html_wrangler import (
     HTMLWrangler,
 )
 from ssrq_retro_lab.pipeline.components.protocol import Component
 from ssrq_retro_lab.pipeline.components.text_extractor import (
     ExtractionInput,
+    TextExtractionResult,
     TextExtractor,
 )
+from ssrq_retro_lab.pipeline.parser.article_index import (
+    ArticleBoundaryIndex,
+    build_article_index,
+)
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import VolumeEntry
 
 
 def test_html_wrangler_implements_protocol():
@@ -40,3 +50,56 @@ def test_html_wrangler_returns_expected_nodes_for_article(
     html_result = result.unwrap()
 
     assert len(html_result["article"]) == expected_nodes
+
+
+def test_html_wrangler_slices_article_from_parsed_pages():
+    page = ParsedPage("""<div><p style="top:70pt"><span>12. Kopfzeile</span></p>
+        <p style="top:99pt"><span>12. Titel</span></p>
+        <p style="top:120pt"><span>Text</span></p>
+        <p style="top:140pt"><span>Datum</span></p>
+        <p style="top:160pt"><span>13. Titel</span></p></div>""")
+    text = TextExtractionResult(
+        entry=VolumeEntry("Titel", "1400", 12, (1,)), pages=(page,)
+    )
+
+    result = HTMLWrangler().invoke(text).unwrap()
+
+    assert result["pages"][0] is page
+    assert "Kopfzeile" not in page.html
+    assert [p.xpath("string()").get() for p in result["article"]] == [
+        "12. Titel",
+        "Text",
+    ]
+
+
+def test_html_wrangler_slices_article_with_boundary_index(tmp_path, monkeypatch):
+    volume_path = tmp_path / "ZG_9.9.pdf"
+    html = """<div><p style="top:70pt"><span>12. Kopfzeile</span></p>
+        <p style="top:99pt"><span>12. Titel</span></p>
+        <p style="top:120pt"><span>Text</span></p>
+        <p style="top:140pt"><span>Datum</span></p>
+        <p style="top:160pt"><span>13. Titel</span></p></div>"""
+    index = build_article_index(volume_path, [html])
+    slices = []
+
+    def slice_article(*args):
+        slices.append(args[1:])
+        return ArticleBoundaryIndex.slice_article(index, *args)
+
+    monkeypatch.setattr(
+        html_wrangler,
+        "get_article_index",
+        lambda path, build: SimpleNamespace(slice_article=slice_article),
+    )
+    text = TextExtractionResult(
+        entry=VolumeEntry("Titel", "1400", 12, (1,)),
+        pages=(ParsedPage(html, volume_path, 0),),
+    )
+
+    result = HTMLWrangler().invoke(text).unwrap()
+
+    assert slices == [(12, 13)]
+    assert [p.xpath("string()").get() for p in result["article"]] == [
+        "12. Titel",
+        "Text",
+    ]
@@ -1,8 +1,13 @@
 import pytest
+import spacy
 from result import is_ok
+from ssrq_retro_lab.pipeline import cache
+from ssrq_retro_lab.pipeline.components import ner_annotator
 from ssrq_retro_lab.pipeline.components.ner_annotator import NERAnnotator
 from ssrq_retro_lab.pipeline.components.ocr_corrector import StructuredCorrectedArticle
 from ssrq_retro_lab.pipeline.components.protocol import Component
+from ssrq_retro_lab.pipeline.llm import chat
+from ssrq_retro_lab.pipeline.llm.rate_limit import RateLimiter
 from ssrq_retro_lab.validate.general import calc_ml_metrics
 
 
@@ -40,3 +45,141 @@ def test_ner_annotator(corrected_article: StructuredCorrectedArticle):
     accuracy_places, _ = calc_ml_metrics(expected_places, places)
 
     assert accuracy_places > 0.9
+
+
+@pytest.fixture
+def fake_assemble(monkeypatch, tmp_path):
+    calls = []
+
+    def assemble(config, overrides):
+        calls.append(overrides)
+        nlp = spacy.blank("de")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([{"label": "PLACE", "pattern": "Hünenberg"}])
+        return nlp
+
+    monkeypatch.delenv("SSRQ_LLM_BACKEND", raising=False)
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path)
+    monkeypatch.setattr(ner_annotator, "_PIPELINES", {})
+    monkeypatch.setattr(ner_annotator, "assemble", assemble)
+    monkeypatch.setattr(chat, "count_tokens", lambda text, model_name: len(text))
+    monkeypatch.setattr(
+        chat, "_DEFAULT_RATE_LIMITER", RateLimiter(tmp_path / "limits.json", {})
+    )
+
+    return calls
+
+
+def test_ner_pipeline_is_assembled_once(
+    fake_assemble, corrected_article: StructuredCorrectedArticle
+):
+    annotator = NERAnnotator()
+
+    for i in range(3):
+        article = corrected_article.model_copy(deep=True)
+        article.corrected_text.text.append(f"Zeile {i}")
+
+        assert is_ok(annotator.invoke(article))
+
+    assert len(fake_assemble) == 1
+
+
+def test_ner_cache_hit_skips_pipeline(
+    fake_assemble, monkeypatch, corrected_article: StructuredCorrectedArticle
+):
+    _, doc = NERAnnotator().invoke(corrected_article).unwrap()
+
+    monkeypatch.setattr(ner_annotator, "_PIPELINES", {})
+    monkeypatch.setattr(ner_annotator, "assemble", None)
+
+    _, cached_doc = NERAnnotator().invoke(corrected_article).unwrap()
+
+    assert cached_doc.text == doc.text
+    assert [(e.text, e.label_) for e in cached_doc.ents] == [
+        (e.text, e.label_) for e in doc.ents
+    ]
+    assert len(cached_doc.ents) > 0
+
+
+def test_ner_annotate_many(
+    fake_assemble, monkeypatch, corrected_article: StructuredCorrectedArticle
+):
+    articles = []
+
+    for i in range(5):
+        article = corrected_article.model_copy(deep=True)
+        article.article_number = i
+        article.corrected_text.text.append(f"Zeile {i}")
+        articles.append(article)
+
+    annotator = NERAnnotator()
+    annotator.invoke(articles[0])
+    nlp = ner_annotator.get_ner_pipeline()
+    pipe = nlp.pipe
+    batches = []
+
+    def counting_pipe(texts, batch_size):
+        texts = list(texts)
+        batches.append(len(texts))
+        return pipe(texts, batch_size=batch_size)
+
+    monkeypatch.setattr(nlp, "pipe", counting_pipe)
+
+    results = annotator.annotate_many(articles + [articles[1]], batch_size=3)
+
+    assert batches == [3, 1]
+    assert [r.unwrap()[0].article_number for r in results] == [0, 1, 2, 3, 4, 1]
+    assert all(
+        r.unwrap()[1].text.endswith(f"Zeile {i}") for i, r in enumerate(results[:5])
+    )
+
+    monkeypatch.setattr(ner_annotator, "_PIPELINES", {})
+    monkeypatch.setattr(ner_annotator, "assemble", None)
+
+    assert all(is_ok(annotator.invoke(article)) for article in articles)
+
+
+def test_ner_requests_of_the_configured_model_are_rate_limited(
+    fake_assemble, monkeypatch, corrected_article: StructuredCorrectedArticle
+):
+    acquired = []
+    monkeypatch.setattr(
+        ner_annotator,
+        "acquire_rate_limit",
+        lambda prompt, model_name: acquired.append(model_name),
+    )
+    annotator = NERAnnotator()
+
+    assert is_ok(annotator.invoke(corrected_article))
+    assert is_ok(annotator.invoke(corrected_article))
+
+    articles = []
+
+    for i in range(3):
+        article = corrected_article.model_copy(deep=True)
+        article.corrected_text.text.append(f"Zeile {i}")
+        articles.append(article)
+
+    assert all(is_ok(result) for result in annotator.annotate_many(articles))
+    # cached articles don't send requests
+    assert acquired == ["gpt-4"] * 4
+
+
+def test_ner_uses_the_configured_model_unless_concurrency_is_enabled(
+    monkeypatch, corrected_article: StructuredCorrectedArticle
+):
+    monkeypatch.delenv("SSRQ_LLM_BACKEND", raising=False)
+    monkeypatch.delenv(ner_annotator.NER_CONCURRENCY_ENV, raising=False)
+    overrides = NERAnnotator._create_config_overrides()
+    cache_key = NERAnnotator._create_cache_key(corrected_article)
+
+    assert "components.llm.model.@llm_models" not in overrides
+
+    monkeypatch.setenv(ner_annotator.NER_CONCURRENCY_ENV, "4")
+    overrides = NERAnnotator._create_config_overrides()
+
+    assert overrides["components.llm.model.@llm_models"] == "ssrq.Backend.v1"
+    assert overrides["components.llm.model.max_concurrency"] == 4
+    # the concurrent model answers at another temperature
+    assert NERAnnotator._create_cache_key(corrected_article) != cache_key
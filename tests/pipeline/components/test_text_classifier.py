@@ -1,8 +1,17 @@
+import asyncio
+import json
+import time
+
 import pytest
 from parsel import Selector
-from result import is_ok
+from result import Ok, is_ok
 
-from ssrq_retro_lab.pipeline.components.html_wrangler import HTMLWrangler
+from ssrq_retro_lab.pipeline import cache
+from ssrq_retro_lab.pipeline.components import text_classifier
+from ssrq_retro_lab.pipeline.components.html_wrangler import (
+    HTMLTextExtractionResult,
+    HTMLWrangler,
+)
 from ssrq_retro_lab.pipeline.components.protocol import Component
 from ssrq_retro_lab.pipeline.components.text_classifier import (
     StructuredArticle,
@@ -12,13 +21,133 @@ from ssrq_retro_lab.pipeline.components.text_extractor import (
     ExtractionInput,
     TextExtractor,
 )
+from ssrq_retro_lab.pipeline.metrics import MetricsRecorder, track
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import VolumeEntry
 from ssrq_retro_lab.validate.general import calc_ml_metrics
 
+PARAGRAPHS = [f"<p><span>Zeile {i}</span></p>" for i in range(6)]
+
+
+@pytest.fixture
+def html_result() -> HTMLTextExtractionResult:
+    return HTMLTextExtractionResult(
+        entry=VolumeEntry("Titel", "1416-01-21", 1556, (1,)),
+        pages=(),
+        article=tuple(Selector(p, type="xml") for p in PARAGRAPHS),
+    )
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path)
+    monkeypatch.setattr(
+        text_classifier, "count_tokens", lambda text, *args: len(text.split())
+    )
+
+    def classify(prompt: str) -> str:
+        index = next(i for i, p in enumerate(PARAGRAPHS) if p in prompt)
+        return json.dumps(
+            {
+                "classified_text": [
+                    {"text": f"Zeile {index}", "label": "TEXT", "reason": "fake"}
+                ]
+            }
+        )
+
+    async def fake_agenerate(prompt, *args):
+        index = next(i for i, p in enumerate(PARAGRAPHS) if p in prompt)
+        await asyncio.sleep(0.01 * (len(PARAGRAPHS) - index))
+        return Ok(classify(prompt))
+
+    calls: list[str] = []
+
+    def fake_generate(prompt, *args):
+        calls.append(prompt)
+        time.sleep(0.05)
+
+        if "Here are the paragraphs to classify" not in prompt:
+            return Ok(classify(prompt))
+
+        paragraphs = prompt.split("Here are the paragraphs to classify")[1]
+        return Ok(
+            json.dumps(
+                {
+                    "paragraphs": [
+                        {
+                            "paragraph": number,
+                            "classified_text": json.loads(classify(p))[
+                                "classified_text"
+                            ],
+                        }
+                        for number, p in enumerate(
+                            p for p in PARAGRAPHS if p in paragraphs
+                        )
+                        # leave out the last paragraph to test the fallback
+                        if p != PARAGRAPHS[-1]
+                    ]
+                }
+            )
+        )
+
+    monkeypatch.setattr(text_classifier, "agenerate", fake_agenerate)
+    monkeypatch.setattr(text_classifier, "generate", fake_generate)
+
+    return calls
+
 
 def test_text_classifier_implements_component_protocol():
     assert isinstance(TextClassifier, Component)
 
 
+def test_text_classifier_ainvoke_keeps_document_order(
+    html_result: HTMLTextExtractionResult, fake_llm
+):
+    result = asyncio.run(TextClassifier().ainvoke(html_result))
+
+    assert is_ok(result)
+    assert result.unwrap().text == [f"Zeile {i}" for i in range(len(PARAGRAPHS))]
+    assert result.unwrap() == TextClassifier().invoke(html_result).unwrap()
+
+
+def test_text_classifier_classifies_uncached_lines_concurrently(
+    html_result: HTMLTextExtractionResult, fake_llm: list[str]
+):
+    html_result["article"] = html_result["article"] + html_result["article"][:2]
+    start = time.perf_counter()
+
+    result = TextClassifier(max_concurrency=len(PARAGRAPHS)).invoke(html_result)
+
+    assert time.perf_counter() - start < 0.05 * len(PARAGRAPHS)
+    assert len(fake_llm) == len(PARAGRAPHS)
+    assert result.unwrap().text == [f"Zeile {i}" for i in range(len(PARAGRAPHS))] + [
+        "Zeile 0",
+        "Zeile 1",
+    ]
+
+
+def test_text_classifier_ainvoke_classifies_identical_lines_once(
+    html_result: HTMLTextExtractionResult, fake_llm, monkeypatch
+):
+    html_result["article"] = html_result["article"] + html_result["article"][:2]
+    prompts: list[str] = []
+    agenerate = text_classifier.agenerate
+
+    async def count_agenerate(prompt, *args):
+        prompts.append(prompt)
+        return await agenerate(prompt, *args)
+
+    monkeypatch.setattr(text_classifier, "agenerate", count_agenerate)
+
+    result = asyncio.run(TextClassifier().ainvoke(html_result))
+
+    assert len(prompts) == len(PARAGRAPHS)
+    assert result.unwrap().text == [f"Zeile {i}" for i in range(len(PARAGRAPHS))] + [
+        "Zeile 0",
+        "Zeile 1",
+    ]
+
+
 @pytest.mark.depends_on_openai
 def test_text_classifier_accuracy():
     paragraphs = [
@@ -71,3 +200,93 @@ def test_is_real_title():
         )
         is False
     )
+
+
+def test_text_classifier_batches_lines_and_fills_line_cache(
+    html_result: HTMLTextExtractionResult, fake_llm: list[str]
+):
+    classifier = TextClassifier(batch_token_budget=100_000)
+    record = MetricsRecorder().get(1556, TextClassifier._name)
+
+    with track(record):
+        result = classifier.invoke(html_result)
+
+    # one batch prompt plus a single prompt for the line missing in the answer
+    assert len(fake_llm) == 2
+    # the line classified on its own is counted once
+    assert record.cache_misses == len(PARAGRAPHS)
+    assert result.unwrap().text == [f"Zeile {i}" for i in range(len(PARAGRAPHS))]
+
+    TextClassifier().invoke(html_result)
+
+    assert len(fake_llm) == 2
+
+
+def test_text_classifier_packs_lines_by_token_budget(fake_llm):
+    classifier = TextClassifier(batch_token_budget=0)
+    prompt_context = classifier._create_prompt_context()
+
+    assert len(classifier._pack_textlines(PARAGRAPHS, 1, prompt_context)) == len(
+        PARAGRAPHS
+    )
+
+    base_prompt_tokens = len(
+        classifier._render_batch_prompt(
+            PARAGRAPHS[:2], 1, prompt_context["examples"], prompt_context["labels"]
+        ).split()
+    )
+    classifier.batch_token_budget = base_prompt_tokens
+
+    assert [
+        len(batch)
+        for batch in classifier._pack_textlines(PARAGRAPHS, 1, prompt_context)
+    ] == [2, 2, 2]
+
+
+def test_text_classifier_tokenizes_each_line_once_when_packing(fake_llm, monkeypatch):
+    counted: list[str] = []
+    monkeypatch.setattr(
+        text_classifier,
+        "count_tokens",
+        lambda text, *args: counted.append(text) or len(text.split()),
+    )
+    classifier = TextClassifier(batch_token_budget=100)
+    textlines = PARAGRAPHS * 20
+
+    classifier._pack_textlines(textlines, 1, classifier._create_prompt_context())
+
+    # the prompt without and with an empty paragraph plus every line once
+    assert len(counted) == len(textlines) + 2
+
+
+def test_text_classifier_bypasses_the_llm_for_obvious_lines(
+    html_result: HTMLTextExtractionResult, fake_llm: list[str]
+):
+    linenumber = "<p><span style='font-size:6.0pt'>20 </span></p>"
+    reference = "<p><b><i><span style='font-size:8.0pt'>StAR 2,178.</span></i></b></p>"
+    html_result["article"] += tuple(
+        Selector(p, type="xml") for p in (linenumber, reference)
+    )
+    # the LLM labelled the line number as text before
+    cache.get_cache(TextClassifier._name)[
+        TextClassifier.create_cache_key(Selector(linenumber, type="xml").get())
+    ] = json.dumps(
+        {"classified_text": [{"text": "20", "label": "TEXT", "reason": "fake"}]}
+    )
+    classifier = TextClassifier(max_concurrency=1)
+    record = MetricsRecorder().get(1556, TextClassifier._name)
+
+    with track(record):
+        result = classifier.invoke(html_result).unwrap()
+
+    assert len(fake_llm) == len(PARAGRAPHS)
+    assert result.references == ["StAR 2,178."]
+    assert "20" not in result.text
+    assert (record.rule_hits, record.rule_misses) == (2, 6)
+    assert (record.rule_compared, record.rule_disagreements) == (1, 1)
+
+    with track(record):
+        assert asyncio.run(classifier.ainvoke(html_result)).unwrap() == result
+
+    assert len(fake_llm) == len(PARAGRAPHS)
+    assert record.rule_hits == 4
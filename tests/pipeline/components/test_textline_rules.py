@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from ssrq_retro_lab.pipeline.components.text_classifier import FEWSHORT_EXAMPLE
+from ssrq_retro_lab.pipeline.components.textline_rules import classify_by_rules
+
+EXAMPLES = json.loads(FEWSHORT_EXAMPLE.read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("example", EXAMPLES, ids=lambda e: e["spans"][0]["label"])
+def test_rules_agree_with_the_few_shot_examples(example):
+    match = classify_by_rules(example["text"])
+
+    if example["spans"][0]["label"] in ("LINENUMBER", "REFERENCE"):
+        assert match is not None
+        assert (match.label, match.text) == (
+            example["spans"][0]["label"],
+            example["spans"][0]["text"],
+        )
+    else:
+        assert match is None
+
+
+@pytest.mark.parametrize(
+    "textline",
+    [
+        # not a multiple of five
+        "<p><span style='font-size:6.0pt'>21 </span></p>",
+        # a number in the font of the transcript
+        "<p><span style='font-size:10.0pt'>20 </span></p>",
+        # a reference, which is not set in bold and italics
+        "<p><i><span style='font-size:8.0pt'>StAR 2,178.</span></i></p>",
+        # a text in bold and italics, which is no reference
+        "<p><b><i><span style='font-size:8.0pt'>Am Rand</span></i></b></p>",
+        # without font size
+        "<p><span>20</span></p>",
+    ],
+)
+def test_rules_are_not_confident_for_ambiguous_lines(textline):
+    assert classify_by_rules(textline) is None
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import pytest
+from result import Err, Ok
+
+from ssrq_retro_lab.pipeline.llm import chat
+from ssrq_retro_lab.pipeline.llm.backend import (
+    FakeOpenAIServer,
+    RecordingBackend,
+    ReplayBackend,
+    create_recording_key,
+)
+from ssrq_retro_lab.pipeline.llm.chat import LLMClient, agenerate, generate
+from ssrq_retro_lab.pipeline.llm.spacy_model import create_backend_model
+
+
+class EchoBackend:
+    rate_limited = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, prompt, model_name):
+        self.calls += 1
+        return Ok(f"{model_name}: {prompt[-1]['content']}")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = tmp_path / "recordings"
+    backend = RecordingBackend(EchoBackend(), store)
+
+    for prompt in ("Hello", "World"):
+        backend.complete(prompt, "gpt-3.5-turbo")
+
+    return store
+
+
+@pytest.fixture
+def replay_mode(store, monkeypatch):
+    def _replay_mode(mode: str = "replay"):
+        monkeypatch.setenv("SSRQ_LLM_BACKEND", mode)
+        monkeypatch.setenv("SSRQ_LLM_STORE", str(store))
+        monkeypatch.setattr(chat, "_DEFAULT_CLIENT", None)
+
+    return _replay_mode
+
+
+def test_replay_returns_recorded_responses(store):
+    backend = ReplayBackend(store)
+
+    assert backend.complete("Hello", "gpt-3.5-turbo") == Ok("gpt-3.5-turbo: Hello")
+    assert backend.complete(
+        [{"role": "user", "content": "World"}], "gpt-3.5-turbo"
+    ) == Ok("gpt-3.5-turbo: World")
+    assert backend.complete("Hello", "gpt-4").is_err()
+    assert backend.complete("Unknown", "gpt-3.5-turbo").is_err()
+
+
+def test_replay_latency(store):
+    backend = ReplayBackend(store, latency=0.2)
+
+    start = time.perf_counter()
+    backend.complete("Hello", "gpt-3.5-turbo")
+
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_recording_key_ignores_prompt_format():
+    assert create_recording_key("Hello", "gpt-4") == create_recording_key(
+        [{"role": "user", "content": "Hello"}], "gpt-4"
+    )
+    assert create_recording_key("Hello", "gpt-4") != create_recording_key(
+        "Hello", "gpt-3.5-turbo"
+    )
+
+
+def test_fake_server(store):
+    with (
+        FakeOpenAIServer(ReplayBackend(store)) as server,
+        LLMClient(api_key="test", base_url=server.base_url, max_retries=0) as client,
+    ):
+        assert client.complete("Hello", "gpt-3.5-turbo") == Ok("gpt-3.5-turbo: Hello")
+        assert isinstance(client.complete("Unknown", "gpt-3.5-turbo"), Err)
+
+
+def test_generate_in_replay_mode(replay_mode):
+    replay_mode()
+
+    assert generate("Hello", "gpt-3.5-turbo", False, "") == Ok("gpt-3.5-turbo: Hello")
+    assert asyncio.run(agenerate("World", "gpt-3.5-turbo", False, "")) == Ok(
+        "gpt-3.5-turbo: World"
+    )
+
+
+def test_agenerate_in_fake_server_mode(replay_mode):
+    replay_mode("fake-server")
+
+    assert isinstance(chat.get_default_client(), LLMClient)
+    assert asyncio.run(agenerate("World", "gpt-3.5-turbo", False, "")) == Ok(
+        "gpt-3.5-turbo: World"
+    )
+
+
+def test_spacy_model_in_replay_mode(replay_mode):
+    replay_mode()
+    model = create_backend_model("gpt-3.5-turbo")
+
+    assert model([["Hello"], ["World"]]) == [
+        ["gpt-3.5-turbo: Hello"],
+        ["gpt-3.5-turbo: World"],
+    ]
+
+    with pytest.raises(ValueError):
+        model([["Unknown"]])
+
+
+def test_spacy_model_sends_prompts_concurrently(replay_mode, monkeypatch):
+    replay_mode()
+    monkeypatch.setenv("SSRQ_LLM_LATENCY", "0.2")
+    model = create_backend_model("gpt-3.5-turbo", max_concurrency=4)
+
+    start = time.perf_counter()
+    responses = model([["Hello", "World"], ["World"], ["Hello"]])
+
+    assert time.perf_counter() - start < 0.6
+    assert responses == [
+        ["gpt-3.5-turbo: Hello", "gpt-3.5-turbo: World"],
+        ["gpt-3.5-turbo: World"],
+        ["gpt-3.5-turbo: Hello"],
+    ]
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import httpx
+import pytest
+
+from ssrq_retro_lab.pipeline.llm import chat
+from ssrq_retro_lab.pipeline.llm.chat import (
+    LLMClient,
+    _parse_retry_after,
+    agenerate,
+    generate,
+)
+from ssrq_retro_lab.pipeline.llm.rate_limit import RateLimiter
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append(body)
+        server.client_ports.add(self.client_address[1])
+
+        status, headers, delay = (
+            server.responses.pop(0) if server.responses else (200, {}, 0)
+        )
+        time.sleep(delay)
+
+        if status == 200:
+            payload = {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {
+                            "role": "assistant",
+                            "content": f"echo: {body['messages'][-1]['content']}",
+                        },
+                    }
+                ],
+            }
+            if server.usage is not None:
+                payload["usage"] = server.usage
+        else:
+            payload = {"error": {"message": "fail", "type": "test"}}
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the client closes the connection on timeouts
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FakeOpenAIServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.requests = []
+    server.responses = []
+    server.client_ports = set()
+    server.usage = None
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    with LLMClient(
+        api_key="test",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        timeout=2,
+        max_retries=2,
+        backoff_base=0.01,
+    ) as client:
+        yield client
+
+
+def test_complete(client, server):
+    assert client.complete("Hello", "gpt-4").unwrap() == "echo: Hello"
+    assert server.requests[0]["model"] == "gpt-4"
+    assert server.requests[0]["temperature"] == 0
+
+
+def test_connections_are_reused(client, server):
+    for i in range(5):
+        assert client.complete(f"{i}", "gpt-4").is_ok()
+
+    assert len(server.client_ports) == 1
+
+
+def test_rate_limit_honours_retry_after(client, server):
+    server.responses = [(429, {"Retry-After": "0.3"}, 0)]
+
+    start = time.perf_counter()
+    result = client.complete("Hello", "gpt-4")
+
+    assert result.unwrap() == "echo: Hello"
+    assert time.perf_counter() - start >= 0.3
+    assert len(server.requests) == 2
+
+
+def test_server_errors_are_retried_until_max_retries(client, server):
+    server.responses = [(500, {}, 0)] * 3
+
+    result = client.complete("Hello", "gpt-4")
+
+    assert result.is_err()
+    assert len(server.requests) == 3
+
+
+def test_client_errors_are_not_retried(client, server):
+    server.responses = [(400, {}, 0)]
+
+    assert client.complete("Hello", "gpt-4").is_err()
+    assert len(server.requests) == 1
+
+
+def test_timeout(server):
+    server.responses = [(200, {}, 1)]
+
+    with LLMClient(
+        api_key="test",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        timeout=0.2,
+        max_retries=0,
+    ) as client:
+        assert client.complete("Hello", "gpt-4").is_err()
+
+
+def test_acomplete_uses_the_retry_policy(client, server):
+    server.responses = [(429, {"Retry-After": "0.3"}, 0), (500, {}, 0)]
+
+    start = time.perf_counter()
+    result = asyncio.run(client.acomplete("Hello", "gpt-4"))
+
+    assert result.unwrap() == "echo: Hello"
+    assert time.perf_counter() - start >= 0.3
+    assert len(server.requests) == 3
+
+    server.responses = [(500, {}, 0)] * 3
+
+    assert asyncio.run(client.acomplete("Hello", "gpt-4")).is_err()
+    assert len(server.requests) == 6
+
+
+def test_acomplete_timeout(server):
+    server.responses = [(200, {}, 1)]
+
+    with LLMClient(
+        api_key="test",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        timeout=0.2,
+        max_retries=0,
+    ) as client:
+        start = time.perf_counter()
+
+        assert asyncio.run(client.acomplete("Hello", "gpt-4")).is_err()
+        assert time.perf_counter() - start < 1
+
+
+def test_close_closes_the_async_clients(client, server):
+    loop = asyncio.new_event_loop()
+
+    try:
+        assert loop.run_until_complete(client.acomplete("Hello", "gpt-4")).is_ok()
+
+        async_client = client._async_clients[loop]
+        client.close()
+
+        assert async_client.is_closed()
+    finally:
+        loop.close()
+
+
+def test_aclose_closes_the_async_client_of_the_loop(server):
+    async def complete_and_close():
+        async with LLMClient(
+            api_key="test",
+            base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        ) as client:
+            assert (await client.acomplete("Hello", "gpt-4")).is_ok()
+            async_client = client._get_async_client()
+
+        return client, async_client
+
+    client, async_client = asyncio.run(complete_and_close())
+
+    assert async_client.is_closed()
+    assert client._client.is_closed()
+
+
+def test_agenerate_with_client(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(chat, "count_tokens", lambda text, model_name: len(text))
+    result = asyncio.run(
+        agenerate(
+            "Hello",
+            "gpt-3.5-turbo",
+            False,
+            "",
+            client=client,
+            rate_limiter=RateLimiter(tmp_path / "limits.json"),
+        )
+    )
+
+    assert result.unwrap() == "echo: Hello"
+
+
+def test_generate_with_client(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(chat, "count_tokens", lambda text, model_name: len(text))
+    result = generate(
+        "Hello",
+        "gpt-3.5-turbo",
+        False,
+        "",
+        client=client,
+        rate_limiter=RateLimiter(tmp_path / "limits.json"),
+    )
+
+    assert result.unwrap() == "echo: Hello"
+
+
+def test_generate_settles_the_reserved_tokens(client, server, tmp_path, monkeypatch):
+    monkeypatch.setattr(chat, "count_tokens", lambda text, model_name: len(text))
+    rate_limiter = RateLimiter(tmp_path / "limits.json")
+    settled = []
+    monkeypatch.setattr(rate_limiter, "settle", lambda *args: settled.append(args))
+
+    assert generate("Hello", "gpt-4", False, "", client, rate_limiter).is_ok()
+    # no usage reported: the prompt and the completion are counted
+    assert settled == [
+        (
+            "gpt-4",
+            len("Hello") + chat.COMPLETION_TOKEN_BUDGET,
+            len("Hello") + len("echo: Hello"),
+        )
+    ]
+
+    server.usage = {"prompt_tokens": 8, "completion_tokens": 4, "total_tokens": 12}
+
+    assert generate("Hello", "gpt-4", False, "", client, rate_limiter).is_ok()
+    assert settled[-1] == ("gpt-4", len("Hello") + chat.COMPLETION_TOKEN_BUDGET, 12)
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"retry-after-ms": "1500"}, 1.5),
+        ({"retry-after": "2"}, 2.0),
+        ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, 0.0),
+        ({"retry-after": "soon"}, None),
+        ({}, None),
+    ],
+)
+def test_parse_retry_after(headers, expected):
+    assert _parse_retry_after(httpx.Headers(headers)) == expected
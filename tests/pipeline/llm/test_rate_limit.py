@@ -0,0 +1,121 @@
+import asyncio
+import fcntl
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from ssrq_retro_lab.pipeline.llm import rate_limit
+from ssrq_retro_lab.pipeline.llm.rate_limit import ModelLimits, RateLimiter
+
+LIMITS = {"gpt-3.5-turbo": ModelLimits(requests_per_minute=60, tokens_per_minute=600)}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return RateLimiter(tmp_path / "limits.json", LIMITS, headroom=1.0)
+
+
+def test_requests_are_limited(limiter, clock):
+    assert all(limiter.try_acquire("gpt-3.5-turbo", 1) == 0 for _ in range(60))
+    assert limiter.try_acquire("gpt-3.5-turbo", 1) == pytest.approx(1.0)
+
+    clock[0] += 1
+
+    assert limiter.try_acquire("gpt-3.5-turbo", 1) == 0
+
+
+def test_tokens_are_limited(limiter, clock):
+    assert limiter.try_acquire("gpt-3.5-turbo", 500) == 0
+    assert limiter.try_acquire("gpt-3.5-turbo", 200) == pytest.approx(10.0)
+
+    clock[0] += 10
+
+    assert limiter.try_acquire("gpt-3.5-turbo", 200) == 0
+
+
+def test_requests_larger_than_the_bucket_are_allowed(limiter, clock):
+    assert limiter.try_acquire("gpt-3.5-turbo", 10_000) == 0
+
+
+def test_settle_returns_unused_tokens(limiter, clock):
+    assert limiter.try_acquire("gpt-3.5-turbo", 500) == 0
+
+    limiter.settle("gpt-3.5-turbo", 500, 100)
+
+    assert limiter.try_acquire("gpt-3.5-turbo", 500) == 0
+    assert limiter.try_acquire("gpt-3.5-turbo", 100) > 0
+
+
+def test_settle_takes_additional_tokens(limiter, clock):
+    assert limiter.try_acquire("gpt-3.5-turbo", 100) == 0
+
+    limiter.settle("gpt-3.5-turbo", 100, 700)
+
+    assert limiter.try_acquire("gpt-3.5-turbo", 1) == pytest.approx(10.1)
+
+
+def test_unknown_models_are_not_limited(limiter):
+    assert all(limiter.try_acquire("other", 10_000) == 0 for _ in range(100))
+
+
+def test_acquire_waits(tmp_path):
+    limiter = RateLimiter(
+        tmp_path / "limits.json",
+        {
+            "gpt-3.5-turbo": ModelLimits(
+                requests_per_minute=600, tokens_per_minute=60_000
+            )
+        },
+        headroom=1.0,
+    )
+
+    assert limiter.acquire("gpt-3.5-turbo", 60_000) == 0
+    assert limiter.acquire("gpt-3.5-turbo", 100) > 0
+    assert asyncio.run(limiter.aacquire("gpt-3.5-turbo", 100)) > 0
+
+
+def test_aacquire_does_not_block_the_event_loop(limiter):
+    path = limiter.path
+    path.write_text("{}", encoding="utf-8")
+    fd = os.open(path, os.O_RDWR)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    threading.Timer(0.3, fcntl.flock, (fd, fcntl.LOCK_UN)).start()
+
+    async def count_ticks() -> int:
+        ticks = 0
+        acquiring = asyncio.create_task(limiter.aacquire("gpt-3.5-turbo", 1))
+
+        while not acquiring.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+        return ticks
+
+    try:
+        assert asyncio.run(count_ticks()) > 5
+    finally:
+        os.close(fd)
+
+
+def _acquire_many(path, count: int) -> int:
+    limiter = RateLimiter(path, LIMITS, headroom=1.0)
+    return sum(limiter.try_acquire("gpt-3.5-turbo", 1) == 0 for _ in range(count))
+
+
+def test_state_is_shared_across_processes(tmp_path):
+    path = tmp_path / "limits.json"
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        granted = sum(pool.map(_acquire_many, [path] * 4, [40] * 4))
+
+    # 60 requests fit into the bucket, a few more may be refilled meanwhile
+    assert 60 <= granted <= 65
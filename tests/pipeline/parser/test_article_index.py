@@ -0,0 +1,182 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ssrq_retro_lab.pipeline import cache
+from ssrq_retro_lab.pipeline.parser import article_index, header_mask
+from ssrq_retro_lab.pipeline.parser.article_index import (
+    build_article_index,
+    get_article_index,
+)
+from ssrq_retro_lab.pipeline.parser.header_mask import build_header_mask
+from ssrq_retro_lab.pipeline.parser.html_to_article import (
+    ParsedPage,
+    collect_article_nodes,
+)
+
+
+def create_volume(rng: random.Random, page_count: int) -> list[str]:
+    texts = ["3. ", "4. ", "3", "13. Titel", "Text", "1404.", "", "34."]
+
+    def create_paragraph(top: int) -> str:
+        spans = "".join(
+            f"<span>{rng.choice(texts)}</span>" for _ in range(rng.randint(0, 2))
+        )
+        return f'<p style="top:{top}pt">{spans}</p>'
+
+    def create_group() -> str:
+        return (
+            "<div>"
+            + "".join(
+                create_paragraph(rng.choice([70, 100, 200]))
+                for _ in range(rng.randint(0, 8))
+            )
+            + "</div>"
+        )
+
+    # some pages have several groups of sibling paragraphs
+    return [
+        "<div>"
+        + "".join(create_group() for _ in range(rng.choice([1, 1, 2])))
+        + "</div>"
+        for _ in range(page_count)
+    ]
+
+
+@pytest.fixture
+def volume_path(tmp_path):
+    path = tmp_path / "ZG_9.9.pdf"
+    path.write_bytes(b"%PDF")
+    return path
+
+
+def test_article_index_slices_like_collect_article_nodes(volume_path):
+    rng = random.Random(7)
+
+    for _ in range(200):
+        volume = create_volume(rng, 6)
+        header_mask = build_header_mask(volume_path, volume)
+        index = build_article_index(volume_path, volume)
+
+        for current_number in range(1, 6):
+            first_page = rng.randrange(6)
+            numbers = range(first_page, min(6, first_page + rng.randint(1, 3)))
+            pages = tuple(ParsedPage(volume[n], volume_path, n) for n in numbers)
+            assert header_mask.apply(pages) is not None
+            expected = collect_article_nodes(pages, current_number, current_number + 1)
+            result = index.slice_article(pages, current_number, current_number + 1)
+
+            assert result is not None
+            assert result.is_ok() == expected.is_ok()
+
+            if expected.is_ok():
+                assert [n.get() for n in result.unwrap()] == [
+                    n.get() for n in expected.unwrap()
+                ]
+
+
+def test_article_index_records_positions(volume_path):
+    volume = [
+        "<div><p><span>Text</span></p><p><span>3. Titel</span></p></div>",
+        "<div><p><span>Text</span></p><p><span>4. Titel</span></p></div>",
+    ]
+    index = build_article_index(volume_path, volume)
+
+    assert index.positions[3] == ((0, 1),)
+    assert index.positions_on_page(4, 1) == [1]
+    assert index.positions_on_page(4, 0) == []
+    assert index.slice_article((ParsedPage(volume[0]),), 3, 4) is None
+
+
+def test_get_article_index_is_persisted(volume_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(article_index, "_INDEXES", {})
+    volume = create_volume(random.Random(1), 3)
+    monkeypatch.setattr(
+        article_index,
+        "build_article_index",
+        lambda path: build_article_index(path, volume),
+    )
+
+    assert get_article_index(volume_path, build=False) is None
+
+    index = get_article_index(volume_path)
+
+    assert get_article_index(volume_path) is index
+
+    article_index._INDEXES.clear()
+    monkeypatch.setattr(article_index, "build_article_index", None)
+
+    assert get_article_index(volume_path, build=False) == index
+
+
+def test_get_article_index_uses_the_header_mask(volume_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(article_index, "_INDEXES", {})
+    monkeypatch.setattr(header_mask, "_MASKS", {})
+    volume = create_volume(random.Random(1), 3)
+    masks = []
+    reads = []
+
+    def count_build_header_mask(path, pages=None):
+        masks.append(build_header_mask(path, pages))
+        return masks[-1]
+
+    def count_read_volume(path):
+        reads.append(path)
+        return iter(volume)
+
+    monkeypatch.setattr(header_mask, "build_header_mask", count_build_header_mask)
+    monkeypatch.setattr(header_mask, "read_volume", count_read_volume)
+    monkeypatch.setattr(article_index, "build_header_mask", None)
+    monkeypatch.setattr(article_index, "read_volume", count_read_volume)
+
+    index = get_article_index(volume_path)
+
+    assert index == build_article_index(volume_path, volume, masks[0])
+    assert header_mask.get_header_mask(volume_path) is masks[0]
+    assert len(masks) == 1
+    # the mask is built from the pages read for the index
+    assert len(reads) == 1
+
+    # an index built with another version of the header mask isn't used
+    article_index._INDEXES.clear()
+    monkeypatch.setattr(article_index, "HEADER_MASK_VERSION", "0")
+
+    assert get_article_index(volume_path, build=False) is None
+
+
+def test_get_article_index_does_not_wait_for_a_build(
+    volume_path, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(article_index, "_INDEXES", {})
+    monkeypatch.setattr(article_index, "_INDEX_LOCKS", {})
+    volume = create_volume(random.Random(1), 3)
+    building = threading.Event()
+    release = threading.Event()
+
+    def slow_build_article_index(path):
+        building.set()
+        release.wait(5)
+        return build_article_index(path, volume)
+
+    monkeypatch.setattr(article_index, "build_article_index", slow_build_article_index)
+    monkeypatch.setattr(article_index, "get_page_store", lambda path: object())
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        index = executor.submit(get_article_index, volume_path)
+        assert building.wait(5)
+
+        # the HTMLWrangler falls back to searching the pages meanwhile
+        assert get_article_index(volume_path, build=False) is None
+
+        release.set()
+        built_index = index.result()
+
+        assert get_article_index(volume_path, build=False) is built_index
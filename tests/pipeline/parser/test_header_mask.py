@@ -0,0 +1,178 @@
+import random
+import re
+
+import pytest
+
+from ssrq_retro_lab.pipeline import cache
+from ssrq_retro_lab.pipeline.parser import header_mask
+from ssrq_retro_lab.pipeline.parser.header_mask import (
+    build_header_mask,
+    get_header_mask,
+    remove_page_furniture,
+)
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage
+
+
+def create_page(lines: list[tuple[float, str]]) -> str:
+    return (
+        "<div>"
+        + "".join(
+            f'<p style="top:{top}pt;left:73.3pt"><span>{text}</span></p>'
+            for top, text in lines
+        )
+        + "</div>"
+    )
+
+
+def create_volume(rng: random.Random, page_count: int) -> list[str]:
+    """Pages with a running head and its page number at the top, the body text and
+    every second page with a page number at the bottom."""
+    words = ["Zehnten", "der", "Chamer", "Kirche", "1276", "14.", "Zins", "&amp;"]
+    pages = []
+
+    for number in range(page_count):
+        shift = rng.uniform(-1, 1)
+        lines = [
+            (
+                75.3 + shift,
+                f"A. Die geistlichen Grundherrschaften • {number}-{number + 2}",
+            ),
+            (74.9 + shift, str(number + 40)),
+        ]
+        lines += [
+            (99.0 + 12.9 * line + shift, " ".join(rng.choices(words, k=6)))
+            for line in range(rng.randint(5, 40))
+        ]
+
+        if number % 2 == 0:
+            lines.append((640.2 + shift, str(number + 40)))
+
+        pages.append(create_page(lines))
+
+    return pages
+
+
+@pytest.fixture
+def volume_path(tmp_path):
+    path = tmp_path / "ZG_9.9.pdf"
+    path.write_bytes(b"%PDF")
+    return path
+
+
+def test_header_mask_detects_running_heads_and_page_numbers(volume_path):
+    volume = create_volume(random.Random(3), 20)
+    # a chapter starts without running head, its title at the usual header position
+    volume[5] = create_page([(76.0, "B. Die Stadt"), (99.0, "Zehnten der Chamer")])
+    # the header is printed lower than the hard-coded threshold of 85pt
+    volume[6] = create_page(
+        [(88.1, "A. Die geistlichen Grundherrschaften • 6-8"), (87.7, "46")]
+        + [(112.0 + 12.9 * line, "Zins") for line in range(10)]
+    )
+    volume[9] = None  # type: ignore
+
+    mask = build_header_mask(volume_path, volume)
+
+    # the page number at the bottom of the even pages is a footer
+    assert mask.masked[0] == {0, 1, mask.paragraph_counts[0] - 1}
+    assert mask.masked[1] == {0, 1}
+    assert 5 not in mask.masked
+    assert mask.masked[6] == {0, 1}
+    assert 9 not in mask.paragraph_counts
+
+
+def test_header_mask_keeps_body_text_without_furniture(volume_path):
+    rng = random.Random(5)
+    words = ["Zehnten", "der", "Chamer", "Kirche", "1276", "14.", "Zins", "Hof"]
+    volume = [
+        create_page(
+            [
+                (99.0 + 12.9 * line, " ".join(rng.choices(words, k=5)))
+                for line in range(30)
+            ]
+        )
+        for _ in range(10)
+    ]
+    # a year at the end of a page isn't a page number
+    volume[3] = create_page([(99.0, "Zins"), (640.2, "1277")])
+
+    mask = build_header_mask(volume_path, volume)
+
+    assert mask.masked == {}
+
+
+def test_header_mask_removes_the_furniture_in_place(volume_path):
+    volume = create_volume(random.Random(3), 6)
+    mask = build_header_mask(volume_path, volume)
+    pages = tuple(ParsedPage(volume[n], volume_path, n) for n in range(2, 4))
+    paragraph_counts = [len(page.selector.xpath("//p")) for page in pages]
+
+    assert mask.apply(pages).unwrap() == pages  # type: ignore
+    assert [len(page.selector.xpath("//p")) for page in pages] == [
+        count - len(mask.masked[page.number])  # type: ignore
+        for count, page in zip(paragraph_counts, pages)
+    ]
+    assert "Grundherrschaften" not in pages[0].html
+
+    # pages, which aren't part of the mask, aren't changed at all
+    unknown_pages = (ParsedPage(volume[2], volume_path, 2), ParsedPage(volume[0]))
+
+    assert mask.apply(unknown_pages) is None
+    assert "Grundherrschaften" in unknown_pages[0].html
+
+
+def test_remove_page_furniture_falls_back_to_the_threshold(
+    volume_path, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(header_mask, "_MASKS", {})
+    volume = create_volume(random.Random(3), 6)
+    monkeypatch.setattr(
+        header_mask,
+        "build_header_mask",
+        lambda path, pages=None: build_header_mask(path, volume),
+    )
+
+    pages = (ParsedPage(volume[1]),)
+    remove_page_furniture(pages)
+
+    assert "Grundherrschaften" not in pages[0].html
+    assert get_header_mask(volume_path, build=False) is None
+
+    mask = get_header_mask(volume_path)
+    pages = (ParsedPage(volume[0], volume_path, 0),)
+    remove_page_furniture(pages)
+
+    assert get_header_mask(volume_path, build=False) is mask
+    assert len(pages[0].selector.xpath("//p")) == (
+        mask.paragraph_counts[0] - len(mask.masked[0])  # type: ignore
+    )
+
+
+def test_header_mask_keeps_body_text_next_to_margin_line_numbers(volume_path):
+    rng = random.Random(11)
+    words = ["Zehnten", "der", "Chamer", "Kirche", "Zins", "Hof", "und", "gen"]
+    volume = []
+
+    for _ in range(800):
+        lines = [
+            (99.0 + 12.9 * line, " ".join(rng.choices(words, k=6)))
+            for line in range(40)
+        ]
+        # the line number of the transcript is printed in the margin of the last line
+        lines.append((lines[-1][0], str(rng.randrange(5, 105, 5))))
+        volume.append(create_page(lines))
+
+    mask = build_header_mask(volume_path, volume)
+
+    assert [
+        text
+        for number, masked in mask.masked.items()
+        for text in _paragraph_texts(volume[number], masked)
+        if not text.isdigit()
+    ] == []
+
+
+def _paragraph_texts(page: str, indices: frozenset[int]) -> list[str]:
+    paragraphs = re.findall(r"<span>(.*?)</span>", page)
+    return [paragraphs[index] for index in indices]
@@ -1,3 +1,6 @@
+import pickle
+import random
+
 from parsel import Selector
 
 from ssrq_retro_lab.pipeline.components.text_extractor import (
@@ -5,7 +8,10 @@ from ssrq_retro_lab.pipeline.components.text_extractor import (
     TextExtractor,
 )
 from ssrq_retro_lab.pipeline.parser.html_to_article import (
+    ParsedPage,
+    collect_article_nodes,
     collect_article_nodes_from_pages,
+    remove_header,
     remove_header_from_pages,
 )
 
@@ -140,3 +146,84 @@ def test_remove_header_from_pages():
 
     for page in result.unwrap():
         assert len(Selector(page, type="xml").xpath("//p")) == 2
+
+
+def _collect_article_nodes_with_xpath(
+    pages: tuple[str, ...], current_article_number: int, next_article_number: int
+) -> list[str]:
+    # the former implementation, which queries every page up to five times
+    result_nodes = []
+
+    for page in pages:
+        page_selector = Selector(text=page, type="xml")
+        current = f"{current_article_number}."
+        following = f"{next_article_number}."
+        current_is_on_page = bool(
+            page_selector.xpath(f"//span[contains(., '{current}')]")
+        )
+        next_is_on_page = bool(
+            page_selector.xpath(f"//span[contains(., '{following}')]")
+        )
+
+        if current_is_on_page and next_is_on_page:
+            query = f"""//p[preceding-sibling::p[span[contains(., '{current}')]]
+                or self::p[span[contains(., '{current_article_number}')]]]
+                [following-sibling::p[span[contains(., '{following}')]]]
+                [position() < last()]"""
+        elif current_is_on_page:
+            query = f"""//p[preceding-sibling::p[span[contains(., '{current}')]]
+                or self::p[span[contains(., '{current}')]]]"""
+        elif next_is_on_page:
+            query = f"//p[following-sibling::p[span[contains(., '{following}')]]][position() < last()]"
+        else:
+            query = "//p"
+
+        result_nodes.extend(node.get() for node in page_selector.xpath(query))
+
+    return result_nodes
+
+
+def test_collect_article_nodes_matches_xpath_implementation():
+    rng = random.Random(42)
+    texts = ["7. ", "8. ", "7", "17. Titel", "Text", "Item 8.", "", "78."]
+
+    def create_paragraph() -> str:
+        spans = "".join(
+            f"<span>{rng.choice(texts)}</span>" for _ in range(rng.randint(0, 2))
+        )
+        nested = "<i><span>8. </span></i>" if rng.random() < 0.1 else ""
+        return f"<p>{spans}{nested}</p>"
+
+    def create_page() -> str:
+        divs = "".join(
+            "<div>"
+            + "".join(create_paragraph() for _ in range(rng.randint(0, 6)))
+            + "</div>"
+            for _ in range(rng.randint(1, 2))
+        )
+        return f"<div>{divs}</div>"
+
+    for _ in range(300):
+        pages = tuple(create_page() for _ in range(rng.randint(1, 3)))
+        expected_nodes = _collect_article_nodes_with_xpath(pages, 7, 8)
+        result = collect_article_nodes(tuple(ParsedPage(page) for page in pages), 7, 8)
+
+        if len(expected_nodes) == 0:
+            assert result.is_err()
+        else:
+            assert [node.get() for node in result.unwrap()] == expected_nodes
+
+
+def test_parsed_pages_are_shared_and_picklable():
+    html = """<div><p style="top:70pt"><span>Kopf</span></p>
+    <p style="top:99pt"><span>7. Titel</span></p><p><span>Text</span></p>
+    <p><span>8. Titel</span></p></div>"""
+    pages = (ParsedPage(html),)
+
+    assert remove_header(pages).unwrap() == pages
+
+    nodes = collect_article_nodes(pages, 7, 8).unwrap()
+
+    assert [node.xpath("string()").get() for node in nodes] == ["7. Titel"]
+    assert "Kopf" not in pages[0].html
+    assert pickle.loads(pickle.dumps(pages[0])).html == pages[0].html
@@ -1,14 +1,23 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
 import pytest
 from parsel import Selector
-from result import is_ok
+from result import is_err, is_ok
 
 from ssrq_retro_lab.config import ZG_DATA_ROOT
+from ssrq_retro_lab.pipeline import cache
+from ssrq_retro_lab.pipeline.parser import xml_toc_parser
 from ssrq_retro_lab.pipeline.parser.xml_toc_parser import (
     VolumeEntry,
     VolumeMeta,
     XMLToC,
+    _get_pages,
+    _get_volume_entries,
     _get_volume_meta_infos,
     _parse_entry,
+    load_xml_toc,
     parse_xml_toc,
     _map_book_pages_to_img,
 )
@@ -88,3 +97,137 @@ def test_map_book_pages_to_img(toc: Selector, page_number: int, img_number: int)
 
     assert is_ok(pages)
     assert pages.unwrap()[page_number] == img_number
+
+
+def test_get_entry_returns_first_entry_for_duplicate_numbers():
+    meta = VolumeMeta("ZG", "Title", "1.1")
+    first = VolumeEntry("First", "1400", 1, (1,))
+    entries = (first, VolumeEntry("Second", "1401", 1, (2,)))
+    xml_toc = XMLToC(entries, meta, ZG_DATA_ROOT, {1: 1})
+
+    assert xml_toc.get_entry(1).unwrap() is first
+    assert is_err(xml_toc.get_entry(2))
+
+
+def test_load_xml_toc_keeps_parsed_toc(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(xml_toc_parser, "_TOCS", {})
+
+    toc_path = tmp_path / "ZG_1-1.xml"
+    toc_path.write_bytes((ZG_DATA_ROOT / "toc" / "ZG_1-1.xml").read_bytes())
+
+    xml_toc = load_xml_toc(toc_path, tmp_path / "ZG_1.1.pdf").unwrap()
+
+    assert load_xml_toc(toc_path, tmp_path / "ZG_1.1.pdf").unwrap() is xml_toc
+
+    # a new process finds the persisted toc without parsing the XML
+    xml_toc_parser._TOCS.clear()
+    monkeypatch.setattr(xml_toc_parser, "parse_xml_toc", None)
+
+    persisted_toc = load_xml_toc(toc_path, tmp_path / "ZG_1.1.pdf").unwrap()
+
+    assert persisted_toc == xml_toc
+    assert persisted_toc.get_entry(777).unwrap().pages == (476, 477)
+
+
+def test_load_xml_toc_is_invalidated_by_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(xml_toc_parser, "_TOCS", {})
+
+    toc_path = tmp_path / "ZG_1-1.xml"
+    toc = (ZG_DATA_ROOT / "toc" / "ZG_1-1.xml").read_text(encoding="utf-8")
+    toc_path.write_text(toc, encoding="utf-8")
+
+    xml_toc = load_xml_toc(toc_path, tmp_path / "ZG_1.1.pdf").unwrap()
+
+    toc_path.write_text(
+        toc.replace("Mandat gegen Einbrecher und Diebe.", "Mandat."), encoding="utf-8"
+    )
+
+    changed_toc = load_xml_toc(toc_path, tmp_path / "ZG_1.1.pdf").unwrap()
+
+    assert changed_toc is not xml_toc
+    assert changed_toc.get_entry(777).unwrap().title == "Mandat."
+
+
+def test_load_xml_toc_does_not_block_other_tocs(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(xml_toc_parser, "_TOCS", {})
+
+    parsing = threading.Event()
+    release = threading.Event()
+    parse_xml_toc = xml_toc_parser.parse_xml_toc
+
+    def slow_parse_xml_toc(toc, volume_path):
+        if volume_path.name == "ZG_1.2.pdf":
+            parsing.set()
+            release.wait(5)
+        return parse_xml_toc(toc, volume_path)
+
+    monkeypatch.setattr(xml_toc_parser, "parse_xml_toc", slow_parse_xml_toc)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        slow_toc = executor.submit(
+            load_xml_toc, ZG_DATA_ROOT / "toc" / "ZG_1-2.xml", tmp_path / "ZG_1.2.pdf"
+        )
+        assert parsing.wait(5)
+
+        xml_toc = load_xml_toc(
+            ZG_DATA_ROOT / "toc" / "ZG_1-1.xml", tmp_path / "ZG_1.1.pdf"
+        )
+
+        assert is_ok(xml_toc)
+        assert not slow_toc.done()
+
+        release.set()
+
+        assert is_ok(slow_toc.result())
+
+
+def _get_volume_entries_quadratic(toc: Selector) -> tuple[VolumeEntry, ...]:
+    # the former implementation, which searches the next entry for every entry
+    entries = []
+
+    for entry in toc.xpath("//entry[date][not(entry[date])]"):
+        no = int(entry.xpath("no/text()").get())
+        start_page = int(entry.xpath("pg/text()").get())
+        end_pages = toc.xpath(
+            f"//entry[date][not(entry[date])][no/text() = '{no + 1!s}']/pg/text()"
+        ).getall()
+        pages = _get_pages(end_pages, no, start_page).unwrap()
+        entries.append(
+            VolumeEntry(
+                entry.xpath("title/text()").get(),
+                entry.xpath("date/text()").get(),
+                no,
+                pages,
+            )
+        )
+
+    return tuple(entries)
+
+
+@pytest.mark.parametrize("toc_file", ["ZG_1-1.xml", "ZG_1-2.xml"])
+def test_single_pass_parser_matches_quadratic_parser(toc_file: str):
+    toc = XMLReader(ZG_DATA_ROOT / "toc" / toc_file).read()
+
+    assert _get_volume_entries(toc).unwrap() == _get_volume_entries_quadratic(toc)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("toc_file", ["ZG_1-1.xml", "ZG_1-2.xml"])
+def test_single_pass_parser_is_faster_than_quadratic_parser(toc_file: str):
+    toc = XMLReader(ZG_DATA_ROOT / "toc" / toc_file).read()
+
+    start = perf_counter()
+    _get_volume_entries(toc).unwrap()
+    single_pass = perf_counter() - start
+
+    start = perf_counter()
+    _get_volume_entries_quadratic(toc)
+    quadratic = perf_counter() - start
+
+    assert single_pass < quadratic
@@ -1,8 +1,15 @@
+import fitz  # type: ignore
 from parsel import Selector
 import pytest
 
 from ssrq_retro_lab.config import ZG_DATA_ROOT
-from ssrq_retro_lab.pipeline.pdf.extraction import extract_pages
+from ssrq_retro_lab.pipeline.pdf import page_store
+from ssrq_retro_lab.pipeline.pdf.extraction import (
+    export_volume_text,
+    extract_pages,
+    extract_volume,
+    ingest_volume,
+)
 from ssrq_retro_lab.repository.reader import PDFReader, XMLReader
 from ssrq_retro_lab.pipeline.parser.xml_toc_parser import parse_xml_toc, XMLToC
 
@@ -30,3 +37,43 @@ def test_extract_pages(toc: XMLToC, number: int, expected_pages: int):
 
     for page in pages:
         assert Selector(page, type="xml").xpath("./p/ancestor::div").get() is not None
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "ZG_9.9.pdf"
+    document = fitz.open()
+
+    for number in range(10):
+        document.new_page().insert_text((72, 72), f"Seite {number}")
+
+    document.save(path)
+    document.close()
+
+    return path
+
+
+def test_extract_volume_keeps_page_order(pdf_path):
+    pages = list(extract_volume(pdf_path, "text", max_workers=3, chunk_size=2))
+
+    assert pages == [f"Seite {number}\n" for number in range(10)]
+
+
+def test_ingest_volume_writes_page_store(pdf_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(page_store, "PAGE_STORE_DIR", tmp_path / "pages")
+    monkeypatch.setattr(page_store, "_STORES", {})
+
+    ingest_volume(pdf_path, max_workers=2)
+    store = page_store.get_page_store(pdf_path)
+
+    assert store is not None
+    assert len(store) == 10
+    assert "Seite 9" in store.get(9)
+
+
+def test_export_volume_text(pdf_path, tmp_path):
+    output_path = export_volume_text(pdf_path, tmp_path / "export" / "ZG_9_9.txt", 2)
+
+    assert output_path.read_text(encoding="utf-8") == "".join(
+        f"Seite {number}\n" for number in range(10)
+    )
@@ -0,0 +1,165 @@
+import re
+
+import fitz  # type: ignore
+import pytest
+
+from ssrq_retro_lab.pipeline import cache
+from ssrq_retro_lab.pipeline.parser import header_mask
+from ssrq_retro_lab.pipeline.parser.header_mask import (
+    get_header_mask,
+    remove_page_furniture,
+)
+from ssrq_retro_lab.pipeline.parser.html_to_article import (
+    ParsedPage,
+    collect_article_nodes,
+    remove_header,
+)
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import load_xml_toc
+from ssrq_retro_lab.pipeline.pdf.extraction import _extract_page
+from ssrq_retro_lab.pipeline.pdf import lines as lines_module
+from ssrq_retro_lab.pipeline.pdf.lines import (
+    collect_article_lines,
+    export_article_lines,
+    extract_line_records,
+    remove_header_lines,
+)
+
+TOC = """<?xml version="1.0" encoding="UTF-8"?>
+<volinfo canton="ZG" vol="9.9">
+  <title>Test</title>
+  <pages total="4"><range from="1" to="4" type="number" start="1"/></pages>
+  <toe>
+    <entry><no>14</no><title>Erster</title><date>1276</date><pg>3</pg></entry>
+    <entry><no>15</no><title>Zweiter</title><date>1277</date><pg>4</pg></entry>
+  </toe>
+</volinfo>
+"""
+
+
+@pytest.fixture
+def pdf():
+    document = fitz.open()
+    pages = [
+        [
+            (60, "47 Kopf", "helv"),
+            (100, "1276 April 14.", "tiit"),
+            (120, "Text", "helv"),
+        ],
+        [(60, "48 Kopf", "helv"), (100, "Mehr Text", "helv"), (120, "1277", "tiit")],
+        [
+            (100, "14. ", "helv"),
+            (120, "Zeile zwei", "helv"),
+            (140, "Datum", "tiit"),
+        ],
+        [(100, "15. ", "helv"), (120, "Anderer Artikel", "helv")],
+    ]
+
+    for lines in pages:
+        page = document.new_page()
+
+        for y, text, font in lines:
+            page.insert_text((72, y), text, fontsize=10, fontname=font)
+
+    yield document
+
+    document.close()
+
+
+def test_line_records_have_the_top_position_of_the_html_export(pdf):
+    for number in range(pdf.page_count):
+        html = _extract_page(pdf, number)
+        tops = [float(top) for top in re.findall(r"<p style=\"top:([\d.]+)pt", html)]
+
+        assert [line.top for line in extract_line_records(pdf, number)] == tops
+
+
+def test_line_records_select_the_same_lines_as_the_html_export(pdf):
+    pages = tuple(
+        ParsedPage(_extract_page(pdf, number)) for number in range(pdf.page_count)
+    )
+    nodes = collect_article_nodes(remove_header(pages).unwrap(), 14, 15).unwrap()
+
+    lines = remove_header_lines(
+        [extract_line_records(pdf, number) for number in range(pdf.page_count)]
+    )
+    article_lines = collect_article_lines(lines, 14, 15).unwrap()
+
+    assert [line.text for line in article_lines] == [
+        node.xpath("string()").get() for node in nodes
+    ]
+    assert "Kopf" not in " ".join(line.text for line in article_lines)
+    assert article_lines[-1].text == "Datum"
+
+
+def test_articles_are_exported_from_the_lines(pdf, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    pdf_path = tmp_path / "ZG_9.9.pdf"
+    pdf.save(pdf_path)
+    (tmp_path / "ZG_9-9.xml").write_text(TOC, encoding="utf-8")
+    pages = tuple(
+        ParsedPage(_extract_page(pdf, number)) for number in range(pdf.page_count)
+    )
+    remove_header(pages)
+
+    lines_module.main(
+        [str(pdf_path), "--toc-dir", str(tmp_path), "--output-dir", str(tmp_path)]
+    )
+
+    for number, page_numbers in ((14, (2, 3)), (15, (3,))):
+        nodes = collect_article_nodes(
+            [pages[page] for page in page_numbers], number, number + 1
+        ).unwrap()
+
+        assert (tmp_path / "ZG_9_9" / f"{number}.txt").read_text(
+            encoding="utf-8"
+        ) == "".join(f"{node.xpath('string()').get()}\n" for node in nodes)
+
+
+def test_line_export_removes_the_furniture_of_the_header_mask(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    cache.configure_cache_service(tmp_path / "cache")
+    monkeypatch.setattr(header_mask, "_MASKS", {})
+    document = fitz.open()
+    # the running head is below the threshold of `remove_header`
+    for lines in (
+        ["Vorwort"],
+        ["Vorwort"],
+        ["14. ", "Zeile eins"],
+        ["Zeile zwei"],
+        ["15. ", "Anderer Artikel"],
+    ):
+        page = document.new_page()
+
+        for y, text in enumerate(["Stadtrecht von Zug", *lines]):
+            page.insert_text((72, 100 + 20 * y), text, fontsize=10)
+
+    pdf_path = tmp_path / "ZG_9.9.pdf"
+    document.save(pdf_path)
+    (tmp_path / "ZG_9-9.xml").write_text(
+        TOC.replace('total="4"', 'total="5"')
+        .replace('to="4"', 'to="5"')
+        .replace("<pg>4</pg>", "<pg>5</pg>"),
+        encoding="utf-8",
+    )
+    toc = load_xml_toc(tmp_path / "ZG_9-9.xml", pdf_path).unwrap()
+
+    assert get_header_mask(pdf_path) is not None
+
+    pages = tuple(
+        ParsedPage(_extract_page(document, number), pdf_path, number)
+        for number in range(document.page_count)
+    )
+    remove_page_furniture(pages).unwrap()
+    document.close()
+
+    assert export_article_lines(pdf_path, toc, tmp_path / "lines") == 2
+
+    for number, page_numbers in ((14, (2, 3, 4)), (15, (4,))):
+        nodes = collect_article_nodes(
+            [pages[page] for page in page_numbers], number, number + 1
+        ).unwrap()
+        text = (tmp_path / "lines" / f"{number}.txt").read_text(encoding="utf-8")
+
+        assert text == "".join(f"{node.xpath('string()').get()}\n" for node in nodes)
+        assert "Stadtrecht" not in text
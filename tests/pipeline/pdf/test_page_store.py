@@ -0,0 +1,137 @@
+import os
+
+import fitz  # type: ignore
+import pytest
+
+from ssrq_retro_lab.pipeline.parser.xml_toc_parser import (
+    VolumeEntry,
+    VolumeMeta,
+    XMLToC,
+)
+from ssrq_retro_lab.pipeline.pdf import extraction, page_store
+from ssrq_retro_lab.pipeline.pdf.page_store import (
+    PageStore,
+    get_page_store,
+    write_page_store,
+)
+
+
+@pytest.fixture
+def pdf_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_store, "PAGE_STORE_DIR", tmp_path / "pages")
+    monkeypatch.setattr(page_store, "_STORES", {})
+
+    path = tmp_path / "ZG_9.9.pdf"
+    document = fitz.open()
+
+    for number in range(3):
+        document.new_page().insert_text((72, 72), f"Seite {number}")
+
+    document.save(path)
+    document.close()
+
+    return path
+
+
+def test_page_store_reads_pages_by_index(pdf_path, tmp_path):
+    path = tmp_path / "volume.pages"
+
+    assert write_page_store(path, pdf_path, ["<p>a</p>", None, "<p>ü</p>"]) == 3
+
+    store = PageStore(path)
+
+    assert len(store) == 3
+    assert store.get(0) == "<p>a</p>"
+    assert store.get(1) is None
+    assert store.get(2) == "<p>ü</p>"
+    assert store.get(3) is None
+    assert store.get(2) is store.get(2)
+    assert store.is_current(pdf_path)
+
+    store.close()
+
+
+def test_page_store_is_outdated_when_pdf_changes(pdf_path):
+    extraction.ingest_volume(pdf_path)
+
+    assert get_page_store(pdf_path) is get_page_store(pdf_path)
+
+    stat = pdf_path.stat()
+    os.utime(pdf_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert get_page_store(pdf_path) is None
+
+
+def test_outdated_page_store_is_closed(pdf_path):
+    extraction.ingest_volume(pdf_path)
+    store = get_page_store(pdf_path)
+
+    assert store is not None and store.get(0) is not None
+
+    store_path = page_store.page_store_path(pdf_path)
+    stat = store_path.stat()
+    os.utime(store_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    new_store = get_page_store(pdf_path)
+
+    assert new_store is not None and new_store is not store
+    assert store.get(0) is None
+    assert new_store.get(0) is not None
+
+
+def test_extract_pages_reads_from_page_store(pdf_path, monkeypatch):
+    toc = XMLToC(
+        (VolumeEntry("Titel", "1400", 1, (1, 2, 3)),),
+        VolumeMeta("ZG", "Titel", "9.9"),
+        pdf_path,
+        {1: 1, 2: 2, 3: 3},
+    )
+    entry = toc.get_entry(1).unwrap()
+    pdf = fitz.open(pdf_path)
+    expected_pages = extraction.extract_pages(pdf, toc, entry)
+
+    assert "Seite 2" in expected_pages[2]
+
+    write_page_store(
+        page_store.page_store_path(pdf_path),
+        pdf_path,
+        [expected_pages[0], None, expected_pages[2]],
+    )
+    extracted_pages: list[int] = []
+    extract_page = extraction._extract_page
+
+    def count_extract_page(pdf, page):
+        extracted_pages.append(page)
+        return extract_page(pdf, page)
+
+    monkeypatch.setattr(extraction, "_extract_page", count_extract_page)
+
+    assert extraction.extract_pages(pdf, toc, entry) == expected_pages
+    assert extracted_pages == [1]
+
+
+def test_page_store_is_outdated_when_extractor_changes(pdf_path, monkeypatch):
+    extraction.ingest_volume(pdf_path)
+
+    assert get_page_store(pdf_path) is not None
+
+    monkeypatch.setattr(page_store, "_STORES", {})
+    monkeypatch.setattr(page_store, "EXTRACTOR_VERSION", b"2/pymupdf-9.9.9")
+
+    assert get_page_store(pdf_path) is None
+
+    # a store of an older format isn't read at all
+    path = page_store.page_store_path(pdf_path)
+    path.write_bytes(b"SSRQPGS1" + path.read_bytes()[8:])
+    monkeypatch.setattr(page_store, "_STORES", {})
+
+    assert get_page_store(pdf_path) is None
+
+
+def test_page_stores_of_volumes_with_the_same_name_differ(pdf_path, tmp_path):
+    other_path = tmp_path / "other" / pdf_path.name
+    other_path.parent.mkdir()
+    other_path.write_bytes(pdf_path.read_bytes())
+
+    assert page_store.page_store_path(pdf_path) != page_store.page_store_path(
+        other_path
+    )
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+from jinja2 import UndefinedError
+
+from ssrq_retro_lab.pipeline.templates import utils
+from ssrq_retro_lab.pipeline.templates.utils import (
+    TemplateRegistry,
+    get_template_registry,
+    render_template,
+)
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    (template_dir / "greeting.jinja2").write_text("Hello {{ name }}")
+    return template_dir
+
+
+def test_templates_are_compiled_once(template_dir, tmp_path):
+    registry = TemplateRegistry(template_dir, tmp_path / "bytecode")
+
+    assert registry.get("greeting.jinja2") is registry.get("greeting.jinja2")
+    assert registry.render("greeting.jinja2", name="Zug") == "Hello Zug"
+
+
+def test_bytecode_is_cached_on_disk(template_dir, tmp_path):
+    assert TemplateRegistry(template_dir, tmp_path / "bytecode").precompile() == 1
+    assert len(list((tmp_path / "bytecode").iterdir())) == 1
+
+    registry = TemplateRegistry(template_dir, tmp_path / "bytecode")
+
+    assert registry.render("greeting.jinja2", name="Zug") == "Hello Zug"
+
+
+def test_changed_templates_are_reloaded(template_dir, tmp_path):
+    registry = TemplateRegistry(template_dir, tmp_path / "bytecode")
+
+    assert registry.render("greeting.jinja2", name="Zug") == "Hello Zug"
+
+    template = template_dir / "greeting.jinja2"
+    template.write_text("Hi {{ name }}")
+    # make sure the modification time changes
+    stat = template.stat()
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert registry.render("greeting.jinja2", name="Zug") == "Hi Zug"
+
+
+def test_render_template_uses_the_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        utils, "_REGISTRY", TemplateRegistry(bytecode_dir=tmp_path / "bytecode")
+    )
+
+    assert get_template_registry() is get_template_registry()
+
+    with pytest.raises(UndefinedError):
+        render_template("tei_v1.jinja2")
@@ -0,0 +1,140 @@
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from ssrq_retro_lab.pipeline import cache
+from ssrq_retro_lab.pipeline.cache import CacheService, CacheSettings
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = CacheService(tmp_path)
+    yield service
+    service.close()
+
+
+def test_handles_are_kept_open(service):
+    assert service.get("TextClassifier") is service.get("TextClassifier")
+    assert service.get("TextClassifier") is not service.get("OCRCorrector")
+
+
+def test_statistics(service):
+    namespace = service.get("TextClassifier")
+    namespace["a"] = "äbc"
+
+    assert "a" in namespace
+    assert "b" not in namespace
+    assert namespace["a"] == "äbc"
+    assert namespace.get("c") is None
+
+    statistics = service.statistics()["TextClassifier"]
+
+    assert (statistics.hits, statistics.misses) == (1, 2)
+    assert statistics.bytes_written == statistics.bytes_read == 4
+    assert statistics.volume > 0
+    assert statistics.hit_rate == pytest.approx(1 / 3)
+
+
+@pytest.mark.parametrize(
+    "eviction_policy", ["least-recently-used", "least-frequently-used"]
+)
+def test_size_limit(tmp_path, eviction_policy):
+    settings = CacheSettings(size_limit=200_000, eviction_policy=eviction_policy)
+    service = CacheService(tmp_path, settings=dict(TextClassifier=settings))
+    namespace = service.get("TextClassifier")
+
+    for i in range(100):
+        namespace[str(i)] = os.urandom(10_000)
+
+    assert len(namespace) < 100
+    assert namespace.statistics.volume < 400_000
+
+    service.close()
+
+
+def test_sharded_namespace_with_concurrent_writers(tmp_path):
+    service = CacheService(tmp_path, CacheSettings(shards=4))
+    namespace = service.get("TextClassifier")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: namespace.__setitem__(str(i), i), range(200)))
+
+    assert len(namespace) == 200
+    assert namespace["42"] == 42
+
+    service.close()
+
+
+def _service_pid(_) -> int:
+    cache.get_cache_service()
+    return cache._SERVICE[0]
+
+
+def test_one_service_per_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_SERVICE", None)
+    service = cache.configure_cache_service(tmp_path)
+
+    assert cache.get_cache_service() is service
+    assert cache.get_cache("TextClassifier") is service.get("TextClassifier")
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        assert os.getpid() not in set(pool.map(_service_pid, range(4)))
+
+    service.close()
+
+
+def test_cache_keys_are_versioned():
+    key = cache.create_cache_key("Zeile", "gpt-3.5-turbo", "t.jinja2@1", "{}")
+
+    assert key == cache.create_cache_key("Zeile", "gpt-3.5-turbo", "t.jinja2@1", "{}")
+    assert key.startswith("gpt-3.5-turbo/t.jinja2@1/")
+    assert key != cache.create_cache_key("Zeile", "gpt-4", "t.jinja2@1", "{}")
+    assert key != cache.create_cache_key("Zeile", "gpt-3.5-turbo", "t.jinja2@2", "{}")
+    assert key != cache.create_cache_key("Zeile", "gpt-3.5-turbo", "t.jinja2@1", "[]")
+    assert key != cache.create_cache_key("Zeile 2", "gpt-3.5-turbo", "t.jinja2@1", "{}")
+
+
+def test_file_version_changes_with_content(tmp_path):
+    template = tmp_path / "template.jinja2"
+    template.write_text("{{ a }}")
+    version = cache.file_version(template)
+
+    assert version.startswith("template.jinja2@")
+    assert cache.file_version(template) == version
+
+    template.write_text("{{ a }} {{ b }}")
+
+    assert cache.file_version(template) != version
+
+
+def test_export_and_import_bundle(tmp_path):
+    source = CacheService(tmp_path / "source")
+    source.get("NERAnnotator")["a"] = b"\x00\x01"
+    source.get("NERAnnotator")["b"] = "Text"
+
+    assert cache.export_bundle("NERAnnotator", tmp_path / "ner.jsonl.gz", source) == 2
+
+    target = CacheService(tmp_path / "target")
+    target.get("NERAnnotator")["b"] = "Other"
+
+    assert cache.import_bundle(tmp_path / "ner.jsonl.gz", target) == 1
+    assert target.get("NERAnnotator")["a"] == b"\x00\x01"
+    assert target.get("NERAnnotator")["b"] == "Other"
+
+    assert cache.import_bundle(tmp_path / "ner.jsonl.gz", target, overwrite=True) == 2
+    assert target.get("NERAnnotator")["b"] == "Text"
+
+    source.close()
+    target.close()
+
+
+def test_import_rejects_other_files(tmp_path):
+    path = tmp_path / "other.gz"
+
+    with gzip.open(path, "wt") as file:
+        file.write('{"foo": 1}\n')
+
+    with pytest.raises(ValueError):
+        cache.import_bundle(path, CacheService(tmp_path))
@@ -1,8 +1,61 @@
+import asyncio
+import time
+
+from result import Err, Ok, Result
+
 from ssrq_retro_lab.pipeline import chain
+from ssrq_retro_lab.pipeline.components.protocol import ComponentError
 from ssrq_retro_lab.pipeline.components.text_extractor import (
     ExtractionInput,
     TextExtractor,
 )
+from ssrq_retro_lab.pipeline.metrics import MetricsRecorder, record_cache_hit
+
+
+class ArticleNumberComponent:
+    _allowed_retries = 0
+    _name = "ArticleNumberComponent"
+    _repeat_previous = False
+
+    def invoke(self, input: ExtractionInput) -> Result[int, ComponentError]:
+        if input.article_number == 13:
+            return Err(ComponentError("Unlucky article number"))
+        if input.article_number == 42:
+            raise RuntimeError("Component crashed")
+        record_cache_hit()
+        return Ok(input.article_number * 2)
+
+
+class FlakyAsyncComponent:
+    _allowed_retries = 1
+    _name = "FlakyAsyncComponent"
+    _repeat_previous = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, input: int) -> Result[int, ComponentError]:
+        raise NotImplementedError
+
+    async def ainvoke(self, input: int) -> Result[int, ComponentError]:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.calls == 1:
+            return Err(ComponentError("First call fails"))
+        return Ok(input + 1)
+
+
+class SleepingComponent:
+    _allowed_retries = 0
+    _repeat_previous = False
+
+    def __init__(self, name: str, seconds: float):
+        self._name = name
+        self.seconds = seconds
+
+    def invoke(self, input: int) -> Result[int, ComponentError]:
+        time.sleep(self.seconds)
+        return Ok(input)
 
 
 def test_chain_execute_succeeds_for_simple_pipeline():
@@ -10,3 +63,139 @@ def test_chain_execute_succeeds_for_simple_pipeline():
     result = chain.executor(ExtractionInput(article_number=777), components)
 
     assert chain.is_ok(result)
+
+
+def test_batch_executor_returns_result_per_article():
+    batch_result = chain.batch_executor(
+        range(10, 15), (ArticleNumberComponent(),), max_workers=3
+    )
+
+    assert list(batch_result.results) == [10, 11, 12, 13, 14]
+    assert batch_result.results[10].unwrap() == 20
+    assert batch_result.failed == (13,)
+    assert batch_result.articles_per_minute > 0
+
+
+def test_batch_executor_continues_after_crashing_article():
+    batch_result = chain.batch_executor(
+        (41, 42, 43), (ArticleNumberComponent(),), max_workers=2
+    )
+
+    assert batch_result.failed == (42,)
+    assert batch_result.results[43].unwrap() == 86
+
+
+def test_batch_executor_with_process_pool():
+    batch_result = chain.batch_executor(
+        (1, 2), (ArticleNumberComponent(),), max_workers=2, use_processes=True
+    )
+
+    assert [r.unwrap() for r in batch_result.results.values()] == [2, 4]
+
+
+def test_async_executor_awaits_async_components_and_retries():
+    flaky = FlakyAsyncComponent()
+
+    result = asyncio.run(
+        chain.async_executor(
+            ExtractionInput(article_number=5), (ArticleNumberComponent(), flaky)
+        )
+    )
+
+    assert result.unwrap() == 11
+    assert flaky.calls == 2
+
+
+def test_async_executor_returns_error_of_sync_component():
+    result = asyncio.run(
+        chain.async_executor(
+            ExtractionInput(article_number=13), (ArticleNumberComponent(),)
+        )
+    )
+
+    assert chain.is_err(result)
+
+
+def test_async_executor_runs_many_chains_on_one_loop():
+    async def run_all():
+        return await asyncio.gather(
+            *(
+                chain.async_executor(
+                    ExtractionInput(article_number=number), (ArticleNumberComponent(),)
+                )
+                for number in range(20, 30)
+            )
+        )
+
+    results = asyncio.run(run_all())
+
+    assert [r.unwrap() for r in results] == [n * 2 for n in range(20, 30)]
+
+
+def test_batch_executor_collects_metrics():
+    metrics = MetricsRecorder()
+
+    chain.batch_executor(
+        range(1, 5), (ArticleNumberComponent(),), max_workers=2, metrics=metrics
+    )
+
+    assert len(metrics.records) == 4
+    assert all(r.cache_hits == 1 and r.succeeded for r in metrics.records)
+    assert metrics.get(3, "ArticleNumberComponent").output_size == 1
+
+
+def test_async_executor_collects_retries():
+    metrics = MetricsRecorder()
+
+    asyncio.run(
+        chain.async_executor(
+            ExtractionInput(article_number=5),
+            (ArticleNumberComponent(), FlakyAsyncComponent()),
+            metrics,
+        )
+    )
+
+    flaky_metrics = metrics.get(5, "FlakyAsyncComponent")
+
+    assert flaky_metrics.calls == 2
+    assert flaky_metrics.retries == 1
+    assert flaky_metrics.wall_time > 0
+
+
+def test_streaming_executor_yields_every_article():
+    results = dict(
+        chain.streaming_executor(
+            range(10, 16),
+            (ArticleNumberComponent(), SleepingComponent("Sleep", 0.01)),
+            stage_workers={"Sleep": 2},
+        )
+    )
+
+    assert sorted(results) == list(range(10, 16))
+    assert chain.is_err(results[13])
+    assert results[14].unwrap() == 28
+
+
+def test_streaming_executor_overlaps_stages():
+    components = (
+        ArticleNumberComponent(),
+        SleepingComponent("CPU", 0.05),
+        SleepingComponent("LLM", 0.05),
+    )
+    start = time.perf_counter()
+
+    results = list(chain.streaming_executor(range(1, 9), components))
+
+    assert len(results) == 8
+    # Sequential execution would take 8 * (0.05 + 0.05) seconds.
+    assert time.perf_counter() - start < 0.7
+
+
+def test_streaming_executor_can_be_stopped_early():
+    stream = chain.streaming_executor(
+        range(1, 1000), (ArticleNumberComponent(),), queue_size=1
+    )
+
+    assert next(stream)[0] == 1
+
+    stream.close()
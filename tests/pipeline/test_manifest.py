@@ -0,0 +1,93 @@
+from pathlib import Path
+
+from parsel import Selector
+from result import Ok, Result
+
+from ssrq_retro_lab.pipeline import chain
+from ssrq_retro_lab.pipeline.components.protocol import ComponentError
+from ssrq_retro_lab.pipeline.components.text_extractor import ExtractionInput
+from ssrq_retro_lab.pipeline.manifest import RunManifest, content_hash
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage
+
+
+class CountingComponent:
+    _allowed_retries = 0
+    _repeat_previous = False
+
+    def __init__(self, name: str):
+        self._name = name
+        self.calls = 0
+
+    def invoke(self, input) -> Result[str, ComponentError]:
+        self.calls += 1
+        return Ok(f"{self._name}({input})")
+
+
+def test_content_hash_is_stable_and_content_based():
+    first = {"article": (Selector("<p>a</p>", type="xml"),), "no": 1}
+    second = {"no": 1, "article": (Selector("<p>a</p>", type="xml"),)}
+
+    assert content_hash(first) == content_hash(second)
+    assert content_hash(ExtractionInput(article_number=1)) != content_hash(
+        ExtractionInput(article_number=2)
+    )
+
+
+def test_executor_resumes_from_manifest(tmp_path: Path):
+    components = (CountingComponent("A"), CountingComponent("B"))
+
+    with RunManifest(tmp_path) as manifest:
+        first = chain.executor(
+            ExtractionInput(article_number=1), components, manifest=manifest
+        )
+        second = chain.executor(
+            ExtractionInput(article_number=1), components, manifest=manifest
+        )
+
+        assert first == second
+        assert [c.calls for c in components] == [1, 1]
+        assert manifest.report()["B"]["skipped"] == 1
+
+        chain.executor(ExtractionInput(article_number=2), components, manifest=manifest)
+
+        assert [c.calls for c in components] == [2, 2]
+
+
+class MutatingComponent(CountingComponent):
+    def invoke(self, input) -> Result[str, ComponentError]:
+        self.calls += 1
+        input["pages"].append("changed")
+        return Ok(f"{self._name}({input['pages'][0]})")
+
+
+def test_executor_resumes_components_changing_their_input(tmp_path: Path):
+    component = MutatingComponent("HTMLWrangler")
+
+    with RunManifest(tmp_path) as manifest:
+        first = chain.executor({"pages": ["page"]}, (component,), manifest=manifest)
+        second = chain.executor({"pages": ["page"]}, (component,), manifest=manifest)
+
+    assert first == second
+    assert component.calls == 1
+
+
+def test_manifest_skips_unpicklable_outputs(tmp_path: Path):
+    with RunManifest(tmp_path) as manifest:
+        stored = manifest.store(1, "HTMLWrangler", "input", Selector("<p/>"), 0.1)
+
+        assert stored is False
+        assert manifest.load(1, "HTMLWrangler", "input") is None
+
+
+def test_content_hash_of_parsed_pages_depends_on_content():
+    page = ParsedPage("<div><p>a</p></div>")
+
+    assert content_hash({"pages": (page,)}) == content_hash(
+        {"pages": (ParsedPage("<div><p>a</p></div>"),)}
+    )
+
+    page.selector.xpath("//p")[0].drop()
+
+    assert content_hash({"pages": (page,)}) != content_hash(
+        {"pages": (ParsedPage("<div><p>a</p></div>"),)}
+    )
@@ -0,0 +1,90 @@
+import json
+from pathlib import Path
+
+from ssrq_retro_lab.pipeline.components.text_classifier import StructuredArticle
+from ssrq_retro_lab.pipeline.metrics import (
+    MetricsRecorder,
+    measure_size,
+    record_cache_hit,
+    record_cache_miss,
+    record_rule_match,
+    track,
+)
+from ssrq_retro_lab.pipeline.parser.html_to_article import ParsedPage
+
+
+def test_track_records_calls_and_cache_statistics():
+    recorder = MetricsRecorder()
+    record = recorder.get(1, "Component")
+
+    with track(record):
+        record_cache_hit()
+        record_cache_miss()
+        record_cache_miss()
+
+    record_cache_hit()
+
+    assert record.calls == 1
+    assert record.cache_hits == 1
+    assert record.cache_misses == 2
+    assert record.wall_time > 0
+
+
+def test_track_records_rule_matches():
+    record = MetricsRecorder().get(1, "Component")
+
+    with track(record):
+        record_rule_match(False)
+        record_rule_match(True)
+        record_rule_match(True, True)
+        record_rule_match(True, False)
+
+    assert (
+        record.rule_hits,
+        record.rule_misses,
+        record.rule_compared,
+        record.rule_disagreements,
+    ) == (3, 1, 2, 1)
+
+
+def test_measure_size():
+    article = StructuredArticle(
+        article_number=1,
+        date="1416",
+        references=[],
+        summary=[],
+        text=["Zug"],
+        title="Titel",
+    )
+
+    assert measure_size("ä") == 2
+    assert measure_size({"a": "abc", "b": ("de", b"f")}) == 6
+    assert measure_size(article) == len(article.model_dump_json())
+    assert measure_size(ParsedPage("<div>Zug</div>", number=3)) == 14
+    assert measure_size({"pages": (ParsedPage("<p/>"),)}) == 4
+
+
+def test_metrics_export(tmp_path: Path):
+    recorder = MetricsRecorder()
+
+    for article, wall_time in enumerate((0.1, 0.2, 0.3)):
+        record = recorder.get(article, "TextExtractor")
+        record.wall_time = wall_time
+        record.calls = 1
+
+    recorder.to_jsonl(tmp_path / "metrics.jsonl")
+    recorder.to_prometheus(tmp_path / "metrics.prom")
+
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+
+    assert len(lines) == 3
+    assert json.loads(lines[0])["component"] == "TextExtractor"
+
+    prometheus = (tmp_path / "metrics.prom").read_text()
+
+    assert (
+        'ssrq_component_wall_time_seconds{component="TextExtractor",quantile="0.5"} 0.200000'
+        in prometheus
+    )
+    assert 'ssrq_component_calls_total{component="TextExtractor"} 3' in prometheus
+    assert "TextExtractor" in recorder.summary()
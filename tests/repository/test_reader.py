@@ -0,0 +1,97 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # type: ignore
+import pytest
+
+from ssrq_retro_lab.repository import reader
+from ssrq_retro_lab.repository.reader import PDFDocumentPool, get_document_pool
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "volume.pdf"
+    document = fitz.open()
+
+    for number in range(3):
+        document.new_page().insert_text((72, 72), f"Page {number}")
+
+    document.save(path)
+    document.close()
+
+    return path
+
+
+def test_document_pool_reuses_documents(pdf_path):
+    with PDFDocumentPool() as pool:
+        with pool.document(pdf_path) as first:
+            pass
+
+        with pool.document(pdf_path) as second:
+            assert second is first
+            assert len(pool) == 1
+
+    assert first.is_closed
+    assert len(pool) == 0
+
+
+def test_document_pool_can_be_used_by_threads(pdf_path):
+    pool = PDFDocumentPool()
+
+    def extract(number: int) -> str:
+        with pool.document(pdf_path) as document:
+            return document.load_page(number % 3).get_text()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        texts = list(executor.map(extract, range(30)))
+
+    assert texts == [f"Page {number % 3}\n" for number in range(30)]
+    assert len(pool) == 1
+
+    pool.close()
+
+
+def test_opening_a_volume_does_not_block_other_volumes(pdf_path, monkeypatch):
+    other_path = pdf_path.with_name("other.pdf")
+    other_path.write_bytes(pdf_path.read_bytes())
+    opening = threading.Event()
+    release = threading.Event()
+    read = reader.PDFReader.read
+
+    def slow_read(self):
+        if self.path.name == "other.pdf":
+            opening.set()
+            release.wait(5)
+        return read(self)
+
+    monkeypatch.setattr(reader.PDFReader, "read", slow_read)
+
+    with PDFDocumentPool() as pool, ThreadPoolExecutor(max_workers=1) as executor:
+
+        def lease_other() -> int:
+            with pool.document(other_path) as document:
+                return len(document)
+
+        other = executor.submit(lease_other)
+        assert opening.wait(5)
+
+        with pool.document(pdf_path) as document:
+            assert len(document) == 3
+
+        release.set()
+
+        assert other.result() == 3
+        assert len(pool) == 2
+
+
+def test_get_document_pool_is_per_process(monkeypatch):
+    monkeypatch.setattr(reader, "_DOCUMENT_POOL", None)
+
+    pool = get_document_pool()
+
+    assert get_document_pool() is pool
+
+    monkeypatch.setattr(reader, "_DOCUMENT_POOL", (os.getpid() + 1, pool))
+
+    assert get_document_pool() is not pool